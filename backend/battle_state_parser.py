@@ -1,143 +1,255 @@
 import re
-import json
+import copy
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 
+# Most bytes read from the log in one poll. The rest is read by the next polls
+MAX_READ_BYTES = 4 * 1024 * 1024
+# States of older battles are forgotten once this many have been seen
+MAX_BATTLES = 20
+MAX_MOVE_HISTORY = 10
+
+_BATTLE_ID = re.compile(r'battle-([^-]+)-\d+')
+_TURN = re.compile(r'Turn (\d+)')
+_HP = re.compile(r'(\d+)/(\d+)')
+
+
 class BattleStateParser:
-    """Parses bot logs to extract live battle state"""
-    
-    def __init__(self, log_file: Path):
-        self.log_file = log_file
+    """
+    Parses bot logs to extract live battle state
+
+    The log is tailed: every poll parses only the bytes appended since the last one
+    and the state of each battle is kept in memory.
+    `log_file` is either a log file or a directory of logs. A file that is replaced
+    (different inode) or truncated is reopened from the start. For a directory the
+    newest `*.log` is followed, which is where `CustomRotatingFileHandler.do_rollover`
+    moves the bot's log at the start of every battle
+    """
+
+    def __init__(self, log_file: Path, pattern: str = "*.log"):
+        self.log_file = Path(log_file)
+        self.pattern = pattern
         self.current_battle = None
-        
+        self.battles: "OrderedDict[str, Dict]" = OrderedDict()
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._inode = None
+        self._offset = 0
+        self._partial = b""
+
+        self._handlers: Dict[str, Callable[[Dict, List[str]], None]] = {
+            "turn": self._on_turn,
+            "switch": self._on_switch,
+            "drag": self._on_switch,
+            "replace": self._on_switch,
+            "move": self._on_move,
+            "-damage": self._on_hp,
+            "-heal": self._on_hp,
+            "-weather": self._on_weather,
+            "-fieldstart": self._on_fieldstart,
+        }
+
     def parse_latest_battle_state(self) -> Optional[Dict]:
         """Parse the most recent battle state from logs"""
-        if not self.log_file.exists():
-            return None
-            
         try:
-            with open(self.log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-                
-            # Find the most recent battle initialization
-            battle_id = None
-            for line in reversed(lines):
-                if 'Initialized battle-' in line:
-                    match = re.search(r'battle-([^-]+)-\d+', line)
-                    if match:
-                        battle_id = match.group(0)
-                        break
-            
-            if not battle_id:
-                return None
-                
-            # Parse battle events for this battle
-            state = {
-                "battle_id": battle_id,
-                "format": self._extract_format(battle_id),
-                "turn": 0,
-                "your_team": [],
-                "opponent_team": [],
-                "your_active": None,
-                "opponent_active": None,
-                "field": {
-                    "weather": None,
-                    "terrain": None,
-                    "screens": []
-                },
-                "move_history": [],
-                "last_updated": datetime.now().isoformat()
-            }
-            
-            # Parse team reveals and moves
-            in_battle = False
-            for line in lines:
-                if battle_id in line:
-                    in_battle = True
-                    
-                if not in_battle:
-                    continue
-                    
-                # Parse turn number
-                turn_match = re.search(r'Turn (\d+)', line)
-                if turn_match:
-                    state["turn"] = int(turn_match.group(1))
-                
-                # Parse switch/active Pokémon
-                switch_match = re.search(r'\|switch\|([^|]+)\|([^|]+)', line)
-                if switch_match:
-                    player = switch_match.group(1)
-                    pokemon_data = switch_match.group(2)
-                    pokemon_name = pokemon_data.split(',')[0]
-                    
-                    if player.startswith('p1'):
-                        state["your_active"] = pokemon_name
-                        if pokemon_name not in [p["species"] for p in state["your_team"]]:
-                            state["your_team"].append({
-                                "species": pokemon_name,
-                                "hp": 100,
-                                "status": None,
-                                "revealed": True
-                            })
-                    elif player.startswith('p2'):
-                        state["opponent_active"] = pokemon_name
-                        if pokemon_name not in [p["species"] for p in state["opponent_team"]]:
-                            state["opponent_team"].append({
-                                "species": pokemon_name,
-                                "hp": 100,
-                                "status": None,
-                                "revealed": True
-                            })
-                
-                # Parse moves
-                move_match = re.search(r'\|move\|([^|]+)\|([^|]+)', line)
-                if move_match:
-                    player = move_match.group(1)
-                    move = move_match.group(2)
-                    state["move_history"].append({
-                        "turn": state["turn"],
-                        "player": "you" if player.startswith('p1') else "opponent",
-                        "move": move
-                    })
-                
-                # Parse damage
-                damage_match = re.search(r'\|-damage\|([^|]+)\|(\d+)/(\d+)', line)
-                if damage_match:
-                    player = damage_match.group(1)
-                    current_hp = int(damage_match.group(2))
-                    max_hp = int(damage_match.group(3))
-                    hp_percent = (current_hp / max_hp * 100) if max_hp > 0 else 0
-                    
-                    if player.startswith('p1'):
-                        for mon in state["your_team"]:
-                            if mon["species"] == state["your_active"]:
-                                mon["hp"] = round(hp_percent, 1)
-                    elif player.startswith('p2'):
-                        for mon in state["opponent_team"]:
-                            if mon["species"] == state["opponent_active"]:
-                                mon["hp"] = round(hp_percent, 1)
-                
-                # Parse weather
-                weather_match = re.search(r'\|-weather\|([^|]+)', line)
-                if weather_match:
-                    state["field"]["weather"] = weather_match.group(1)
-                
-                # Parse terrain
-                terrain_match = re.search(r'\|-fieldstart\|move: ([^|]+) Terrain', line)
-                if terrain_match:
-                    state["field"]["terrain"] = terrain_match.group(1)
-                
-                # Limit move history to last 10
-                if len(state["move_history"]) > 10:
-                    state["move_history"] = state["move_history"][-10:]
-            
-            return state
-            
+            with self._lock:
+                self.poll()
+                if self.current_battle is None:
+                    return None
+                return copy.deepcopy(self.battles[self.current_battle])
         except Exception as e:
             print(f"Error parsing battle state: {e}")
             return None
-    
+
+    def get_battle_state(self, battle_id: str) -> Optional[Dict]:
+        with self._lock:
+            self.poll()
+            state = self.battles.get(battle_id)
+            return copy.deepcopy(state) if state is not None else None
+
+    def _target_path(self) -> Optional[Path]:
+        if not self.log_file.is_dir():
+            return self.log_file if self.log_file.exists() else None
+        candidates = list(self.log_file.glob(self.pattern))
+        if not candidates:
+            return None
+        return max(candidates, key=lambda p: p.stat().st_mtime)
+
+    def _open(self, path: Path) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = path.open("rb")
+        self._path = path
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._offset = 0
+        self._partial = b""
+
+    def poll(self) -> None:
+        """Parses whatever was appended to the log since the last poll"""
+        path = self._target_path()
+        if path is None:
+            return
+
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return
+
+        if self._file is None or path != self._path or stat.st_ino != self._inode:
+            if self._file is not None:
+                # lines written to the old file after the last poll still belong to it
+                self._read_available()
+            self._open(path)
+        elif stat.st_size < self._offset:
+            # truncated in place
+            self._open(path)
+
+        self._read_available()
+
+    def _read_available(self) -> None:
+        remaining = MAX_READ_BYTES
+        while remaining > 0:
+            data = self._file.read(min(remaining, 1024 * 1024))
+            if not data:
+                return
+            self._offset += len(data)
+            remaining -= len(data)
+            self._feed(data)
+
+    def _feed(self, data: bytes) -> None:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._parse_line(line.decode("utf-8", errors="ignore"))
+
+    def _new_battle(self, battle_id: str) -> Dict:
+        return {
+            "battle_id": battle_id,
+            "format": self._extract_format(battle_id),
+            "turn": 0,
+            "your_team": [],
+            "opponent_team": [],
+            "your_active": None,
+            "opponent_active": None,
+            "field": {
+                "weather": None,
+                "terrain": None,
+                "screens": []
+            },
+            "move_history": [],
+            "last_updated": datetime.now().isoformat()
+        }
+
+    def _parse_line(self, line: str) -> None:
+        if 'Initialized battle-' in line:
+            match = _BATTLE_ID.search(line)
+            if match:
+                battle_id = match.group(0)
+                self.battles[battle_id] = self._new_battle(battle_id)
+                self.battles.move_to_end(battle_id)
+                while len(self.battles) > MAX_BATTLES:
+                    self.battles.popitem(last=False)
+                self.current_battle = battle_id
+            return
+
+        if self.current_battle is None:
+            return
+        state = self.battles[self.current_battle]
+
+        start = line.find("|")
+        if start == -1:
+            # the bot's own decision lines: "[MCTS] Turn 5: ..."
+            if 'Turn ' in line:
+                turn_match = _TURN.search(line)
+                if turn_match:
+                    state["turn"] = int(turn_match.group(1))
+            return
+
+        split_msg = line[start:].split("|")
+        handler = self._handlers.get(split_msg[1]) if len(split_msg) > 1 else None
+        if handler is not None:
+            handler(state, split_msg)
+            state["last_updated"] = datetime.now().isoformat()
+
+    @staticmethod
+    def _on_turn(state: Dict, split_msg: List[str]) -> None:
+        if len(split_msg) > 2 and split_msg[2].strip().isdigit():
+            state["turn"] = int(split_msg[2])
+
+    @staticmethod
+    def _on_switch(state: Dict, split_msg: List[str]) -> None:
+        if len(split_msg) < 4:
+            return
+        player = split_msg[2]
+        pokemon_name = split_msg[3].split(',')[0]
+        if player.startswith('p1'):
+            active_key, team_key = "your_active", "your_team"
+        elif player.startswith('p2'):
+            active_key, team_key = "opponent_active", "opponent_team"
+        else:
+            return
+
+        state[active_key] = pokemon_name
+        if pokemon_name not in [p["species"] for p in state[team_key]]:
+            state[team_key].append({
+                "species": pokemon_name,
+                "hp": 100,
+                "status": None,
+                "revealed": True
+            })
+
+    @staticmethod
+    def _on_move(state: Dict, split_msg: List[str]) -> None:
+        if len(split_msg) < 4:
+            return
+        state["move_history"].append({
+            "turn": state["turn"],
+            "player": "you" if split_msg[2].startswith('p1') else "opponent",
+            "move": split_msg[3]
+        })
+        if len(state["move_history"]) > MAX_MOVE_HISTORY:
+            del state["move_history"][:-MAX_MOVE_HISTORY]
+
+    @staticmethod
+    def _on_hp(state: Dict, split_msg: List[str]) -> None:
+        if len(split_msg) < 4:
+            return
+        player = split_msg[2]
+        if split_msg[3].startswith("0 fnt"):
+            hp_percent = 0
+        else:
+            hp_match = _HP.match(split_msg[3])
+            if not hp_match:
+                return
+            max_hp = int(hp_match.group(2))
+            hp_percent = (int(hp_match.group(1)) / max_hp * 100) if max_hp > 0 else 0
+
+        if player.startswith('p1'):
+            active, team = state["your_active"], state["your_team"]
+        elif player.startswith('p2'):
+            active, team = state["opponent_active"], state["opponent_team"]
+        else:
+            return
+        for mon in team:
+            if mon["species"] == active:
+                mon["hp"] = round(hp_percent, 1)
+
+    @staticmethod
+    def _on_weather(state: Dict, split_msg: List[str]) -> None:
+        if len(split_msg) > 2:
+            state["field"]["weather"] = split_msg[2]
+
+    @staticmethod
+    def _on_fieldstart(state: Dict, split_msg: List[str]) -> None:
+        if len(split_msg) > 2 and split_msg[2].startswith("move: ") and split_msg[2].endswith(" Terrain"):
+            state["field"]["terrain"] = split_msg[2][len("move: "):-len(" Terrain")]
+
     def _extract_format(self, battle_id: str) -> str:
         """Extract format from battle ID"""
         match = re.search(r'battle-([^-]+)', battle_id)
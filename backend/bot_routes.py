@@ -0,0 +1,64 @@
+"""
+Bot routes for FoulPlay backend
+Start, stop and monitor supervised bot instances
+"""
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from backend.event_hub import EVENT_PORT, hub
+from backend.supervisor import BotSpec, BotSupervisor, SupervisorError
+
+router = APIRouter(prefix="/bots", tags=["bots"])
+
+supervisor = BotSupervisor(EVENT_PORT)
+hub.listeners.append(supervisor.record_event)
+
+
+class BotReq(BaseModel):
+    ps_username: str
+    ps_password: str
+    pokemon_format: str = "gen9randombattle"
+    search_time_ms: int = 800
+    search_parallelism: int = 1
+    run_count: int = 1
+    bot_mode: str = "search_ladder"
+    websocket_uri: Optional[str] = "wss://sim3.psim.us/showdown/websocket"
+    extra_args: List[str] = []
+
+
+def start_instance(instance_id: str, req: BaseModel) -> Dict[str, Any]:
+    spec = BotSpec(**{k: v for k, v in req.dict().items() if k in BotSpec.__dataclass_fields__})
+    try:
+        instance = supervisor.start(instance_id, spec)
+    except SupervisorError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"started": True, "id": instance_id, "pid": instance.process.pid}
+
+
+@router.get("")
+def list_bots() -> Dict[str, Any]:
+    return {
+        "ok": True,
+        "cpu_budget": supervisor.cpu_budget,
+        "cores_in_use": supervisor.cores_in_use(),
+        "bots": supervisor.health(),
+    }
+
+
+@router.post("/{instance_id}/start")
+def start_bot(instance_id: str, req: BotReq) -> Dict[str, Any]:
+    return start_instance(instance_id, req)
+
+
+@router.post("/{instance_id}/stop")
+def stop_bot(instance_id: str) -> Dict[str, Any]:
+    return {"stopped": supervisor.stop(instance_id), "id": instance_id}
+
+
+@router.get("/{instance_id}/health")
+def bot_health(instance_id: str) -> Dict[str, Any]:
+    instance = supervisor.instances.get(instance_id)
+    if instance is None:
+        raise HTTPException(status_code=404, detail="Unknown bot '{}'".format(instance_id))
+    return instance.health()
@@ -0,0 +1,153 @@
+"""
+Live battle events for the dashboard
+Receives the events the bot publishes over localhost UDP and fans them out to
+dashboard clients over Server-Sent Events or WebSocket
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+EVENT_HOST = "127.0.0.1"
+EVENT_PORT = int(os.environ.get("FP_EVENT_PORT", "47800"))
+
+# Events waiting for one client. A slow client loses its oldest events, never the others'
+CLIENT_QUEUE_SIZE = 256
+# Events replayed to a client when it connects
+RECENT_EVENTS = 50
+HEARTBEAT_SECONDS = 15
+# A battle state not updated for this long is from a bot that stopped or crashed
+STATE_TTL_SECONDS = 300
+
+
+class EventHub:
+    def __init__(self):
+        self.clients = set()
+        self.recent = deque(maxlen=RECENT_EVENTS)
+        self.latest_states: Dict[str, Dict[str, Any]] = {}
+        self.received = 0
+        self.dropped = 0
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._transport = None
+
+    async def start(self, host: str = EVENT_HOST, port: int = EVENT_PORT) -> None:
+        if self._transport is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _EventProtocol(self), local_addr=(host, port)
+        )
+
+    def stop(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        for event in self.recent:
+            queue.put_nowait(event)
+        self.clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.clients.discard(queue)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self.received += 1
+        self.recent.append(event)
+        if event.get("type") == "state":
+            self.latest_states[event.get("battle_id")] = event
+        elif event.get("type") == "battle_end":
+            self.latest_states.pop(event.get("battle_id"), None)
+        for listener in self.listeners:
+            listener(event)
+
+        for queue in self.clients:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    def expire_states(self, now: Optional[float] = None) -> None:
+        """Forgets the battle states older than STATE_TTL_SECONDS: their `ts` is in ms"""
+        oldest_ms = ((time.time() if now is None else now) - STATE_TTL_SECONDS) * 1000
+        for battle_id, event in list(self.latest_states.items()):
+            if event.get("ts", 0) < oldest_ms:
+                del self.latest_states[battle_id]
+
+    def latest_state(self, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        self.expire_states(now)
+        if not self.latest_states:
+            return None
+        return max(self.latest_states.values(), key=lambda e: e.get("ts", 0))
+
+
+class _EventProtocol(asyncio.DatagramProtocol):
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return
+        if isinstance(event, dict):
+            self.hub.publish(event)
+
+
+hub = EventHub()
+
+
+@router.get("/stream")
+async def stream(request: Request):
+    """Server-Sent Events: one `data:` line per battle event"""
+    queue = hub.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield "event: {}\ndata: {}\n\n".format(event.get("type", "message"), json.dumps(event))
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def websocket(ws: WebSocket):
+    await ws.accept()
+    queue = hub.subscribe()
+    try:
+        while True:
+            await ws.send_json(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(queue)
+
+
+@router.get("/latest")
+def latest() -> Dict[str, Any]:
+    return {
+        "ok": True,
+        "state": hub.latest_state(),
+        "clients": len(hub.clients),
+        "received": hub.received,
+        "dropped": hub.dropped,
+    }
@@ -0,0 +1,237 @@
+"""
+Log access for the bot, backend, frontend and per-battle logs
+
+Reads are bounded: a tail never looks at more than `max_bytes` of a file and an
+incremental read returns at most `max_bytes` of new data.
+Tails scan backward through an mmap of the file and continue into rotated
+segments (`bot.log.1`, `bot.log.2.gz`, ...) when the current file is too short.
+Incremental reads use "<inode>:<offset>" cursors so a client that follows a log
+keeps its place across rotations and truncations
+"""
+import gzip
+import mmap
+import os
+import re
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.supervisor import INSTANCES_DIR
+
+MAX_LINES = 5000
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+_SEGMENT_SUFFIX = re.compile(r'^\.(\d+)(\.gz)?$')
+_BATTLE_LOG_NAME = re.compile(r'^battle-[A-Za-z0-9_-]+$')
+
+
+def rotated_segments(path: Path) -> List[Path]:
+    """Rotated segments of `path`, newest first"""
+    segments = []
+    for candidate in path.parent.glob(path.name + ".*"):
+        match = _SEGMENT_SUFFIX.match(candidate.name[len(path.name):])
+        if match:
+            segments.append((int(match.group(1)), candidate))
+    return [p for _, p in sorted(segments)]
+
+
+def _tail_plain(path: Path, n: int, max_bytes: int) -> Tuple[List[str], bool]:
+    """
+    The last `n` lines of a plain file, scanning backward from the end
+    Returns the lines and whether the scan reached the start of the file
+    """
+    try:
+        with path.open("rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return [], True
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = size - 1 if mm[size - 1:size] == b"\n" else size
+                floor = max(0, size - max_bytes)
+                pos = end
+                found = 0
+                while found < n:
+                    i = mm.rfind(b"\n", floor, pos)
+                    if i == -1:
+                        break
+                    pos = i
+                    found += 1
+
+                if found == n:
+                    data = mm[pos + 1:end]
+                    reached_start = False
+                elif floor == 0:
+                    data = mm[0:end]
+                    reached_start = True
+                else:
+                    # the window ends in the middle of a line
+                    data = mm[floor:end]
+                    data = data[data.find(b"\n") + 1:]
+                    reached_start = False
+    except (FileNotFoundError, ValueError):
+        return [], True
+    return data.decode("utf-8", errors="ignore").splitlines(), reached_start
+
+
+def _tail_gzip(path: Path, n: int, max_bytes: int) -> List[str]:
+    # gzip cannot be read backward: stream it and keep only the last n lines
+    lines = deque(maxlen=n)
+    try:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                lines.append(line[:max_bytes].decode("utf-8", errors="ignore").rstrip("\n"))
+    except (OSError, EOFError):
+        pass
+    return list(lines)
+
+
+def tail_lines(path: Path, n: int, max_bytes: int = DEFAULT_MAX_BYTES) -> List[str]:
+    """The last `n` lines of `path`, continuing into its rotated segments if needed"""
+    n = max(0, min(n, MAX_LINES))
+    if n == 0:
+        return []
+
+    lines, reached_start = _tail_plain(path, n, max_bytes)
+    budget = max_bytes - sum(len(line) + 1 for line in lines)
+    if not reached_start:
+        return lines
+
+    for segment in rotated_segments(path):
+        if len(lines) >= n or budget <= 0:
+            break
+        wanted = n - len(lines)
+        if segment.suffix == ".gz":
+            older = _tail_gzip(segment, wanted, budget)
+            reached_start = True
+        else:
+            older, reached_start = _tail_plain(segment, wanted, budget)
+        lines = older + lines
+        budget -= sum(len(line) + 1 for line in older)
+        if not reached_start:
+            break
+    return lines[-n:]
+
+
+def make_cursor(inode: int, offset: int) -> str:
+    return "{}:{}".format(inode, offset)
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    try:
+        inode, offset = cursor.split(":")
+        return int(inode), int(offset)
+    except (AttributeError, ValueError):
+        return None
+
+
+def end_cursor(path: Path) -> Optional[str]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return make_cursor(stat.st_ino, stat.st_size)
+
+
+def _read_complete_lines(path: Path, offset: int, max_bytes: int) -> Tuple[List[str], int]:
+    """Complete lines starting at `offset`, at most `max_bytes` of them. Returns the lines and the new offset"""
+    with path.open("rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    end = data.rfind(b"\n") + 1
+    if end == 0 and len(data) == max_bytes:
+        # a single line longer than the limit: return it cut rather than never progressing
+        end = len(data)
+    return data[:end].decode("utf-8", errors="ignore").splitlines(), offset + end
+
+
+def read_since(path: Path, cursor: Optional[str], max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Lines appended to `path` since `cursor`
+
+    Without a valid cursor nothing is returned and the cursor points at the end of the file.
+    If the file was rotated the rest of the rotated file is returned first;
+    if it was truncated reading starts over from the beginning
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return {"lines": [], "cursor": cursor, "rotated": False}
+
+    position = parse_cursor(cursor)
+    if position is None:
+        return {"lines": [], "cursor": make_cursor(stat.st_ino, stat.st_size), "rotated": False}
+
+    inode, offset = position
+    lines = []
+    rotated = False
+    if inode != stat.st_ino:
+        rotated = True
+        for segment in rotated_segments(path):
+            if segment.suffix != ".gz" and segment.stat().st_ino == inode:
+                lines, offset = _read_complete_lines(segment, offset, max_bytes)
+                if offset < segment.stat().st_size:
+                    # more left in the rotated file than fits in one read
+                    return {"lines": lines, "cursor": make_cursor(inode, offset), "rotated": True}
+                break
+        offset = 0
+    elif offset > stat.st_size:
+        rotated = True
+        offset = 0
+
+    budget = max_bytes - sum(len(line) + 1 for line in lines)
+    if budget > 0:
+        new_lines, offset = _read_complete_lines(path, offset, budget)
+        lines += new_lines
+    return {"lines": lines, "cursor": make_cursor(stat.st_ino, offset), "rotated": rotated}
+
+
+class LogAccess:
+    """Resolves log names to files in the logs directory"""
+
+    def __init__(self, logs_dir: Path):
+        self.logs_dir = Path(logs_dir)
+        self.named = {
+            "bot": self.logs_dir / "bot" / "bot.log",
+            "backend": self.logs_dir / "backend" / "backend.log",
+            "frontend": self.logs_dir / "frontend" / "frontend.log",
+        }
+
+    def resolve(self, name: str) -> Optional[Path]:
+        if name in self.named:
+            return self.named[name]
+        # per-battle logs written by CustomRotatingFileHandler.do_rollover: "<battle_tag>_<opponent>.log"
+        if not _BATTLE_LOG_NAME.match(name):
+            return None
+        for battle_dir in self.battle_dirs():
+            exact = battle_dir / (name + ".log")
+            if exact.exists():
+                return exact
+        matches = sorted(
+            (p for d in self.battle_dirs() for p in d.glob(name + "_*.log")),
+            key=lambda p: p.stat().st_mtime,
+        )
+        return matches[-1] if matches else None
+
+    def battle_dirs(self) -> List[Path]:
+        # supervised bots other than the default one log their battles in their own directory
+        return [self.logs_dir] + sorted(p for p in (self.logs_dir / INSTANCES_DIR).glob("*") if p.is_dir())
+
+    def battle_logs(self) -> List[str]:
+        return sorted(p.stem for d in self.battle_dirs() for p in d.glob("battle-*.log"))
+
+    def tail(self, name: str, n: int, max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
+        path = self.resolve(name)
+        if path is None:
+            return {"ok": False, "lines": [], "cursor": None}
+        return {
+            "ok": True,
+            "file": str(path),
+            "lines": tail_lines(path, n, max_bytes),
+            "cursor": end_cursor(path),
+        }
+
+    def since(self, name: str, cursor: Optional[str], max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
+        path = self.resolve(name)
+        if path is None:
+            return {"ok": False, "lines": [], "cursor": None}
+        return dict(read_since(path, cursor, max_bytes), ok=True, file=str(path))
@@ -1,19 +1,32 @@
 from __future__ import annotations
-import os, re, json, signal, subprocess
+import os, re, json
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional
 from fastapi import FastAPI, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
+from backend.battle_state_parser import BattleStateParser
+from backend.bot_routes import router as bots_router, start_instance, supervisor
+from backend.event_hub import hub as event_hub, router as events_router
+from backend.log_access import LogAccess
+from backend.metrics_routes import router as metrics_router
+from backend.smogon_client import smogon_client
+from backend.supervisor import DEFAULT_INSTANCE
+from backend.usage_store import DEFAULT_MIRROR
+
 ROOT = Path(__file__).resolve().parents[1]
 LOGS = ROOT / "logs"
 BOT_LOG = LOGS / "bot" / "bot.log"
-BOT_PID = LOGS / "bot" / "pid"
 LOGS.mkdir(parents=True, exist_ok=True)
 (BOT_LOG.parent).mkdir(parents=True, exist_ok=True)
 
 app = FastAPI(title="FoulPlay Backend")
+battle_state_parser = BattleStateParser(BOT_LOG)
+log_access = LogAccess(LOGS)
+app.include_router(events_router)
+app.include_router(bots_router)
+app.include_router(metrics_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,35 +44,22 @@ class StartReq(BaseModel):
     bot_mode: str = "search_ladder"
     websocket_uri: Optional[str] = "wss://sim3.psim.us/showdown/websocket"
 
-def _is_running(pid: int) -> bool:
-    try:
-        os.kill(pid, 0)
-        return True
-    except Exception:
-        return False
-
-def bot_pid() -> Optional[int]:
-    try:
-        return int(BOT_PID.read_text().strip())
-    except Exception:
-        return None
-
-def tail(path: Path, n: int) -> List[str]:
-    try:
-        with path.open("rb") as f:
-            f.seek(0, os.SEEK_END)
-            end = f.tell()
-            size = 8192
-            data = b""
-            while end > 0 and data.count(b"\n") <= n:
-                start = max(0, end - size)
-                f.seek(start)
-                chunk = f.read(end - start)
-                data = chunk + data
-                end = start
-            return data.decode("utf-8", errors="ignore").splitlines()[-n:]
-    except Exception:
-        return []
+@app.on_event("startup")
+async def start_event_hub():
+    await event_hub.start()
+
+@app.on_event("startup")
+def start_usage_refresh():
+    # e.g. FP_SMOGON_FORMATS=gen9ou,gen9uu FP_SMOGON_MIRROR=/srv/smogon-stats
+    formats = [f for f in os.environ.get("FP_SMOGON_FORMATS", "").split(",") if f]
+    if formats:
+        smogon_client.start_refresh(formats, os.environ.get("FP_SMOGON_MIRROR") or DEFAULT_MIRROR)
+
+@app.on_event("shutdown")
+def stop_event_hub():
+    event_hub.stop()
+    supervisor.stop_all()
+    smogon_client.stop_refresh()
 
 @app.get("/health")
 def health(): return {"ok": True}
@@ -69,49 +69,46 @@ def backend_info(): return {"ok": True, "service": "backend"}
 
 @app.get("/status")
 def status():
-    pid = bot_pid()
-    return {"ok": True, "bot_running": bool(pid and _is_running(pid))}
+    running = supervisor.is_running(DEFAULT_INSTANCE)
+    return {"ok": True, "bot_running": running, "running": running, "bots": supervisor.health()}
 
 @app.post("/start")
 def start_bot(req: StartReq):
-    # Stop any stale
+    # /start and /stop control the default instance of the supervisor
     stop_bot()
-    cmd = [
-        "python","-u", str(ROOT / "foul-play" / "run.py"),
-        "--websocket-uri", req.websocket_uri or "wss://sim3.psim.us/showdown/websocket",
-        "--ps-username", req.ps_username, "--ps-password", req.ps_password,
-        "--bot-mode", req.bot_mode,
-        "--pokemon-format", req.pokemon_format,
-        "--search-time-ms", str(req.search_time_ms),
-        "--search-parallelism", str(req.search_parallelism),
-        "--run-count", str(req.run_count),
-        "--log-level", "DEBUG", "--log-to-file"
-    ]
-    BOT_LOG.parent.mkdir(parents=True, exist_ok=True)
-    p = subprocess.Popen(cmd, cwd=str(ROOT), stdout=BOT_LOG.open("a"), stderr=subprocess.STDOUT)
-    BOT_PID.write_text(str(p.pid))
-    return {"started": True, "pid": p.pid}
+    return start_instance(DEFAULT_INSTANCE, req)
 
 @app.post("/stop")
 def stop_bot():
-    pid = bot_pid()
-    if pid and _is_running(pid):
-        try:
-            os.kill(pid, signal.SIGTERM)
-        except Exception:
-            try: os.kill(pid, signal.SIGKILL)
-            except Exception: pass
-    BOT_PID.write_text("")
+    supervisor.stop(DEFAULT_INSTANCE)
     return {"stopped": True}
 
 @app.get("/logs/bot/tail")
 def logs_bot_tail(n: int = Query(200, ge=1, le=5000)):
-    return {"ok": True, "lines": tail(BOT_LOG, n)}
+    return log_access.tail("bot", n)
 
 @app.get("/logs/backend/tail")
 def logs_backend_tail(n: int = Query(200, ge=1, le=5000)):
-    return {"ok": True, "lines": tail(LOGS / "backend" / "backend.log", n)}
+    return log_access.tail("backend", n)
 
 @app.get("/logs/frontend/tail")
 def logs_frontend_tail(n: int = Query(200, ge=1, le=5000)):
-    return {"ok": True, "lines": tail(LOGS / "frontend" / "frontend.log", n)}
+    return log_access.tail("frontend", n)
+
+@app.get("/logs/battles")
+def logs_battles():
+    return {"ok": True, "battles": log_access.battle_logs()}
+
+@app.get("/logs/{name}/tail")
+def logs_tail(name: str, n: int = Query(200, ge=1, le=5000)):
+    return log_access.tail(name, n)
+
+@app.get("/logs/{name}/since")
+def logs_since(name: str, cursor: Optional[str] = None):
+    """New lines since `cursor`. Without a cursor returns the cursor at the end of the log"""
+    return log_access.since(name, cursor)
+
+@app.get("/battle/state")
+def battle_state():
+    # the bot pushes its state; the log is parsed when no battle state arrived recently
+    return event_hub.latest_state() or battle_state_parser.parse_latest_battle_state()
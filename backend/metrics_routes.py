@@ -0,0 +1,102 @@
+"""
+Metrics routes for FoulPlay backend
+Prometheus text exposition of the bots' textfile metrics plus the backend's own
+"""
+import time
+from pathlib import Path
+from typing import Dict, List
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from backend.bot_routes import supervisor
+from backend.event_hub import hub
+from backend.supervisor import INSTANCES_DIR
+
+router = APIRouter(tags=["metrics"])
+
+ROOT = Path(__file__).resolve().parents[1]
+LOGS = ROOT / "logs"
+
+# A textfile older than this belongs to a bot that is gone
+STALE_SECONDS = 300
+
+
+def merge_textfiles(texts: List[str]) -> str:
+    """
+    Merge Prometheus textfiles so each metric family is listed once, with its
+    HELP and TYPE lines first and the samples of every file after them
+    """
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split(" ", 3)[2]
+                header = headers.setdefault(family, [])
+                if len(header) < 2 and line not in header:
+                    header.append(line)
+                samples.setdefault(family, [])
+            elif not line.startswith("#") and family is not None:
+                samples[family].append(line)
+
+    lines = []
+    for family, header in headers.items():
+        lines += header + samples[family]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _backend_metrics() -> str:
+    health = supervisor.health()
+    lines = [
+        "# HELP fp_bot_instances Supervised bots by state",
+        "# TYPE fp_bot_instances gauge",
+    ]
+    states: Dict[str, int] = {}
+    for bot in health:
+        states[bot["state"]] = states.get(bot["state"], 0) + 1
+    lines += ['fp_bot_instances{{state="{}"}} {}'.format(s, n) for s, n in sorted(states.items())]
+    lines += [
+        "# HELP fp_bot_restarts_total Restarts of a supervised bot after a crash",
+        "# TYPE fp_bot_restarts_total counter",
+    ]
+    lines += ['fp_bot_restarts_total{{instance="{}"}} {}'.format(b["id"], b["restarts"]) for b in health]
+    lines += [
+        "# HELP fp_cores_in_use Search cores reserved by running bots",
+        "# TYPE fp_cores_in_use gauge",
+        "fp_cores_in_use {}".format(supervisor.cores_in_use()),
+        "# HELP fp_events_received_total Battle events received from the bots",
+        "# TYPE fp_events_received_total counter",
+        "fp_events_received_total {}".format(hub.received),
+        "# HELP fp_events_dropped_total Battle events dropped for slow dashboard clients",
+        "# TYPE fp_events_dropped_total counter",
+        "fp_events_dropped_total {}".format(hub.dropped),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def textfile_paths(logs_dir: Path = LOGS) -> List[Path]:
+    """The textfiles of the default bot and of every other supervised bot"""
+    return sorted(logs_dir.glob("metrics/*.prom")) + sorted(
+        logs_dir.glob("{}/*/metrics/*.prom".format(INSTANCES_DIR))
+    )
+
+
+def read_textfiles(logs_dir: Path = LOGS, now: float = None) -> List[str]:
+    now = now or time.time()
+    texts = []
+    for path in textfile_paths(logs_dir):
+        try:
+            if now - path.stat().st_mtime > STALE_SECONDS:
+                continue
+            texts.append(path.read_text())
+        except OSError:
+            continue
+    return texts
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    return merge_textfiles(read_textfiles() + [_backend_metrics()])
@@ -1,50 +1,50 @@
 """
 Smogon Data Client for FoulPlay V6.6
-Fetches common movesets, items, and spreads from Smogon API
+Serves common movesets, items, and spreads from the local Smogon usage store
 """
 
 import logging
-import requests
 from typing import Dict, List, Optional
 from pathlib import Path
-import json
+
+try:
+    from backend.usage_store import DEFAULT_MIRROR, UsageRefresher, UsageStore
+except ImportError:
+    # imported as a top-level module with backend/ on the path
+    from usage_store import DEFAULT_MIRROR, UsageRefresher, UsageStore
 
 logger = logging.getLogger(__name__)
 
 
 class SmogonClient:
     """
-    Client for fetching Smogon usage data and analyses
+    Client for Smogon usage data
     Used by MCTS to predict opponent moves
+
+    Lookups only read the local usage store and never wait on the network.
+    The store is filled by `python -m backend.usage_store import` or by the
+    background refresh started with `start_refresh`
     """
     
     def __init__(self, cache_dir="logs/smogon_cache"):
         self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.cache = {}
-        self.base_url = "https://pkmn.cc/smogon"
+        self.store = UsageStore(self.cache_dir / "usage.sqlite3")
+        self.refresher = None
     
-    def _get_cache_key(self, pokemon: str, format: str) -> str:
-        """Generate cache key"""
-        return f"{format}:{pokemon.lower()}"
+    def start_refresh(self, formats: List[str], mirror: str = DEFAULT_MIRROR):
+        """Keep `formats` at the newest month of `mirror`, a URL or a local directory"""
+        if self.refresher is None:
+            self.refresher = UsageRefresher(self.store, formats, mirror)
+            self.refresher.start()
     
-    def _load_from_cache(self, key: str) -> Optional[Dict]:
-        """Load from disk cache"""
-        cache_file = self.cache_dir / f"{key.replace(':', '_')}.json"
-        if cache_file.exists():
-            try:
-                return json.loads(cache_file.read_text())
-            except:
-                pass
-        return None
+    def stop_refresh(self):
+        if self.refresher is not None:
+            self.refresher.stop()
+            self.refresher = None
     
-    def _save_to_cache(self, key: str, data: Dict):
-        """Save to disk cache"""
-        cache_file = self.cache_dir / f"{key.replace(':', '_')}.json"
-        try:
-            cache_file.write_text(json.dumps(data, indent=2))
-        except Exception as e:
-            logger.warning(f"Failed to cache {key}: {e}")
+    def get_usage(self, pokemon: str, format: str = "gen9ou") -> Optional[Dict]:
+        """Newest usage data of a Pokemon: moves, items, abilities, spreads, tera_types and teammates"""
+        return self.store.lookup(pokemon, format)
     
     def get_common_moves(self, pokemon: str, format: str = "gen9ou", top_n: int = 4) -> List[str]:
         """
@@ -58,67 +58,10 @@ class SmogonClient:
         Returns:
             List of move names, e.g., ["earthquake", "uturn", "stealthrock", "knockoff"]
         """
-        key = self._get_cache_key(pokemon, format)
-        
-        # Check memory cache
-        if key in self.cache:
-            return self.cache[key].get("moves", [])[:top_n]
-        
-        # Check disk cache
-        cached = self._load_from_cache(key)
-        if cached:
-            self.cache[key] = cached
-            return cached.get("moves", [])[:top_n]
-        
-        # Fetch from API
-        try:
-            url = f"{self.base_url}/analyses/{format}/{pokemon.lower()}"
-            response = requests.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                moves = self._parse_moves(data)
-                
-                # Cache result
-                cache_data = {"moves": moves, "raw": data}
-                self.cache[key] = cache_data
-                self._save_to_cache(key, cache_data)
-                
-                return moves[:top_n]
-            else:
-                logger.warning(f"Smogon API returned {response.status_code} for {pokemon}")
-        except Exception as e:
-            logger.error(f"Failed to fetch Smogon data for {pokemon}: {e}")
-        
-        # Fallback: empty list
-        return []
-    
-    def _parse_moves(self, data: Dict) -> List[str]:
-        """Parse moves from Smogon API response"""
-        moves = []
-        
-        try:
-            # Smogon format: look for most common moveset
-            if "strategies" in data:
-                for strategy in data["strategies"]:
-                    if "movesets" in strategy:
-                        for moveset in strategy["movesets"]:
-                            if "moves" in moveset:
-                                moves.extend(moveset["moves"])
-            
-            # Deduplicate and normalize
-            seen = set()
-            result = []
-            for move in moves:
-                normalized = move.lower().replace(" ", "")
-                if normalized not in seen:
-                    seen.add(normalized)
-                    result.append(normalized)
-            
-            return result
-        except Exception as e:
-            logger.error(f"Failed to parse Smogon moves: {e}")
+        usage = self.get_usage(pokemon, format)
+        if usage is None:
             return []
+        return [move for move, _ in usage["moves"][:top_n]]
     
     def get_common_item(self, pokemon: str, format: str = "gen9ou") -> Optional[str]:
         """
@@ -127,13 +70,10 @@ class SmogonClient:
         Returns:
             Item name, e.g., "choicescarf"
         """
-        key = self._get_cache_key(pokemon, format)
-        
-        if key in self.cache and "item" in self.cache[key]:
-            return self.cache[key]["item"]
-        
-        # For now, return None (can be enhanced later)
-        return None
+        usage = self.get_usage(pokemon, format)
+        if usage is None or not usage["items"]:
+            return None
+        return usage["items"][0][0]
     
     def predict_opponent_moves(self, pokemon_name: str, format: str = "gen9ou") -> List[str]:
         """
@@ -0,0 +1,322 @@
+"""
+Bot supervisor for FoulPlay backend
+Runs several bot processes across formats and accounts within a CPU core budget,
+restarts crashed bots with exponential backoff and reports per-instance health
+"""
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+LOGS = ROOT / "logs"
+
+DEFAULT_INSTANCE = "default"
+# Bots other than the default one write their decisions, snapshots, battle logs and
+# metrics to logs/instances/<instance_id>: the decision store has a single writer
+INSTANCES_DIR = "instances"
+_INSTANCE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+DEFAULT_WEBSOCKET_URI = "wss://sim3.psim.us/showdown/websocket"
+
+# Cores shared by the search pools of all bots
+CPU_BUDGET = int(os.environ.get("FP_CPU_BUDGET", os.cpu_count() or 1))
+
+MIN_BACKOFF_SECONDS = 2
+MAX_BACKOFF_SECONDS = 300
+# A bot that ran this long before crashing starts its backoff over
+STABLE_RUN_SECONDS = 120
+MONITOR_INTERVAL_SECONDS = 1
+STOP_TIMEOUT_SECONDS = 10
+
+# Flags a bot spec cannot pass through extra_args: the supervisor sets them from the
+# spec, and the core budget assumes one battle searching with search_parallelism
+# workers (argparse keeps the last value, so a repeated flag would win)
+SUPERVISED_ARGS = (
+    "--websocket-uri", "--ps-username", "--ps-password", "--bot-mode",
+    "--pokemon-format", "--search-time-ms", "--search-parallelism", "--run-count",
+    "--event-port", "--log-level", "--log-to-file", "--max-concurrent-battles",
+)
+
+
+class SupervisorError(Exception):
+    pass
+
+
+@dataclass
+class BotSpec:
+    ps_username: str
+    ps_password: str
+    pokemon_format: str = "gen9randombattle"
+    search_time_ms: int = 800
+    search_parallelism: int = 1
+    run_count: int = 1
+    bot_mode: str = "search_ladder"
+    websocket_uri: Optional[str] = DEFAULT_WEBSOCKET_URI
+    extra_args: List[str] = field(default_factory=list)
+
+
+@dataclass
+class BotInstance:
+    instance_id: str
+    spec: BotSpec
+    log_path: Path
+    pid_path: Path
+    process: Optional[subprocess.Popen] = None
+    state: str = "stopped"
+    started_at: Optional[float] = None
+    first_started_at: Optional[float] = None
+    restarts: int = 0
+    consecutive_failures: int = 0
+    next_restart_at: Optional[float] = None
+    last_exit_code: Optional[int] = None
+    battles_finished: int = 0
+    wins: int = 0
+    decisions: int = 0
+    decision_ms_total: float = 0.0
+
+    def health(self) -> Dict[str, Any]:
+        now = time.time()
+        uptime = now - self.first_started_at if self.first_started_at else 0
+        return {
+            "id": self.instance_id,
+            "state": self.state,
+            "pid": self.process.pid if self.process is not None and self.state == "running" else None,
+            "account": self.spec.ps_username,
+            "format": self.spec.pokemon_format,
+            "search_parallelism": self.spec.search_parallelism,
+            "uptime_s": round(uptime),
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code,
+            "next_restart_in_s": round(self.next_restart_at - now) if self.next_restart_at else None,
+            "battles_finished": self.battles_finished,
+            "wins": self.wins,
+            "games_per_hour": round(self.battles_finished / (uptime / 3600), 2) if uptime > 0 else 0,
+            "decisions": self.decisions,
+            "avg_decision_ms": round(self.decision_ms_total / self.decisions, 1) if self.decisions else None,
+            "log": str(self.log_path),
+        }
+
+
+def bot_command(spec: BotSpec, event_port: int) -> List[str]:
+    return [
+        sys.executable, "-u", str(ROOT / "foul-play" / "run.py"),
+        "--websocket-uri", spec.websocket_uri or DEFAULT_WEBSOCKET_URI,
+        "--ps-username", spec.ps_username, "--ps-password", spec.ps_password,
+        "--bot-mode", spec.bot_mode,
+        "--pokemon-format", spec.pokemon_format,
+        "--search-time-ms", str(spec.search_time_ms),
+        "--search-parallelism", str(spec.search_parallelism),
+        "--run-count", str(spec.run_count),
+        "--event-port", str(event_port),
+        "--log-level", "DEBUG", "--log-to-file",
+    ] + list(spec.extra_args)
+
+
+def supervised_arg(arg: str) -> Optional[str]:
+    """The supervised flag an extra argument would set, if any"""
+    if not arg.startswith("--"):
+        return None
+    name = arg.split("=", 1)[0]
+    if len(name) <= 2:
+        return None
+    # argparse also accepts an unambiguous prefix of a flag
+    return next((flag for flag in SUPERVISED_ARGS if flag.startswith(name)), None)
+
+
+def instance_log_dir(logs_dir: Path, instance_id: str) -> Path:
+    """The FP_LOG_DIR of a supervised bot"""
+    if instance_id == DEFAULT_INSTANCE:
+        # where the single-bot backend always kept them
+        return Path(logs_dir)
+    return Path(logs_dir) / INSTANCES_DIR / instance_id
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except Exception:
+        return False
+
+
+class BotSupervisor:
+    def __init__(self, event_port: int, cpu_budget: int = CPU_BUDGET, logs_dir: Path = LOGS):
+        self.event_port = event_port
+        self.cpu_budget = cpu_budget
+        self.logs_dir = Path(logs_dir)
+        self.instances: Dict[str, BotInstance] = {}
+        self._lock = threading.RLock()
+        self._monitor = None
+        self._stopping = threading.Event()
+
+    def _paths(self, instance_id: str):
+        bot_dir = self.logs_dir / "bot"
+        bot_dir.mkdir(parents=True, exist_ok=True)
+        if instance_id == DEFAULT_INSTANCE:
+            # where the single-bot backend always kept them
+            return bot_dir / "bot.log", bot_dir / "pid"
+        return bot_dir / "{}.log".format(instance_id), bot_dir / "{}.pid".format(instance_id)
+
+    def cores_in_use(self, exclude: Optional[str] = None) -> int:
+        return sum(
+            i.spec.search_parallelism
+            for i in self.instances.values()
+            if i.instance_id != exclude and i.state in ("running", "backoff")
+        )
+
+    def start(self, instance_id: str, spec: BotSpec) -> BotInstance:
+        if not _INSTANCE_ID.match(instance_id):
+            raise SupervisorError("Invalid bot id '{}'".format(instance_id))
+        for arg in spec.extra_args:
+            flag = supervised_arg(arg)
+            if flag is not None:
+                raise SupervisorError("'{}' cannot be passed in extra_args, it sets {}".format(arg, flag))
+        with self._lock:
+            existing = self.instances.get(instance_id)
+            if existing is not None and existing.state in ("running", "backoff"):
+                raise SupervisorError("Bot '{}' is already running".format(instance_id))
+
+            cores = self.cores_in_use(exclude=instance_id)
+            if cores + spec.search_parallelism > self.cpu_budget:
+                raise SupervisorError(
+                    "Not enough cores: {} in use, {} requested, budget is {}".format(
+                        cores, spec.search_parallelism, self.cpu_budget
+                    )
+                )
+
+            log_path, pid_path = self._paths(instance_id)
+            self._kill_stale(pid_path)
+            instance = BotInstance(instance_id, spec, log_path, pid_path)
+            self.instances[instance_id] = instance
+            self._spawn(instance)
+            self._ensure_monitor()
+            return instance
+
+    def _kill_stale(self, pid_path: Path) -> None:
+        # a bot left behind by a previous backend process
+        try:
+            pid = int(pid_path.read_text().strip())
+        except Exception:
+            return
+        if _is_running(pid):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except Exception:
+                pass
+        pid_path.write_text("")
+
+    def _spawn(self, instance: BotInstance) -> None:
+        env = os.environ.copy()
+        env["PYTHONUNBUFFERED"] = "1"
+        env["FP_INSTANCE_ID"] = instance.instance_id
+        log_dir = instance_log_dir(self.logs_dir, instance.instance_id)
+        log_dir.mkdir(parents=True, exist_ok=True)
+        env["FP_LOG_DIR"] = str(log_dir)
+        with instance.log_path.open("a") as log:
+            instance.process = subprocess.Popen(
+                bot_command(instance.spec, self.event_port),
+                cwd=str(ROOT),
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        instance.pid_path.write_text(str(instance.process.pid))
+        instance.state = "running"
+        instance.started_at = time.time()
+        instance.first_started_at = instance.first_started_at or instance.started_at
+        instance.next_restart_at = None
+
+    def stop(self, instance_id: str) -> bool:
+        with self._lock:
+            instance = self.instances.get(instance_id)
+            if instance is None:
+                self._kill_stale(self._paths(instance_id)[1])
+                return False
+            instance.state = "stopped"
+            instance.next_restart_at = None
+            process = instance.process
+
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(STOP_TIMEOUT_SECONDS)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        instance.pid_path.write_text("")
+        return True
+
+    def stop_all(self) -> None:
+        for instance_id in list(self.instances):
+            self.stop(instance_id)
+        self._stopping.set()
+
+    def _ensure_monitor(self) -> None:
+        if self._monitor is None or not self._monitor.is_alive():
+            self._stopping.clear()
+            self._monitor = threading.Thread(target=self._run_monitor, name="bot-supervisor", daemon=True)
+            self._monitor.start()
+
+    def _run_monitor(self) -> None:
+        while not self._stopping.wait(MONITOR_INTERVAL_SECONDS):
+            self.check()
+
+    def check(self) -> None:
+        """Notices exited bots and restarts crashed ones once their backoff has passed"""
+        now = time.time()
+        with self._lock:
+            for instance in self.instances.values():
+                if instance.state == "running" and instance.process.poll() is not None:
+                    instance.last_exit_code = instance.process.returncode
+                    if instance.last_exit_code == 0:
+                        # played its run count
+                        instance.state = "finished"
+                        instance.pid_path.write_text("")
+                        continue
+
+                    if now - instance.started_at >= STABLE_RUN_SECONDS:
+                        instance.consecutive_failures = 0
+                    backoff = min(
+                        MAX_BACKOFF_SECONDS,
+                        MIN_BACKOFF_SECONDS * 2 ** instance.consecutive_failures,
+                    )
+                    instance.consecutive_failures += 1
+                    instance.state = "backoff"
+                    instance.next_restart_at = now + backoff
+
+                elif instance.state == "backoff" and now >= instance.next_restart_at:
+                    instance.restarts += 1
+                    self._spawn(instance)
+
+    def record_event(self, event: Dict[str, Any]) -> None:
+        """Battle events published by the bots, used for per-instance throughput"""
+        instance = self.instances.get(event.get("instance") or DEFAULT_INSTANCE)
+        if instance is None:
+            return
+        if event.get("type") == "battle_end":
+            instance.battles_finished += 1
+            if event.get("winner") == instance.spec.ps_username:
+                instance.wins += 1
+        elif event.get("type") == "decision":
+            instance.decisions += 1
+            instance.decision_ms_total += (event.get("timings_ms") or {}).get("total", 0)
+
+    def is_running(self, instance_id: str = DEFAULT_INSTANCE) -> bool:
+        instance = self.instances.get(instance_id)
+        if instance is not None:
+            return instance.state in ("running", "backoff")
+        # started by a previous backend process
+        _, pid_path = self._paths(instance_id)
+        try:
+            return _is_running(int(pid_path.read_text().strip()))
+        except Exception:
+            return False
+
+    def health(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [i.health() for i in self.instances.values()]
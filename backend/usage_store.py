@@ -0,0 +1,288 @@
+"""
+Smogon usage data store for FoulPlay
+Imports the monthly chaos stats files into an indexed SQLite store, serves lookups
+from an in-memory LRU and refreshes the store from a mirror in a background thread
+
+    python -m backend.usage_store import stats/2024-05/chaos/gen9ou-1695.json
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = Path("logs") / "smogon_cache" / "usage.sqlite3"
+DEFAULT_MIRROR = "https://www.smogon.com/stats"
+DEFAULT_CUTOFF = 1695
+# Entries kept per category (moves, items, ...) of every Pokemon
+MAX_ENTRIES = 20
+LRU_SIZE = 2048
+REFRESH_INTERVAL_SECONDS = 24 * 3600
+
+_CATEGORIES = {
+    "moves": "Moves",
+    "items": "Items",
+    "abilities": "Abilities",
+    "spreads": "Spreads",
+    "tera_types": "Tera Types",
+    "teammates": "Teammates",
+}
+_MONTH = re.compile(r"^\d{4}-\d{2}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    format TEXT NOT NULL,
+    month TEXT NOT NULL,
+    cutoff INTEGER,
+    battles INTEGER,
+    source TEXT,
+    imported_at REAL NOT NULL,
+    PRIMARY KEY (format, month)
+);
+CREATE TABLE IF NOT EXISTS usage (
+    format TEXT NOT NULL,
+    month TEXT NOT NULL,
+    pokemon TEXT NOT NULL,
+    usage REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (format, month, pokemon)
+);
+"""
+
+
+def normalize(name: str) -> str:
+    return "".join(c for c in name.lower() if c.isalnum())
+
+
+def _weighted(entries: Dict[str, float], total: float, names=normalize) -> List[Tuple[str, float]]:
+    weighted = sorted(entries.items(), key=lambda e: e[1], reverse=True)[:MAX_ENTRIES]
+    return [(names(k), round(v / total, 4)) for k, v in weighted if v > 0]
+
+
+def parse_chaos(stats: Dict[str, Any]) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """(pokemon, usage, {category: [(name, share)]}) for every Pokemon of a chaos stats file"""
+    rows = []
+    for pokemon, entry in stats.get("data", {}).items():
+        # every set has exactly one ability: their weights sum to the Pokemon's total weight
+        total = sum(entry.get("Abilities", {}).values()) or 1
+        data = {
+            # spreads like "Jolly:0/252/0/0/4/252" are kept as they are
+            key: _weighted(entry.get(category, {}), total, str if key == "spreads" else normalize)
+            for key, category in _CATEGORIES.items()
+        }
+        rows.append((normalize(pokemon), entry.get("usage", 0), data))
+    return rows
+
+
+def month_from_path(path: Path) -> Optional[str]:
+    """The month of a file laid out like the Smogon stats site: <month>/chaos/<format>-<cutoff>.json"""
+    for part in reversed(path.parts[:-1]):
+        if _MONTH.match(part):
+            return part
+    return None
+
+
+class UsageStore:
+    """
+    Usage data of every imported format and month, indexed by (format, month, pokemon)
+
+    Lookups read the newest month of a format. They are served from an LRU of
+    `lru_size` Pokemon and never touch the network
+    """
+
+    def __init__(self, path: Path, lru_size: int = LRU_SIZE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._lru: "OrderedDict[Tuple[str, str], Optional[Dict[str, Any]]]" = OrderedDict()
+        self.lru_size = lru_size
+        self._latest_months: Dict[str, Optional[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def import_chaos(self, path: Path, month: str = None, pokemon_format: str = None) -> int:
+        """Import a chaos stats file in one transaction. Returns the number of Pokemon imported"""
+        path = Path(path)
+        month = month or month_from_path(path)
+        if month is None:
+            raise ValueError("No month given and none in the path of {}".format(path))
+        with path.open() as f:
+            stats = json.load(f)
+        info = stats.get("info", {})
+        pokemon_format = pokemon_format or info.get("metagame") or path.stem.rsplit("-", 1)[0]
+        rows = parse_chaos(stats)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM usage WHERE format = ? AND month = ?", (pokemon_format, month)
+            )
+            self._conn.executemany(
+                "INSERT INTO usage (format, month, pokemon, usage, data) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (pokemon_format, month, pokemon, usage, json.dumps(data, separators=(",", ":")))
+                    for pokemon, usage, data in rows
+                ],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    pokemon_format,
+                    month,
+                    info.get("cutoff"),
+                    info.get("number of battles"),
+                    str(path),
+                    time.time(),
+                ),
+            )
+            # lookups of this format now read the new month
+            self._latest_months.pop(pokemon_format, None)
+            for key in [k for k in self._lru if k[0] == pokemon_format]:
+                del self._lru[key]
+
+        logger.info("Imported {} Pokemon of {} {}".format(len(rows), pokemon_format, month))
+        return len(rows)
+
+    def latest_month(self, pokemon_format: str) -> Optional[str]:
+        with self._lock:
+            if pokemon_format not in self._latest_months:
+                row = self._conn.execute(
+                    "SELECT MAX(month) FROM datasets WHERE format = ?", (pokemon_format,)
+                ).fetchone()
+                self._latest_months[pokemon_format] = row[0]
+            return self._latest_months[pokemon_format]
+
+    def datasets(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT format, month, cutoff, battles, source, imported_at FROM datasets "
+                "ORDER BY format, month"
+            ).fetchall()
+        keys = ["format", "month", "cutoff", "battles", "source", "imported_at"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def lookup(self, pokemon: str, pokemon_format: str) -> Optional[Dict[str, Any]]:
+        """The newest usage data of `pokemon` in `pokemon_format`, or None if there is none"""
+        key = (pokemon_format, normalize(pokemon))
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._lru[key]
+            self.misses += 1
+
+            month = self.latest_month(pokemon_format)
+            row = None
+            if month is not None:
+                row = self._conn.execute(
+                    "SELECT usage, data FROM usage WHERE format = ? AND month = ? AND pokemon = ?",
+                    (pokemon_format, month, key[1]),
+                ).fetchone()
+            data = None
+            if row is not None:
+                data = dict(json.loads(row[1]), usage=row[0], month=month)
+
+            self._lru[key] = data
+            if len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return data
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def expected_month(now: float = None) -> str:
+    """The newest month the stats site has published: stats come out early in the next month"""
+    t = time.gmtime(now or time.time())
+    year, month = (t.tm_year, t.tm_mon - 1) if t.tm_mon > 1 else (t.tm_year - 1, 12)
+    return "{:04d}-{:02d}".format(year, month)
+
+
+class UsageRefresher:
+    """
+    Keeps the store's formats at the newest month from a background thread
+
+    `mirror` is the stats site, another HTTP mirror of it or a local directory with
+    the same <month>/chaos/<format>-<cutoff>.json layout
+    """
+
+    def __init__(
+        self,
+        store: UsageStore,
+        formats: List[str],
+        mirror: str = DEFAULT_MIRROR,
+        cutoff: int = DEFAULT_CUTOFF,
+        interval: float = REFRESH_INTERVAL_SECONDS,
+    ):
+        self.store = store
+        self.formats = formats
+        self.mirror = mirror
+        self.cutoff = cutoff
+        self.interval = interval
+        self.download_dir = store.path.parent / "chaos"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _fetch(self, month: str, pokemon_format: str) -> Path:
+        relative = "{}/chaos/{}-{}.json".format(month, pokemon_format, self.cutoff)
+        if not self.mirror.startswith(("http://", "https://")):
+            return Path(self.mirror) / relative
+
+        # only the refresh job needs the network
+        import requests
+
+        destination = self.download_dir / relative
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = destination.with_suffix(".part")
+        with requests.get("{}/{}".format(self.mirror.rstrip("/"), relative), stream=True, timeout=60) as r:
+            r.raise_for_status()
+            with tmp_path.open("wb") as f:
+                shutil.copyfileobj(r.raw, f)
+        os.replace(tmp_path, destination)
+        return destination
+
+    def refresh(self) -> None:
+        month = expected_month()
+        for pokemon_format in self.formats:
+            current = self.store.latest_month(pokemon_format)
+            if current is not None and current >= month:
+                continue
+            try:
+                self.store.import_chaos(self._fetch(month, pokemon_format), month, pokemon_format)
+            except Exception as e:
+                logger.warning(
+                    "Could not refresh usage of {} {}: {}".format(pokemon_format, month, e)
+                )
+
+    def _run(self) -> None:
+        while True:
+            self.refresh()
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="usage-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 3 or sys.argv[1] != "import":
+        print("usage: python -m backend.usage_store import <chaos.json> [month] [format]")
+        sys.exit(1)
+    UsageStore(DEFAULT_DB).import_chaos(Path(sys.argv[2]), *sys.argv[3:5])
@@ -0,0 +1,163 @@
+"""
+Throughput benchmark of the protocol engine on recorded battle logs
+
+    python benchmark_protocol.py --corpus logs --output protocol.json
+
+The corpus is a directory searched for `*.log` files of two kinds:
+- the bot's own logs at debug level: every "Received message from websocket"
+  frame of a battle room is replayed as it was received
+- Showdown replay logs (the spectator view): one battle per file, replayed
+  one turn per frame
+
+Every battle is replayed into a fresh `Battle` with `process_battle_updates`.
+Only the replay is timed, not reading the logs.
+Format mods are global, so `--format` applies its mods and only replays its
+battles. Without it every battle is replayed with the current generation's data
+
+The report is JSON: messages and frames per second and the per-frame latency
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+from config import init_logging
+from data.mods.apply_mods import apply_mods
+from fp.battle import Battle
+from fp.battle_modifier import process_battle_updates
+from benchmark_search import git_commit, summarize
+
+logger = logging.getLogger(__name__)
+
+RECEIVED_MARKER = "Received message from websocket: "
+
+
+def frames_from_bot_log(lines):
+    """{battle_tag: [frame lines]} of the frames the bot received from battle rooms"""
+    battles = {}
+    frame = None
+    for line in lines:
+        if RECEIVED_MARKER in line:
+            room = line.split(RECEIVED_MARKER, 1)[1]
+            frame = None
+            if room.startswith(">battle-"):
+                frame = [room]
+                battles.setdefault(room[1:].strip(), []).append(frame)
+        elif frame is not None and line.startswith("|"):
+            frame.append(line)
+        else:
+            frame = None
+    return battles
+
+
+def frames_from_replay_log(lines):
+    frames = [[]]
+    for line in lines:
+        if not line.startswith("|"):
+            continue
+        frames[-1].append(line)
+        if line.startswith("|turn|"):
+            frames.append([])
+    return [f for f in frames if f]
+
+
+def load_corpus(corpus, pokemon_format=None):
+    """[(battle_tag, pokemon_format, frames)] of every battle in the corpus"""
+    battles = []
+    for path in sorted(Path(corpus).rglob("*.log")):
+        lines = path.read_text(errors="replace").splitlines()
+        if any(RECEIVED_MARKER in line for line in lines):
+            recorded = frames_from_bot_log(lines)
+        else:
+            recorded = {path.stem: frames_from_replay_log(lines)}
+
+        for battle_tag, frames in recorded.items():
+            battle_format = battle_tag.split("-")[1] if battle_tag.startswith("battle-") else None
+            for line in (l for f in frames for l in f if l.startswith("|tier|")):
+                # "[Gen 9] OU" -> gen9ou
+                tier = "".join(c for c in line.split("|")[2].lower() if c.isalnum())
+                battle_format = battle_format or tier
+            if pokemon_format is None or battle_format == pokemon_format:
+                battles.append((battle_tag, battle_format or "gen9ou", frames))
+    return battles
+
+
+def replay_battle(battle_tag, pokemon_format, frames):
+    """Per-frame seconds of replaying one battle"""
+    battle = Battle(battle_tag)
+    battle.pokemon_format = pokemon_format
+    battle.generation = pokemon_format[:4]
+    frame_seconds = []
+    for frame in frames:
+        start_time = time.perf_counter()
+        process_battle_updates(battle, frame)
+        frame_seconds.append(time.perf_counter() - start_time)
+    return frame_seconds
+
+
+def benchmark(battles, repeat, warmup):
+    for battle_tag, pokemon_format, frames in battles[:warmup]:
+        replay_battle(battle_tag, pokemon_format, frames)
+
+    frame_seconds = []
+    for _ in range(repeat):
+        for battle_tag, pokemon_format, frames in battles:
+            frame_seconds += replay_battle(battle_tag, pokemon_format, frames)
+
+    messages = repeat * sum(
+        1 for _, _, frames in battles for f in frames for line in f if line.startswith("|")
+    )
+    total_seconds = sum(frame_seconds)
+    return {
+        "battles": len(battles),
+        "frames": len(frame_seconds),
+        "messages": messages,
+        "seconds": round(total_seconds, 4),
+        "messages_per_second": round(messages / total_seconds) if total_seconds else None,
+        "frames_per_second": round(len(frame_seconds) / total_seconds) if total_seconds else None,
+        "frame_us": summarize([s * 1e6 for s in frame_seconds]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the protocol engine on recorded battles")
+    parser.add_argument("--corpus", required=True, help="Directory of battle logs")
+    parser.add_argument("--format", default=None, help="Only replay this format, with its mods")
+    parser.add_argument("--repeat", type=int, default=5, help="Times each battle is replayed")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed battles before measuring")
+    parser.add_argument("--output", default=None, help="Write the report here instead of stdout")
+    parser.add_argument("--log-level", default="ERROR", help="Python logging level")
+    args = parser.parse_args()
+
+    init_logging(args.log_level, False)
+    if args.format is not None:
+        apply_mods(args.format)
+
+    battles = load_corpus(args.corpus, args.format)
+    if not battles:
+        logger.error("No battles found in {}".format(args.corpus))
+        sys.exit(1)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "format": args.format,
+        "repeat": args.repeat,
+        "results": benchmark(battles, args.repeat, args.warmup),
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
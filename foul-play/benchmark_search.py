@@ -0,0 +1,300 @@
+"""
+Offline benchmark of the full decision path
+
+    python benchmark_search.py --output bench.json
+
+The corpus is a directory of decision snapshots (see `save_search_snapshot`) and
+of the bot's debug logs of battles, whose decisions are rebuilt by replaying them
+the way `run_battle` does. The default corpus is the battles pinned in
+benchmarks/corpus, so every run decides the same positions: over 20 decisions
+of each of gen9randombattle, gen9ou and gen9battlefactory.
+Every decision is made with `find_best_move`, or `find_team_order` at team
+preview, using a pinned seed and a frozen
+search budget: the plan depends neither on the recorded timer nor on how long the
+previous searches took, and no refinement is searched. Runs on different commits
+search the same sampled battles.
+Formats apply global mods so each format is benchmarked in its own process.
+
+The report is JSON, one entry per format:
+decision latency percentiles, the time spent in each stage of the search,
+MCTS iterations per second and peak RSS
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from copy import deepcopy
+from pathlib import Path
+
+from config import FoulPlayConfig, init_logging
+from data.mods.apply_mods import apply_mods
+from fp.battle import Battle, Pokemon
+from fp.battle_modifier import process_battle_updates
+from fp.decision_logger import is_replayable, load_search_snapshot
+from fp.format_context import battle_type_of, load_format_datasets
+from fp.search.determinizations import determinization_controller
+from fp.search.main import find_best_move
+from fp.search.team_preview import find_team_order, team_preview_cache
+from fp.search.time_budget import search_budget
+from fp.search.transpositions import transposition_table
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "corpus")
+
+STAGES = ["deepcopy", "sampling", "conversion", "submit", "search", "aggregation", "total"]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = (len(values) - 1) * pct / 100
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "mean": round(sum(values) / len(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def find_corpus(corpus):
+    """{format: [snapshot path or (battle_tag, frames) of a battle log]}"""
+    # imported here: benchmark_protocol imports this module
+    from benchmark_protocol import load_corpus
+
+    formats = {}
+    for path in sorted(str(p) for p in Path(corpus).rglob("*.pickle")):
+        snapshot = load_search_snapshot(path)
+        formats.setdefault(snapshot["pokemon_format"], []).append(path)
+    for battle_tag, pokemon_format, frames in load_corpus(corpus):
+        formats.setdefault(pokemon_format, []).append((battle_tag, frames))
+    return formats
+
+
+def snapshots_from_battle(battle_tag, pokemon_format, frames):
+    """The decisions of a logged battle as `run_battle` gives them to the search"""
+    battle = Battle(battle_tag)
+    battle.pokemon_format = pokemon_format
+    battle.generation = pokemon_format[:4]
+    battle.battle_type = battle_type_of(pokemon_format)
+    snapshots = []
+    for frame in frames:
+        if process_battle_updates(battle, frame):
+            battle_copy = deepcopy(battle)
+            if battle.team_preview:
+                battle_copy.user.active = Pokemon.get_dummy()
+                battle_copy.opponent.active = Pokemon.get_dummy()
+            else:
+                battle_copy.user.update_from_request_json(battle_copy.request_json)
+            snapshots.append(
+                {
+                    "battle_id": battle_tag,
+                    "turn": battle.turn,
+                    "pokemon_format": pokemon_format,
+                    "battle": battle_copy,
+                    "search": {},
+                }
+            )
+    return snapshots
+
+
+def load_snapshots(pokemon_format, sources):
+    snapshots = []
+    for source in sources:
+        if isinstance(source, str):
+            snapshot = load_search_snapshot(source)
+            if is_replayable(snapshot["search"]):
+                snapshots.append(snapshot)
+        else:
+            snapshots += snapshots_from_battle(source[0], pokemon_format, source[1])
+    return snapshots
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    scale = 1024 if sys.platform == "darwin" else 1
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale,
+    }
+
+
+def decide_snapshot(snapshot, seed):
+    # every decision is planned from scratch so the result does not depend on corpus order
+    battle = snapshot["battle"]
+    search_budget.forget(battle.battle_tag)
+    search_budget.overhead_ms.clear()
+    determinization_controller.forget(battle.battle_tag)
+    transposition_table.clear()
+    team_preview_cache.clear()
+
+    search_stats = {}
+    start_time = time.time()
+    if battle.team_preview:
+        find_team_order(battle, search_stats, seed=seed)
+    else:
+        find_best_move(battle, search_stats, seed=seed)
+    search_stats["latency_ms"] = (time.time() - start_time) * 1000
+    return search_stats
+
+
+def benchmark_format(pokemon_format, sources, seed, repeat, warmup):
+    FoulPlayConfig.pokemon_format = pokemon_format
+    apply_mods(pokemon_format)
+    load_format_datasets(pokemon_format)
+
+    snapshots = load_snapshots(pokemon_format, sources)
+    for snapshot in snapshots[:warmup]:
+        decide_snapshot(snapshot, seed)
+
+    decisions = []
+    for _ in range(repeat):
+        for snapshot in snapshots:
+            decisions.append(decide_snapshot(snapshot, seed))
+
+    stages = {stage: [] for stage in STAGES}
+    iterations_per_second = []
+    for d in decisions:
+        for stage in STAGES:
+            stages[stage].append(d["timings_ms"].get(stage, 0))
+        search_ms = d["timings_ms"].get("search", 0)
+        if search_ms > 0:
+            iterations_per_second.append(d["total_visits"] / (search_ms / 1000))
+
+    return {
+        "battle_type": str(snapshots[0]["battle"].battle_type) if snapshots else None,
+        "snapshots": len(snapshots),
+        "decisions": len(decisions),
+        "latency_ms": summarize([d["latency_ms"] for d in decisions]),
+        "stage_ms": {stage: summarize(values) for stage, values in stages.items()},
+        "iterations_per_second": summarize(iterations_per_second),
+        "total_visits": sum(d["total_visits"] for d in decisions),
+        "sample_digests": sorted({d["sample_digest"] for d in decisions}),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_format_in_subprocess(pokemon_format, args):
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--corpus",
+        args.corpus,
+        "--format",
+        pokemon_format,
+        "--seed",
+        str(args.seed),
+        "--repeat",
+        str(args.repeat),
+        "--warmup",
+        str(args.warmup),
+        "--search-time-ms",
+        str(args.search_time_ms),
+        "--parallelism",
+        str(args.parallelism),
+        "--log-level",
+        args.log_level,
+    ]
+    if args.fused_search:
+        command.append("--fused-search")
+    if args.stratified_sampling:
+        command.append("--stratified-sampling")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "report.json")
+        subprocess.check_call(command + ["--output", output_path])
+        with open(output_path) as f:
+            return json.load(f)["formats"][pokemon_format]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search on recorded decisions")
+    parser.add_argument(
+        "--corpus",
+        default=DEFAULT_CORPUS,
+        help="Directory of decision snapshots and battle logs, the pinned corpus by default",
+    )
+    parser.add_argument("--format", default=None, help="Only benchmark this format")
+    parser.add_argument("--seed", type=int, default=0, help="Seed used for every decision")
+    parser.add_argument("--repeat", type=int, default=1, help="Times each snapshot is decided")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed decisions before measuring")
+    parser.add_argument("--search-time-ms", type=int, default=100)
+    parser.add_argument("--parallelism", type=int, default=1)
+    parser.add_argument("--fused-search", action="store_true", default=False)
+    parser.add_argument("--stratified-sampling", action="store_true", default=False)
+    parser.add_argument("--output", default=None, help="Write the report here instead of stdout")
+    parser.add_argument("--log-level", default="WARNING", help="Python logging level")
+    args = parser.parse_args()
+
+    init_logging(args.log_level, False)
+    FoulPlayConfig.search_time_ms = args.search_time_ms
+    FoulPlayConfig.parallelism = args.parallelism
+    FoulPlayConfig.fused_search = args.fused_search
+    FoulPlayConfig.stratified_sampling = args.stratified_sampling
+    search_budget.frozen = True
+
+    formats = find_corpus(args.corpus)
+    if args.format is not None:
+        formats = {args.format: formats.get(args.format, [])}
+    if not any(formats.values()):
+        logger.error("No snapshots found in {}".format(args.corpus))
+        sys.exit(1)
+
+    if len(formats) == 1:
+        results = {
+            f: benchmark_format(f, sources, args.seed, args.repeat, args.warmup)
+            for f, sources in formats.items()
+        }
+    else:
+        results = {f: run_format_in_subprocess(f, args) for f in sorted(formats)}
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "search_time_ms": args.search_time_ms,
+        "parallelism": args.parallelism,
+        "fused_search": args.fused_search,
+        "stratified_sampling": args.stratified_sampling,
+        "formats": results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
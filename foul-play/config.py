@@ -15,9 +15,8 @@ class CustomFormatter(logging.Formatter):
 
 class CustomRotatingFileHandler(RotatingFileHandler):
     def __init__(self, file_name, **kwargs):
-        self.base_dir = "logs"
-        if not os.path.exists(self.base_dir):
-            os.mkdir(self.base_dir)
+        self.base_dir = os.environ.get("FP_LOG_DIR", "logs")
+        os.makedirs(self.base_dir, exist_ok=True)
 
         super().__init__("{}/{}".format(self.base_dir, file_name), **kwargs)
 
@@ -42,7 +41,7 @@ def init_logging(level, log_to_file):
     FoulPlayConfig.stdout_log_handler = stdout_handler
 
     if log_to_file:
-        file_handler = CustomRotatingFileHandler(os.path.join(os.environ.get("FP_LOG_DIR", "."), "bot.log"))
+        file_handler = CustomRotatingFileHandler("bot.log")
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(CustomFormatter())
         logger.addHandler(file_handler)
@@ -61,6 +60,16 @@ class BotModes(Enum):
     search_ladder = auto()
 
 
+def parse_daemon_formats(value: str) -> list[(str, str)]:
+    """`format[:team_name],...` -> [(format, team name)]"""
+    formats = []
+    for entry in (value or "").split(","):
+        if entry.strip():
+            pokemon_format, _, team_name = entry.strip().partition(":")
+            formats.append((pokemon_format, team_name or pokemon_format))
+    return formats
+
+
 class _FoulPlayConfig:
     websocket_uri: str
     username: str
@@ -87,6 +96,21 @@ class _FoulPlayConfig:
     epoke_timeout_ms: int = 900
     decision_deadline_ms: int = 5000
     max_concurrent_battles: int = 1
+    fused_search: bool = False
+    save_decision_snapshots: bool = True
+    max_decision_snapshots: int = 2000
+    decision_log_queue_size: int = 1000
+    decision_log_flush_ms: int = 200
+    event_port: int = 0
+    profile_every_n_turns: int = 0
+    profile_slow_turn_ms: int = 0
+    profile_interval_ms: float = 5
+    opening_book: str = None
+    opening_book_mode: str = "refine"
+    opening_book_max_entries: int = 20000
+    stratified_sampling: bool = False
+    # (format, team name) of every format played, in turn
+    formats: list = ()
 
     def configure(self):
         parser = argparse.ArgumentParser()
@@ -139,6 +163,13 @@ class _FoulPlayConfig:
             "If a foldername, a random team from that folder will be chosen each battle. "
             "If not set, defaults to the --pokemon-format value.",
         )
+        parser.add_argument(
+            "--daemon-formats",
+            default=None,
+            help="Comma separated formats to play in turn with --pokemon-format, each "
+            "optionally followed by :team_name, e.g. gen9randombattle,gen9ou:gen9/ou. "
+            "They must be of the same generation as --pokemon-format",
+        )
         parser.add_argument(
             "--save-replay",
             default="never",
@@ -186,6 +217,88 @@ class _FoulPlayConfig:
             help="Maximum number of simultaneous battles (recommended: 1 for stability)",
         )
 
+        parser.add_argument(
+            "--fused-search",
+            action="store_true",
+            help="Sample battles inside the search worker processes instead of the main process. "
+            "Each worker receives the observed battle once along with a seed",
+        )
+
+        parser.add_argument(
+            "--no-decision-snapshots",
+            action="store_true",
+            help="Do not save the battle and search seed of each decision. "
+            "Snapshots are needed to replay a decision with replay_decision.py",
+        )
+        parser.add_argument(
+            "--max-decision-snapshots",
+            type=int,
+            default=2000,
+            help="Most decision snapshots to keep, the oldest are deleted first. 0 keeps them all",
+        )
+        parser.add_argument(
+            "--decision-log-queue-size",
+            type=int,
+            default=1000,
+            help="Decisions waiting to be written before new ones are dropped",
+        )
+        parser.add_argument(
+            "--decision-log-flush-ms",
+            type=int,
+            default=200,
+            help="How long the decision log writer collects decisions before writing them",
+        )
+        parser.add_argument(
+            "--event-port",
+            type=int,
+            default=0,
+            help="Publish live battle events to the backend on this localhost UDP port. 0 disables",
+        )
+        parser.add_argument(
+            "--profile-every-n-turns",
+            type=int,
+            default=0,
+            help="Save a sampling profile of the decision of every Nth turn. 0 disables",
+        )
+        parser.add_argument(
+            "--profile-slow-turn-ms",
+            type=int,
+            default=0,
+            help="Save a sampling profile of decisions that take at least this long. 0 disables",
+        )
+        parser.add_argument(
+            "--profile-interval-ms",
+            type=float,
+            default=5,
+            help="How often the profiler samples the stack of a profiled decision",
+        )
+        parser.add_argument(
+            "--stratified-sampling",
+            action="store_true",
+            help="Search the most probable sets of the opponent's revealed Pokemon instead of "
+            "sampling them at random. Fewer battles are searched when a few sets are likely. "
+            "Not used with --fused-search",
+        )
+        parser.add_argument(
+            "--opening-book",
+            default=None,
+            help="Keep the search results of the first turns of battles in this file "
+            "and reuse them in later battles with the same team",
+        )
+        parser.add_argument(
+            "--opening-book-mode",
+            default="refine",
+            choices=["answer", "refine"],
+            help="What to do in a position searched in enough earlier battles: "
+            "answer from the opening book without searching, or search and add to it",
+        )
+        parser.add_argument(
+            "--opening-book-max-entries",
+            type=int,
+            default=20000,
+            help="Positions kept in the opening book. The least recently searched are dropped",
+        )
+
         args = parser.parse_args()
         self.websocket_uri = args.websocket_uri
         self.username = args.ps_username
@@ -209,6 +322,22 @@ class _FoulPlayConfig:
         self.epoke_timeout_ms = args.epoke_timeout_ms
         self.decision_deadline_ms = args.decision_deadline_ms
         self.max_concurrent_battles = args.max_concurrent_battles
+        self.fused_search = args.fused_search
+        self.save_decision_snapshots = not args.no_decision_snapshots
+        self.max_decision_snapshots = args.max_decision_snapshots
+        self.decision_log_queue_size = args.decision_log_queue_size
+        self.decision_log_flush_ms = args.decision_log_flush_ms
+        self.event_port = args.event_port
+        self.profile_every_n_turns = args.profile_every_n_turns
+        self.profile_slow_turn_ms = args.profile_slow_turn_ms
+        self.profile_interval_ms = args.profile_interval_ms
+        self.opening_book = args.opening_book
+        self.opening_book_mode = args.opening_book_mode
+        self.opening_book_max_entries = args.opening_book_max_entries
+        self.stratified_sampling = args.stratified_sampling
+        self.formats = [(self.pokemon_format, self.team_name)] + parse_daemon_formats(
+            args.daemon_formats
+        )
         
         logger = logging.getLogger(__name__)
         if self.enable_epoke:
@@ -232,6 +361,9 @@ class _FoulPlayConfig:
             assert (
                 self.user_to_challenge is not None
             ), "If bot_mode is `CHALLENGE_USER`, you must declare USER_TO_CHALLENGE"
+        assert all(
+            f[:4] == self.pokemon_format[:4] for f, _ in self.formats
+        ), "Every format played by one process must be of the same generation"
 
 
 FoulPlayConfig = _FoulPlayConfig()
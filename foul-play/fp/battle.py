@@ -21,7 +21,7 @@ LastUsedMove = namedtuple("LastUsedMove", ["pokemon_name", "move", "turn"])
 DamageDealt = namedtuple(
     "DamageDealt", ["attacker", "defender", "move", "percent_damage", "crit"]
 )
-StatRange = namedtuple("Range", ["min", "max"])
+StatRange = namedtuple("StatRange", ["min", "max"])
 
 
 # Based on the format, this dict controls which pokemon will be replaced during team preview
@@ -85,13 +85,24 @@ class Battle:
         self.battle_type = None
         self.pokemon_format = None
         self.generation = None
+        # seconds left in the time bank and before the timer runs out this turn
         self.time_remaining = None
+        self.turn_time_remaining = None
+        # (turn, user active, opponent active, our effective speed, opponent speed multiplier)
+        self.turn_start_speeds = None
 
         self.request_json = None
         self.msg_list = []
 
+        # set by a request and cleared once the bot has been asked to act on it
+        self.request_pending = False
+        # a decision point was seen before its request arrived
+        self.awaiting_request = False
+        self.team_preview_pokemon = []
+
     def initialize_team_preview(self, opponent_pokemon, battle_type):
-        self.user.reserve.insert(0, self.user.active)
+        if self.user.active is not None:
+            self.user.reserve.insert(0, self.user.active)
         self.user.active = None
 
         for pkmn_string in opponent_pokemon:
@@ -131,60 +142,66 @@ class Battle:
             or "nationaldex" in self.pokemon_format
         )
 
-    def get_effective_speed(self, battler):
-        boosted_speed = battler.active.calculate_boosted_stats()[constants.SPEED]
+    def get_speed_multiplier(self, battler, include_item=True):
+        """Everything the speed stat of `battler`'s active is multiplied by"""
+        multiplier = boost_multiplier_lookup[battler.active.boosts[constants.SPEED]]
 
         if self.weather == constants.SUN and battler.active.ability == "chlorophyll":
-            boosted_speed *= 2
+            multiplier *= 2
         elif self.weather == constants.RAIN and battler.active.ability == "swiftswim":
-            boosted_speed *= 2
+            multiplier *= 2
         elif self.weather == constants.SAND and battler.active.ability == "sandrush":
-            boosted_speed *= 2
+            multiplier *= 2
         elif (
             self.weather in constants.HAIL_OR_SNOW
             and battler.active.ability == "slushrush"
         ):
-            boosted_speed *= 2
+            multiplier *= 2
 
         if (
             self.field == constants.ELECTRIC_TERRAIN
             and battler.active.ability == "surgesurfer"
         ):
-            boosted_speed *= 2
+            multiplier *= 2
 
         if battler.active.ability == "unburden" and not battler.active.item:
-            boosted_speed *= 2
+            multiplier *= 2
         elif (
             battler.active.ability == "quickfeet" and battler.active.status is not None
         ):
-            boosted_speed *= 1.5
+            multiplier *= 1.5
 
         if battler.side_conditions[constants.TAILWIND]:
-            boosted_speed *= 2
+            multiplier *= 2
 
-        if "choicescarf" == battler.active.item:
-            boosted_speed *= 1.5
+        if include_item and "choicescarf" == battler.active.item:
+            multiplier *= 1.5
 
         if (
             constants.PARALYZED == battler.active.status
             and battler.active.ability != "quickfeet"
         ):
-            boosted_speed *= 0.5
+            multiplier *= 0.5
 
         if any(
             vs in battler.active.volatile_statuses
             for vs in ["quarkdrivespe", "protosynthesisspe"]
         ):
-            boosted_speed *= 1.5
+            multiplier *= 1.5
+
+        return multiplier
 
-        return int(boosted_speed)
+    def get_effective_speed(self, battler):
+        return int(
+            battler.active.stats[constants.SPEED] * self.get_speed_multiplier(battler)
+        )
 
 
 class Battler:
     def __init__(self):
         self.active = None
         self.reserve = []
-        self.side_conditions = defaultdict(lambda: 0)
+        self.side_conditions = defaultdict(int)
 
         self.name = None
         self.trapped = False
@@ -590,8 +607,8 @@ class Pokemon:
         self.moves = []
         self.status = None
         self.volatile_statuses = []
-        self.volatile_status_durations = defaultdict(lambda: 0)
-        self.boosts = defaultdict(lambda: 0)
+        self.volatile_status_durations = defaultdict(int)
+        self.boosts = defaultdict(int)
         self.rest_turns = 0
         self.sleep_turns = 0
         self.knocked_off = False
@@ -27,7 +27,7 @@ from fp.battle import Pokemon, Battler, Battle
 from fp.battle import LastUsedMove
 from fp.battle import DamageDealt
 from fp.battle import StatRange
-from fp.search.poke_engine_helpers import poke_engine_get_damage_rolls
+from fp.speed_inference import record_turn_start_speeds, update_speed_range
 from fp.helpers import normalize_name, type_effectiveness_modifier
 from fp.helpers import get_pokemon_info_from_condition
 from fp.helpers import calculate_stats
@@ -190,15 +190,681 @@ def unlikely_to_have_choice_item(move_name):
     return False
 
 
+def check_speed_from_turn_order(battle, battler, move_name):
+    """
+    Narrows the speed range of the opponent's active when `battler` moves second this turn
+    with a move of the same priority as the other active's move
+    """
+    other = battle.user if battler is battle.opponent else battle.opponent
+    other_move = other.last_used_move
+    if battler is battle.user:
+        user_move, opponent_move = move_name, other_move.move
+    else:
+        user_move, opponent_move = other_move.move, move_name
+    if (
+        other_move.turn != battle.turn
+        or battler.last_used_move.turn == battle.turn
+        or other.active is None
+        or other_move.pokemon_name != other.active.name
+        or user_move not in all_move_json
+        or opponent_move not in all_move_json
+        or all_move_json[user_move].get(constants.PRIORITY, 0)
+        != all_move_json[opponent_move].get(constants.PRIORITY, 0)
+        or can_have_priority_modified(battle, battle.user.active, user_move)
+        or can_have_priority_modified(battle, battle.opponent.active, opponent_move)
+        or can_have_speed_modified(battle, battle.opponent.active)
+    ):
+        return
+
+    update_speed_range(battle, opponent_moved_first=battler is battle.user)
+
+
+def get_battler(battle, ident):
+    """The side of a protocol identifier like "p2a: Nickname" or "p1: Username" """
+    side = ident[:2]
+    if battle.user.name in ("p1", "p2"):
+        return battle.user if side == battle.user.name else battle.opponent
+    # no request seen yet, e.g. when replaying a spectator log: p1 is the user
+    return battle.opponent if side == "p2" else battle.user
+
+
 def is_opponent(battle, split_msg):
-    ident = str(split_msg[2]) if len(split_msg) > 2 else ""
-    token = ident.split(":", 1)[0].strip()
-    side = token[:2] if token.startswith(("p1","p2")) else None
-    my_side = getattr(getattr(battle, "user", None), "id", None)
-    if my_side in ("p1","p2") and side in ("p1","p2"):
-        return side != my_side
-    return token.startswith("p2")
+    ident = str(split_msg[2]).strip() if len(split_msg) > 2 else ""
+    return get_battler(battle, ident) is battle.opponent
+
 
+def get_pokemon(battle, ident):
+    """
+    The pokemon a protocol identifier refers to
+    "p2a: Nickname" is the active pokemon of p2, "p2: Nickname" any pokemon of p2
+    """
+    battler = get_battler(battle, ident)
+    if len(ident) > 2 and ident[2] != ":":
+        return battler.active
 
-def process_battle_updates(*args, **kwargs):
+    nickname = Pokemon.extract_nickname_from_pokemonshowdown_string(ident)
+    for pkmn in [battler.active] + battler.reserve:
+        if pkmn is not None and pkmn.nickname == nickname:
+            return pkmn
+    return battler.active
+
+
+def get_tag(split_msg, tag):
+    """The value of a tag like "[from]" or "[of]" in a protocol message, or None"""
+    for part in split_msg[3:]:
+        if part.startswith(tag):
+            return part[len(tag) :].strip()
     return None
+
+
+def _effect_name(effect):
+    # "move: Stealth Rock", "ability: Drizzle" and "item: Leftovers" name the effect after the colon
+    return normalize_name(effect.split(":", 1)[-1])
+
+
+def _reveal_from_effect(battle, split_msg, default_pkmn):
+    """
+    Sets the item or ability named by the message's "[from]" tag
+    It belongs to the "[of]" pokemon if there is one, otherwise to `default_pkmn`
+    """
+    effect = get_tag(split_msg, "[from]")
+    if effect is None:
+        return
+    of = get_tag(split_msg, "[of]")
+    pkmn = get_pokemon(battle, of) if of else default_pkmn
+    if pkmn is None:
+        return
+    if effect.startswith("item:"):
+        pkmn.item = _effect_name(effect)
+    elif effect.startswith("ability:"):
+        pkmn.ability = _effect_name(effect)
+
+
+def _set_condition(battle, battler, pkmn, condition):
+    hp, max_hp, status = get_pokemon_info_from_condition(condition.strip())
+    if max_hp == 0:
+        pkmn.hp = 0
+    elif battler is battle.user and battle.request_json is not None:
+        # the bot's own pokemon are shown with their exact hp
+        pkmn.hp = hp
+        pkmn.max_hp = max_hp
+    else:
+        pkmn.hp = round(pkmn.max_hp * hp / max_hp)
+    pkmn.status = status
+
+
+def _reset_on_switch_out(battler, pkmn):
+    if constants.TYPECHANGE in pkmn.volatile_statuses or constants.TRANSFORM in pkmn.volatile_statuses:
+        pkmn.types = pokedex[pkmn.name][constants.TYPES]
+    if constants.TRANSFORM in pkmn.volatile_statuses:
+        stats = calculate_stats(pkmn.base_stats, pkmn.level, nature=pkmn.nature, evs=pkmn.evs)
+        stats.pop(constants.HITPOINTS)
+        pkmn.stats = stats
+    if pkmn.ability == "regenerator" and pkmn.hp > 0:
+        # regenerator's healing is not shown in the protocol
+        pkmn.hp = min(pkmn.max_hp, pkmn.hp + int(pkmn.max_hp / 3))
+    pkmn.boosts.clear()
+    pkmn.volatile_statuses = []
+    pkmn.volatile_status_durations.clear()
+    pkmn.moves_used_since_switch_in = set()
+    battler.side_conditions[constants.TOXIC_COUNT] = 0
+
+
+def _find_switch_in(battler, ident, details):
+    nickname = Pokemon.extract_nickname_from_pokemonshowdown_string(ident)
+    pkmn = battler.find_reserve_pokemon_by_nickname(nickname)
+    if pkmn is None:
+        pkmn_name = normalize_name(details.split(",")[0])
+        pkmn = battler.find_pokemon_in_reserves(pkmn_name)
+        if pkmn is None and pkmn_name in pokedex:
+            pkmn = battler.find_reserve_pkmn_by_unknown_forme(pkmn_name)
+            if pkmn is not None:
+                pkmn.forme_change(details)
+                pkmn.unknown_forme = False
+
+    if pkmn is None:
+        return Pokemon.from_switch_string(details, nickname=ident)
+
+    battler.reserve.remove(pkmn)
+    if pkmn.nickname is None:
+        pkmn.nickname = nickname
+    return pkmn
+
+
+def switch_or_drag(battle, split_msg):
+    battler = get_battler(battle, split_msg[2])
+    outgoing = battler.active
+    boosts = None
+    if outgoing is not None and outgoing.name:
+        if battler.last_used_move.move == "batonpass" and battler.last_used_move.turn == battle.turn:
+            boosts = copy(outgoing.boosts)
+        _reset_on_switch_out(battler, outgoing)
+        battler.reserve.append(outgoing)
+
+    pkmn = _find_switch_in(battler, split_msg[2], split_msg[3])
+    battler.active = pkmn
+    if boosts is not None:
+        pkmn.boosts.update(boosts)
+    if len(split_msg) > 4:
+        _set_condition(battle, battler, pkmn, split_msg[4])
+    pkmn.hp_at_switch_in = pkmn.hp
+    pkmn.status_at_switch_in = pkmn.status
+    # no pokemon_name: the pokemon that switched in has not used a move yet
+    battler.last_used_move = LastUsedMove(None, "switch {}".format(pkmn.name), battle.turn)
+
+
+def details_change(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is None:
+        return
+    if normalize_name(split_msg[3].split(",")[0]) in pokedex:
+        pkmn.forme_change(split_msg[3])
+    if len(split_msg) > 4 and "/" in split_msg[4]:
+        _set_condition(battle, get_battler(battle, split_msg[2]), pkmn, split_msg[4])
+
+
+def move(battle, split_msg):
+    battler = get_battler(battle, split_msg[2])
+    pkmn = battler.active
+    if pkmn is None:
+        return
+    move_name = normalize_name(split_msg[3])
+    called_from = get_tag(split_msg, "[from]")
+
+    # moves called by another move (sleeptalk, copycat, magicbounce, ...) are not part of the moveset
+    if called_from is None or called_from == "lockedmove":
+        if battler is battle.opponent and move_name in all_move_json:
+            known_move = pkmn.get_move(move_name)
+            if known_move is None:
+                known_move = pkmn.add_move(move_name)
+            if known_move is not None:
+                known_move.current_pp -= 1
+        if unlikely_to_have_choice_item(move_name):
+            pkmn.can_have_choice_item = False
+        check_speed_from_turn_order(battle, battler, move_name)
+
+    if move_name == constants.WISH:
+        battler.wish = (2, pkmn.max_hp / 2)
+    pkmn.moves_used_since_switch_in.add(move_name)
+    battler.last_used_move = LastUsedMove(pkmn.name, move_name, battle.turn)
+
+
+def cant(battle, split_msg):
+    battler = get_battler(battle, split_msg[2])
+    pkmn = battler.active
+    if pkmn is None:
+        return
+    if split_msg[3] == constants.SLEEP:
+        pkmn.sleep_turns += 1
+    # "|cant|p2a: Nickname|Disable|Flamethrower" reveals the move that could not be used
+    if len(split_msg) > 4 and battler is battle.opponent:
+        move_name = normalize_name(split_msg[4])
+        if move_name in all_move_json and pkmn.get_move(move_name) is None:
+            pkmn.add_move(move_name)
+
+
+def heal_or_damage(battle, split_msg):
+    battler = get_battler(battle, split_msg[2])
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is None:
+        return
+    _set_condition(battle, battler, pkmn, split_msg[3])
+    _reveal_from_effect(battle, split_msg, pkmn)
+
+    if get_tag(split_msg, "[from]") == "psn" and pkmn.status == constants.TOXIC:
+        battler.side_conditions[constants.TOXIC_COUNT] += 1
+
+
+def faint(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is not None:
+        pkmn.hp = 0
+        pkmn.fainted = True
+
+
+def status(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is None:
+        return
+    pkmn.status = split_msg[3]
+    if pkmn.status == constants.SLEEP:
+        pkmn.sleep_turns = 0
+        if get_tag(split_msg, "[from]") == "move: Rest":
+            pkmn.rest_turns = 3
+    _reveal_from_effect(battle, split_msg, pkmn)
+
+
+def cure_status(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is not None:
+        pkmn.status = None
+        pkmn.sleep_turns = 0
+        pkmn.rest_turns = 0
+
+
+def cure_team(battle, split_msg):
+    battler = get_battler(battle, split_msg[2])
+    for pkmn in [battler.active] + battler.reserve:
+        if pkmn is not None:
+            pkmn.status = None
+
+
+def _boost_stat(split_msg):
+    return constants.STAT_ABBREVIATION_LOOKUPS.get(split_msg[3])
+
+
+def boost(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    stat = _boost_stat(split_msg)
+    if pkmn is None or stat is None:
+        return
+    amount = int(split_msg[4]) if split_msg[1] == "-boost" else -int(split_msg[4])
+    pkmn.boosts[stat] = max(
+        -constants.MAX_BOOSTS, min(constants.MAX_BOOSTS, pkmn.boosts[stat] + amount)
+    )
+
+
+def set_boost(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    stat = _boost_stat(split_msg)
+    if pkmn is not None and stat is not None:
+        pkmn.boosts[stat] = int(split_msg[4])
+
+
+def clear_boost(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is not None:
+        pkmn.boosts.clear()
+
+
+def clear_all_boosts(battle, split_msg):
+    for battler in (battle.user, battle.opponent):
+        if battler.active is not None:
+            battler.active.boosts.clear()
+
+
+def clear_negative_boosts(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is not None:
+        for stat, value in list(pkmn.boosts.items()):
+            if value < 0:
+                pkmn.boosts[stat] = 0
+
+
+def invert_boosts(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is not None:
+        for stat, value in list(pkmn.boosts.items()):
+            pkmn.boosts[stat] = -value
+
+
+def copy_boosts(battle, split_msg):
+    # "|-copyboost|SOURCE|TARGET": SOURCE copies TARGET's boosts
+    pkmn = get_pokemon(battle, split_msg[2])
+    target = get_pokemon(battle, split_msg[3])
+    if pkmn is not None and target is not None:
+        pkmn.boosts = copy(target.boosts)
+
+
+# weather names that are not the normalized protocol name
+WEATHER_ALIASES = {"snow": constants.SNOW}
+
+
+def weather(battle, split_msg):
+    weather_name = normalize_name(split_msg[2])
+    if weather_name == "none":
+        battle.weather = None
+        battle.weather_turns_remaining = -1
+        battle.weather_source = ""
+        return
+    if get_tag(split_msg, "[upkeep]") is not None:
+        return
+
+    battle.weather = WEATHER_ALIASES.get(weather_name, weather_name)
+    battle.weather_turns_remaining = 5
+    of = get_tag(split_msg, "[of]")
+    if of is not None:
+        pkmn = get_pokemon(battle, of)
+        battle.weather_source = pkmn.name if pkmn is not None else ""
+        _reveal_from_effect(battle, split_msg, pkmn)
+
+
+def field_start(battle, split_msg):
+    condition = _effect_name(split_msg[2])
+    if condition == constants.TRICK_ROOM:
+        battle.trick_room = True
+        battle.trick_room_turns_remaining = 5
+    elif condition == constants.GRAVITY:
+        battle.gravity = True
+    elif condition.endswith("terrain"):
+        battle.field = condition
+        battle.field_turns_remaining = 5
+        of = get_tag(split_msg, "[of]")
+        if of is not None:
+            _reveal_from_effect(battle, split_msg, get_pokemon(battle, of))
+
+
+def field_end(battle, split_msg):
+    condition = _effect_name(split_msg[2])
+    if condition == constants.TRICK_ROOM:
+        battle.trick_room = False
+        battle.trick_room_turns_remaining = 0
+    elif condition == constants.GRAVITY:
+        battle.gravity = False
+    elif condition == battle.field:
+        battle.field = None
+        battle.field_turns_remaining = 0
+
+
+def side_start(battle, split_msg):
+    battler = get_battler(battle, split_msg[2])
+    condition = _effect_name(split_msg[3])
+    if condition in SIDE_CONDITION_DEFAULT_DURATION:
+        battler.side_conditions[condition] = SIDE_CONDITION_DEFAULT_DURATION[condition]
+    else:
+        # hazards stack one layer at a time
+        battler.side_conditions[condition] += 1
+
+
+def side_end(battle, split_msg):
+    battler = get_battler(battle, split_msg[2])
+    battler.side_conditions[_effect_name(split_msg[3])] = 0
+
+
+def swap_side_conditions(battle, split_msg):
+    user_conditions = battle.user.side_conditions
+    opponent_conditions = battle.opponent.side_conditions
+    for condition in constants.COURT_CHANGE_SWAPS:
+        user_conditions[condition], opponent_conditions[condition] = (
+            opponent_conditions[condition],
+            user_conditions[condition],
+        )
+
+
+def start_volatile_status(battle, split_msg):
+    battler = get_battler(battle, split_msg[2])
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is None:
+        return
+    volatile_status = _effect_name(split_msg[3])
+
+    if volatile_status == constants.TYPECHANGE and len(split_msg) > 4:
+        pkmn.types = [normalize_name(t) for t in split_msg[4].split("/")]
+    elif volatile_status == constants.FUTURE_SIGHT:
+        # kept on the side of the pokemon that used it: its stats decide the damage
+        battler.future_sight = (3, pkmn.name)
+        return
+
+    if volatile_status not in pkmn.volatile_statuses:
+        pkmn.volatile_statuses.append(volatile_status)
+    pkmn.volatile_status_durations[volatile_status] = 0
+    _reveal_from_effect(battle, split_msg, pkmn)
+
+
+def end_volatile_status(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is None:
+        return
+    volatile_status = _effect_name(split_msg[3])
+    if volatile_status == constants.TYPECHANGE:
+        pkmn.types = pokedex[pkmn.name][constants.TYPES]
+    remove_volatile(pkmn, volatile_status)
+    pkmn.volatile_status_durations.pop(volatile_status, None)
+
+
+def activate(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is None or len(split_msg) < 4:
+        return
+    effect = split_msg[3]
+    if effect.startswith("ability:"):
+        pkmn.ability = _effect_name(effect)
+    elif effect.startswith("item:"):
+        pkmn.item = _effect_name(effect)
+    elif normalize_name(effect) == constants.CONFUSION:
+        pkmn.volatile_status_durations[constants.CONFUSION] += 1
+
+
+def set_item(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is not None:
+        pkmn.item = normalize_name(split_msg[3])
+        pkmn.item_inferred = False
+
+
+def remove_item(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is None:
+        return
+    pkmn.removed_item = normalize_name(split_msg[3])
+    pkmn.item = None
+    if get_tag(split_msg, "[from]") == "move: Knock Off":
+        pkmn.knocked_off = True
+
+
+def set_ability(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is not None:
+        pkmn.ability = normalize_name(split_msg[3])
+
+
+def immune(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    _reveal_from_effect(battle, split_msg, pkmn)
+
+
+def transform(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    target = get_pokemon(battle, split_msg[3])
+    if pkmn is None or target is None:
+        return
+    if constants.TRANSFORM not in pkmn.volatile_statuses:
+        pkmn.volatile_statuses.append(constants.TRANSFORM)
+    pkmn.types = list(target.types)
+    pkmn.stats = copy(target.stats)
+    pkmn.boosts = copy(target.boosts)
+
+
+def mega(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is None:
+        return
+    pkmn.is_mega = True
+    if len(split_msg) > 4 and split_msg[4]:
+        pkmn.item = normalize_name(split_msg[4])
+
+
+def terastallize(battle, split_msg):
+    pkmn = get_pokemon(battle, split_msg[2])
+    if pkmn is not None:
+        pkmn.terastallized = True
+        pkmn.tera_type = normalize_name(split_msg[3])
+
+
+def _decrement(turns):
+    # a duration is only ended by its protocol message, never by counting
+    return turns - 1 if turns > 1 else turns
+
+
+def turn(battle, split_msg):
+    battle.turn = int(split_msg[2])
+    battle.weather_turns_remaining = _decrement(battle.weather_turns_remaining)
+    battle.field_turns_remaining = _decrement(battle.field_turns_remaining)
+    battle.trick_room_turns_remaining = _decrement(battle.trick_room_turns_remaining)
+    for battler in (battle.user, battle.opponent):
+        for condition in SIDE_CONDITION_DEFAULT_DURATION:
+            if battler.side_conditions[condition]:
+                battler.side_conditions[condition] = _decrement(
+                    battler.side_conditions[condition]
+                )
+        if battler.wish[0] > 0:
+            battler.wish = (battler.wish[0] - 1, battler.wish[1])
+        if battler.future_sight[0] > 0:
+            battler.future_sight = (battler.future_sight[0] - 1, battler.future_sight[1])
+    record_turn_start_speeds(battle)
+
+
+TURN_TIME_REGEX = re.compile(r"(\d+) sec this turn")
+TOTAL_TIME_REGEX = re.compile(r"(\d+) sec total")
+
+
+def inactive(battle, split_msg):
+    # "|inactive|Time left: 150 sec this turn | 290 sec total"
+    message = "|".join(split_msg[2:])
+    if message.startswith(constants.TIME_LEFT):
+        total = TOTAL_TIME_REGEX.search(message)
+        if total is not None:
+            battle.time_remaining = int(total.group(1))
+        this_turn = TURN_TIME_REGEX.search(message)
+        if this_turn is not None:
+            battle.turn_time_remaining = int(this_turn.group(1))
+
+
+def inactive_off(battle, split_msg):
+    battle.time_remaining = None
+    battle.turn_time_remaining = None
+
+
+def team_preview_pokemon(battle, split_msg):
+    # "|poke|p2|Great Tusk, L100|item"
+    if get_battler(battle, split_msg[2]) is battle.opponent:
+        battle.team_preview_pokemon.append(split_msg[3])
+
+
+def clear_team_preview_pokemon(battle, split_msg):
+    battle.team_preview_pokemon = []
+
+
+def team_preview(battle, split_msg):
+    battle.initialize_team_preview(battle.team_preview_pokemon, battle.pokemon_format)
+    battle.team_preview = True
+
+
+def start(battle, split_msg):
+    battle.started = True
+    battle.team_preview = False
+
+
+def request(battle, request_json):
+    battle.request_json = request_json
+    battle.rqid = request_json.get(constants.RQID)
+    battle.wait = request_json.get(constants.WAIT, False)
+    battle.force_switch = bool(request_json.get(constants.FORCE_SWITCH, [False])[0])
+    if battle.user.name is None and constants.SIDE in request_json:
+        battle.user.initialize_first_turn_user_from_json(request_json)
+        battle.opponent.name = constants.ID_LOOKUP[battle.user.name]
+    battle.request_pending = True
+
+
+# Protocol messages that change the battle, by their |action| token
+# The table is built once: dispatching a message is a single dict lookup
+BATTLE_MODIFIERS = {
+    "switch": switch_or_drag,
+    "drag": switch_or_drag,
+    "replace": switch_or_drag,
+    "detailschange": details_change,
+    "-formechange": details_change,
+    "move": move,
+    "cant": cant,
+    "-damage": heal_or_damage,
+    "-heal": heal_or_damage,
+    "-sethp": heal_or_damage,
+    "faint": faint,
+    "-status": status,
+    "-curestatus": cure_status,
+    "-cureteam": cure_team,
+    "-boost": boost,
+    "-unboost": boost,
+    "-setboost": set_boost,
+    "-clearboost": clear_boost,
+    "-clearallboost": clear_all_boosts,
+    "-clearnegativeboost": clear_negative_boosts,
+    "-invertboost": invert_boosts,
+    "-copyboost": copy_boosts,
+    "-weather": weather,
+    "-fieldstart": field_start,
+    "-fieldend": field_end,
+    "-sidestart": side_start,
+    "-sideend": side_end,
+    "-swapsideconditions": swap_side_conditions,
+    "-start": start_volatile_status,
+    "-end": end_volatile_status,
+    "-activate": activate,
+    "-item": set_item,
+    "-enditem": remove_item,
+    "-ability": set_ability,
+    "-immune": immune,
+    "-transform": transform,
+    "-mega": mega,
+    "-terastallize": terastallize,
+    "turn": turn,
+    "inactive": inactive,
+    "inactiveoff": inactive_off,
+    "poke": team_preview_pokemon,
+    "clearpoke": clear_team_preview_pokemon,
+    "teampreview": team_preview,
+    "start": start,
+}
+
+# Messages after which the bot may have to choose
+DECISION_POINTS = {"turn", "upkeep", "teampreview"}
+
+# Handled messages that do not move the battle forward
+INFORMATIONAL = {"inactive", "inactiveoff", "poke", "clearpoke"}
+
+
+def process_battle_updates(battle, msg_lines):
+    """
+    Applies one websocket frame of protocol messages to `battle` in a single pass
+    `msg_lines` is the frame or its lines
+    Returns whether the bot has to choose an action now
+    """
+    if isinstance(msg_lines, str):
+        msg_lines = msg_lines.split("\n")
+
+    decision_point = False
+    progressed = False
+    skip_index = None
+    for index, line in enumerate(msg_lines):
+        if not line.startswith("|") or index == skip_index:
+            continue
+
+        if line.startswith("|request|"):
+            payload = line[len("|request|") :].strip()
+            if payload:
+                request(battle, json.loads(payload))
+                if battle.awaiting_request:
+                    # the decision point came before its request
+                    decision_point = True
+            continue
+
+        split_msg = line.split("|")
+        action = split_msg[1]
+        if action == "split":
+            # the next line is the exact version for that side and the one after it the public version
+            own_side = get_battler(battle, split_msg[2]) is battle.user
+            skip_index = index + 2 if own_side else index + 1
+            continue
+
+        handler = BATTLE_MODIFIERS.get(action)
+        if handler is not None:
+            try:
+                handler(battle, split_msg)
+            except (IndexError, KeyError, ValueError) as e:
+                logger.warning("Could not process {}: {}".format(line, e))
+            progressed = progressed or action not in INFORMATIONAL
+        if action in DECISION_POINTS:
+            decision_point = True
+
+    if not battle.request_pending:
+        battle.awaiting_request = battle.awaiting_request or decision_point
+        return False
+    if battle.wait:
+        battle.request_pending = False
+        battle.awaiting_request = False
+        return False
+    if decision_point or (battle.force_switch and progressed):
+        battle.request_pending = False
+        battle.awaiting_request = False
+        return True
+    return False
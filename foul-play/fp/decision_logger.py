@@ -1,27 +1,299 @@
 """
 Decision Logger for FoulPlay
-Logs AI decisions (MCTS, EPoké, Hybrid) to JSONL format
+Logs AI decisions (MCTS, EPoké, Hybrid) to an indexed JSONL decision store
+
+Records and snapshots are queued and written by a background thread so that
+logging a decision never waits on the disk
 """
+import atexit
+import logging
 import os
-import json
+import pickle
+import queue
 import time
 import threading
+from collections import deque
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from config import FoulPlayConfig
+from fp.decision_store import DecisionStore
+
+logger = logging.getLogger(__name__)
+
 _LOG_DIR = Path(os.environ.get("FP_LOG_DIR", "logs"))
 _LOG_DIR.mkdir(parents=True, exist_ok=True)
 _DECISION_LOG = _LOG_DIR / "decisions" / "decisions.jsonl"
 _DECISION_LOG.parent.mkdir(parents=True, exist_ok=True)
-_LOCK = threading.Lock()
+_SNAPSHOT_DIR = _DECISION_LOG.parent / "snapshots"
+_PROFILE_DIR = _DECISION_LOG.parent / "profiles"
+_STORE = DecisionStore(_DECISION_LOG.parent)
+_MIGRATE_LOCK = threading.Lock()
+_migrated = False
+
+# Most records the writer thread collects before writing them at once
+_MAX_BATCH_SIZE = 500
+_STOP = object()
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
-def _append_jsonl(path: Path, obj: Dict[str, Any]) -> None:
-    with _LOCK:
-        with path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+def _get_store() -> DecisionStore:
+    # decisions.jsonl from before the indexed store is imported on first use
+    global _migrated
+    if not _migrated:
+        with _MIGRATE_LOCK:
+            if not _migrated:
+                _STORE.migrate_jsonl(_DECISION_LOG)
+                _migrated = True
+    return _STORE
+
+def _write_snapshot(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as f:
+        f.write(data)
+
+class SnapshotRetention:
+    """
+    Deletes the oldest search snapshots once there are more than `max_snapshots`
+    The snapshots already on disk are counted the first time one is added
+    """
+
+    def __init__(self, directory: Path, max_snapshots: int):
+        self.directory = directory
+        self.max_snapshots = max_snapshots
+        self._paths = None
+
+    def _existing_snapshots(self) -> deque:
+        snapshots = []
+        for path in self.directory.glob("*/*.pickle"):
+            try:
+                snapshots.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        return deque(path for _, path in sorted(snapshots))
+
+    def add(self, path: Path) -> None:
+        if self.max_snapshots <= 0:
+            return
+        if self._paths is None:
+            # `path` is already written, so it is among the existing snapshots
+            self._paths = self._existing_snapshots()
+        else:
+            self._paths.append(path)
+
+        while len(self._paths) > self.max_snapshots:
+            oldest = self._paths.popleft()
+            try:
+                oldest.unlink()
+            except FileNotFoundError:
+                pass
+            try:
+                # the battle's directory is removed with its last snapshot
+                oldest.parent.rmdir()
+            except OSError:
+                pass
+
+class DecisionLogWriter:
+    """
+    Writes decision records and snapshots from a background thread
+
+    Items wait in a bounded queue. The thread collects them for up to
+    `flush_interval_ms` and writes them in one batch to the store.
+    When the queue is full the new item is dropped and counted in `dropped`:
+    the decision path never blocks on the log
+    Search snapshots beyond `max_snapshots` are deleted oldest first, 0 keeps them all
+    """
+
+    def __init__(self, max_queue_size: int, flush_interval_ms: int, max_snapshots: int = 0):
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.retention = SnapshotRetention(_SNAPSHOT_DIR, max_snapshots)
+        self.dropped = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="fp-decision-log", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, kind: str, item: Any) -> bool:
+        """`kind` is "record" for a decision record or "snapshot" for a (path, bytes) pair"""
+        if self._closed:
+            # after shutdown there is no thread left to hand the item to
+            self._write([(kind, item)])
+            return True
+
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((kind, item))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            # powers of two so a stuck disk does not also flood the log
+            if self.dropped & (self.dropped - 1) == 0:
+                logger.warning(
+                    "Decision log queue is full: {} items dropped".format(self.dropped)
+                )
+            return False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < _MAX_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            for _ in batch:
+                self.queue.task_done()
+        self.queue.task_done()
+
+    def _write(self, batch) -> None:
+        records = [item for kind, item in batch if kind == "record"]
+        for kind, item in batch:
+            if kind == "snapshot":
+                try:
+                    _write_snapshot(*item)
+                except Exception as e:
+                    logger.error("Could not write decision snapshot {}: {}".format(item[0], e))
+                    continue
+                if item[0].parent.parent == _SNAPSHOT_DIR:
+                    self.retention.add(item[0])
+        if records:
+            try:
+                _get_store().append_many(records)
+            except Exception as e:
+                logger.error("Could not write {} decisions: {}".format(len(records), e))
+
+    def flush(self) -> None:
+        """Blocks until every queued item has been written"""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+
+    def close(self, timeout: float = 5) -> None:
+        """Writes everything that is queued and stops the thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                logger.warning("Decision log writer did not drain before shutdown")
+            self._thread.join(timeout)
+        _STORE.close()
+        if self.dropped:
+            logger.warning("{} decision log items were dropped".format(self.dropped))
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+def _get_writer() -> DecisionLogWriter:
+    # created on first use so that the configured queue size and flush interval apply
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = DecisionLogWriter(
+                    FoulPlayConfig.decision_log_queue_size,
+                    FoulPlayConfig.decision_log_flush_ms,
+                    FoulPlayConfig.max_decision_snapshots,
+                )
+    return _WRITER
+
+def shutdown_decision_log() -> None:
+    if _WRITER is not None:
+        _WRITER.close()
+
+atexit.register(shutdown_decision_log)
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(name))
+
+def is_replayable(search_stats: Dict[str, Any]) -> bool:
+    """
+    Whether a decision can be replayed from its search: a team preview answered from
+    the cache and a move answered from the opening book were not searched, and a move
+    chosen from the book's policy after searching would not be reproduced
+    """
+    opening_book = search_stats.get("opening_book", {}) if search_stats else {}
+    return (
+        bool(search_stats)
+        and not search_stats.get("cached")
+        and not opening_book.get("answered")
+        and not opening_book.get("policy_from_book")
+    )
+
+def save_search_snapshot(
+    battle_id: str,
+    turn: int,
+    battle: Any,
+    search_stats: Dict[str, Any]
+) -> Optional[str]:
+    """
+    Pickle the battle that was given to the search along with the search's seed and plan
+    so the decision can be replayed with `replay_decision.py`
+    The battle is pickled right away and written to disk by the background writer
+    Returns the snapshot's path, or None if it could not be pickled or was dropped
+    """
+    path = _SNAPSHOT_DIR / _safe_name(battle_id) / f"{turn}_{_now_ms()}.pickle"
+    try:
+        data = pickle.dumps(
+            {
+                "battle_id": battle_id,
+                "turn": turn,
+                "pokemon_format": getattr(battle, "pokemon_format", None),
+                "battle": battle,
+                "search": search_stats,
+            },
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    except Exception:
+        return None
+    if not _get_writer().submit("snapshot", (path, data)):
+        return None
+    return str(path)
+
+def save_decision_profile(battle_id: str, turn: int, stacks: Dict[str, int]) -> Optional[str]:
+    """
+    Write a decision's sampled stacks in the collapsed format of flamegraph.pl and speedscope
+    Returns the profile's path, or None if it was dropped
+    """
+    path = _PROFILE_DIR / _safe_name(battle_id) / f"{turn}_{_now_ms()}.collapsed"
+    data = "".join(
+        "{} {}\n".format(stack, count)
+        for stack, count in sorted(stacks.items(), key=lambda s: s[1], reverse=True)
+    ).encode("utf-8")
+    if not _get_writer().submit("snapshot", (path, data)):
+        return None
+    return str(path)
+
+def load_search_snapshot(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        return pickle.load(f)
 
 def log_mcts_decision(
     battle_id: str,
@@ -43,7 +315,7 @@ def log_mcts_decision(
     }
     if extra:
         row.update(extra)
-    _append_jsonl(_DECISION_LOG, row)
+    _get_writer().submit("record", row)
     return row
 
 def log_hybrid_decision(
@@ -56,7 +328,8 @@ def log_hybrid_decision(
     chosen_move: str,
     chosen_source: str,
     mcts_choices: Optional[List[Dict[str, Any]]] = None,
-    timings_ms: Optional[Dict[str, Any]] = None
+    timings_ms: Optional[Dict[str, Any]] = None,
+    extra: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     row = {
         "ts": _now_ms(),
@@ -73,52 +346,25 @@ def log_hybrid_decision(
         "epoke_choice": {"move": epoke_move, "confidence": epoke_confidence} if epoke_move else None,
         "timings_ms": timings_ms or {},
     }
-    _append_jsonl(_DECISION_LOG, row)
+    if extra:
+        row.update(extra)
+    _get_writer().submit("record", row)
     return row
 
 def latest_decision() -> Optional[Dict[str, Any]]:
-    if not _DECISION_LOG.exists():
-        return None
-    last = None
     try:
-        with _DECISION_LOG.open("r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    last = json.loads(line)
-                except Exception:
-                    continue
+        return _get_store().latest()
     except Exception:
         return None
-    return last
 
 def get_recent_decisions(n: int = 50) -> List[Dict[str, Any]]:
-    if not _DECISION_LOG.exists():
-        return []
-    decisions = []
     try:
-        with _DECISION_LOG.open("r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    decisions.append(json.loads(line))
-                except Exception:
-                    continue
+        return _get_store().recent(n)
     except Exception:
         return []
-    return decisions[-n:]
 
 def get_battle_decisions(battle_id: str) -> List[Dict[str, Any]]:
-    if not _DECISION_LOG.exists():
-        return []
-    decisions = []
     try:
-        with _DECISION_LOG.open("r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    if data.get("battle_id") == battle_id:
-                        decisions.append(data)
-                except Exception:
-                    continue
+        return _get_store().battle(battle_id)
     except Exception:
         return []
-    return decisions
@@ -0,0 +1,317 @@
+"""
+Append-only decision store with a sidecar index
+
+Records are JSON lines written to numbered segment files under `segments/`.
+Every record also gets a fixed-width (segment, offset, length) entry in
+`records.idx` and in its battle's index under `battles/`.
+The size of `records.idx` is the tail pointer: the latest N records are found
+with a single seek and a battle's records without reading any other battle's
+"""
+import json
+import logging
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# segment id, byte offset in the segment, length of the line in bytes
+_ENTRY = struct.Struct("<IQI")
+
+DEFAULT_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+# Oldest segments are removed by compaction once there are more than this
+DEFAULT_MAX_SEGMENTS = 64
+
+IndexEntry = Tuple[int, int, int]
+
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(name))
+
+
+def _read_entries(path: Path, start: int = 0, count: Optional[int] = None) -> List[IndexEntry]:
+    try:
+        with path.open("rb") as f:
+            f.seek(start * _ENTRY.size)
+            data = f.read() if count is None else f.read(count * _ENTRY.size)
+    except FileNotFoundError:
+        return []
+    usable = len(data) - len(data) % _ENTRY.size
+    return list(_ENTRY.iter_unpack(data[:usable]))
+
+
+def _write_entries(path: Path, entries: Iterable[IndexEntry]) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("wb") as f:
+        for entry in entries:
+            f.write(_ENTRY.pack(*entry))
+    os.replace(tmp_path, path)
+
+
+class DecisionStore:
+    def __init__(
+        self,
+        root: Path,
+        segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+        max_segments: int = DEFAULT_MAX_SEGMENTS,
+    ):
+        self.root = Path(root)
+        self.segment_dir = self.root / "segments"
+        self.battle_dir = self.root / "battles"
+        self.index_path = self.root / "records.idx"
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+
+        self._lock = threading.RLock()
+        self._segment_id = None
+        self._segment_file = None
+        self._index_file = None
+
+    def _segment_path(self, segment_id: int) -> Path:
+        return self.segment_dir / "{:08d}.jsonl".format(segment_id)
+
+    def _battle_index_path(self, battle_id: str) -> Path:
+        return self.battle_dir / "{}.idx".format(_safe_name(battle_id))
+
+    def segment_ids(self) -> List[int]:
+        if not self.segment_dir.exists():
+            return []
+        return sorted(
+            int(p.stem) for p in self.segment_dir.glob("*.jsonl") if p.stem.isdigit()
+        )
+
+    def _ensure_open(self) -> None:
+        if self._segment_file is not None:
+            return
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        self.battle_dir.mkdir(parents=True, exist_ok=True)
+
+        segments = self.segment_ids()
+        self._segment_id = segments[-1] if segments else 1
+        self._recover_tail()
+        self._segment_file = self._segment_path(self._segment_id).open("ab")
+        self._index_file = self.index_path.open("ab")
+
+    def _recover_tail(self) -> None:
+        """
+        Brings the index in line with the newest segment after an unclean shutdown:
+        a torn index entry is dropped, lines that were written but never indexed are
+        indexed and a torn last line is truncated
+        """
+        index_size = self.index_path.stat().st_size if self.index_path.exists() else 0
+        if index_size % _ENTRY.size:
+            with self.index_path.open("r+b") as f:
+                f.truncate(index_size - index_size % _ENTRY.size)
+
+        segment_path = self._segment_path(self._segment_id)
+        if not segment_path.exists():
+            return
+
+        indexed_end = 0
+        last = _read_entries(self.index_path, max(0, len(self) - 1))
+        if last and last[-1][0] == self._segment_id:
+            indexed_end = last[-1][1] + last[-1][2]
+
+        with segment_path.open("r+b") as f:
+            f.seek(indexed_end)
+            unindexed = f.read()
+            if not unindexed:
+                return
+            complete = unindexed[: unindexed.rfind(b"\n") + 1]
+            f.truncate(indexed_end + len(complete))
+
+        offset = indexed_end
+        recovered = []
+        for line in complete.splitlines(keepends=True):
+            recovered.append((offset, line))
+            offset += len(line)
+        self._index_lines(recovered)
+        if recovered:
+            logger.warning("Recovered {} unindexed decisions".format(len(recovered)))
+
+    def _index_lines(self, lines: List[Tuple[int, bytes]]) -> None:
+        """`lines` are (offset, line) pairs in the current segment"""
+        battle_entries = {}
+        index_data = bytearray()
+        for offset, line in lines:
+            entry = _ENTRY.pack(self._segment_id, offset, len(line))
+            index_data += entry
+            try:
+                battle_id = json.loads(line).get("battle_id")
+            except ValueError:
+                continue
+            if battle_id:
+                battle_entries.setdefault(battle_id, bytearray()).extend(entry)
+
+        with self.index_path.open("ab") as f:
+            f.write(index_data)
+        for battle_id, data in battle_entries.items():
+            with self._battle_index_path(battle_id).open("ab") as f:
+                f.write(data)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict[str, Any]]) -> None:
+        lines = [(json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8") for r in records]
+        with self._lock:
+            self._ensure_open()
+            index_data = bytearray()
+            battle_entries = {}
+            for record, line in zip(records, lines):
+                offset = self._segment_file.tell()
+                if offset > 0 and offset + len(line) > self.segment_max_bytes:
+                    self._flush(index_data, battle_entries)
+                    index_data = bytearray()
+                    battle_entries = {}
+                    self._rotate()
+                    offset = 0
+
+                self._segment_file.write(line)
+                entry = _ENTRY.pack(self._segment_id, offset, len(line))
+                index_data += entry
+                battle_id = record.get("battle_id")
+                if battle_id:
+                    battle_entries.setdefault(battle_id, bytearray()).extend(entry)
+
+            self._flush(index_data, battle_entries)
+
+    def _flush(self, index_data: bytearray, battle_entries: Dict[str, bytearray]) -> None:
+        # records are flushed before their index entries so every indexed record is readable
+        self._segment_file.flush()
+        self._index_file.write(index_data)
+        self._index_file.flush()
+        for battle_id, data in battle_entries.items():
+            with self._battle_index_path(battle_id).open("ab") as f:
+                f.write(data)
+
+    def _rotate(self) -> None:
+        self._segment_file.close()
+        self._segment_id += 1
+        self._segment_file = self._segment_path(self._segment_id).open("ab")
+        if len(self.segment_ids()) > self.max_segments:
+            self.compact()
+
+    def compact(self, max_segments: Optional[int] = None) -> int:
+        """
+        Removes the oldest segments so that at most `max_segments` remain and rewrites
+        the indexes without their records
+        Returns the number of removed records
+        """
+        max_segments = self.max_segments if max_segments is None else max_segments
+        with self._lock:
+            segments = self.segment_ids()
+            removed_segments = set(segments[: max(0, len(segments) - max_segments)])
+            if not removed_segments:
+                return 0
+
+            entries = _read_entries(self.index_path)
+            kept = [e for e in entries if e[0] not in removed_segments]
+            if self._index_file is not None:
+                self._index_file.close()
+            _write_entries(self.index_path, kept)
+            if self._index_file is not None:
+                self._index_file = self.index_path.open("ab")
+
+            for battle_index in self.battle_dir.glob("*.idx"):
+                battle_entries = _read_entries(battle_index)
+                battle_kept = [e for e in battle_entries if e[0] not in removed_segments]
+                if not battle_kept:
+                    battle_index.unlink()
+                elif len(battle_kept) != len(battle_entries):
+                    _write_entries(battle_index, battle_kept)
+
+            for segment_id in removed_segments:
+                self._segment_path(segment_id).unlink()
+
+            logger.info(
+                "Compacted decision store: removed {} segments and {} records".format(
+                    len(removed_segments), len(entries) - len(kept)
+                )
+            )
+            return len(entries) - len(kept)
+
+    def migrate_jsonl(self, path: Path, batch_size: int = 1000) -> int:
+        """
+        Imports a legacy single-file decision log and renames it to `<name>.migrated`
+        Returns the number of imported records
+        """
+        path = Path(path)
+        if not path.exists():
+            return 0
+
+        imported = 0
+        batch = []
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    batch.append(json.loads(line))
+                except ValueError:
+                    continue
+                if len(batch) >= batch_size:
+                    self.append_many(batch)
+                    imported += len(batch)
+                    batch = []
+        if batch:
+            self.append_many(batch)
+            imported += len(batch)
+
+        os.replace(path, path.with_name(path.name + ".migrated"))
+        logger.info("Migrated {} decisions from {}".format(imported, path))
+        return imported
+
+    def close(self) -> None:
+        with self._lock:
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._index_file.close()
+                self._segment_file = None
+                self._index_file = None
+
+    def __len__(self) -> int:
+        try:
+            return self.index_path.stat().st_size // _ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def _load(self, entries: List[IndexEntry]) -> List[Dict[str, Any]]:
+        records = []
+        handles = {}
+        try:
+            for segment_id, offset, length in entries:
+                if segment_id not in handles:
+                    try:
+                        handles[segment_id] = self._segment_path(segment_id).open("rb")
+                    except FileNotFoundError:
+                        # compacted away since the index was read
+                        handles[segment_id] = None
+                f = handles[segment_id]
+                if f is None:
+                    continue
+                f.seek(offset)
+                try:
+                    records.append(json.loads(f.read(length)))
+                except ValueError:
+                    continue
+        finally:
+            for f in handles.values():
+                if f is not None:
+                    f.close()
+        return records
+
+    def recent(self, n: int) -> List[Dict[str, Any]]:
+        if n <= 0:
+            return []
+        start = max(0, len(self) - n)
+        return self._load(_read_entries(self.index_path, start, n))
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        records = self.recent(1)
+        return records[-1] if records else None
+
+    def battle(self, battle_id: str) -> List[Dict[str, Any]]:
+        entries = _read_entries(self._battle_index_path(battle_id))
+        # different battle ids can share a file name after sanitizing
+        return [r for r in self._load(entries) if r.get("battle_id") == battle_id]
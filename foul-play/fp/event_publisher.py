@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import socket
+import time
+
+from config import FoulPlayConfig
+
+logger = logging.getLogger(__name__)
+
+
+EVENT_HOST = "127.0.0.1"
+
+# A datagram must fit in one UDP packet on the loopback interface
+MAX_EVENT_BYTES = 60000
+MAX_POLICY_MOVES = 10
+
+
+class EventPublisher:
+    """
+    Publishes structured battle events to the backend as JSON datagrams on localhost
+
+    UDP is fire-and-forget: publishing never blocks the battle loop and events are
+    silently lost when the backend is not listening
+    """
+
+    def __init__(self):
+        self._socket = None
+
+    def _get_socket(self):
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setblocking(False)
+        return self._socket
+
+    def publish(self, event_type: str, battle_tag: str, **data):
+        if not FoulPlayConfig.event_port:
+            return
+
+        event = {
+            "type": event_type,
+            "battle_id": battle_tag,
+            "ts": int(time.time() * 1000),
+            # set by the backend's supervisor when it runs several bots
+            "instance": os.environ.get("FP_INSTANCE_ID"),
+        }
+        event.update(data)
+        try:
+            payload = json.dumps(event, default=str).encode("utf-8")
+            if len(payload) > MAX_EVENT_BYTES:
+                logger.debug("Dropping {} event of {} bytes".format(event_type, len(payload)))
+                return
+            self._get_socket().sendto(payload, (EVENT_HOST, FoulPlayConfig.event_port))
+        except OSError as e:
+            # full socket buffer or nothing listening: the event is dropped
+            logger.debug("Could not publish {} event: {}".format(event_type, e))
+
+
+def _pokemon_summary(pkmn) -> dict:
+    return {
+        "species": pkmn.name,
+        "hp": round(100 * pkmn.hp / pkmn.max_hp, 1) if pkmn.max_hp else 0,
+        "status": pkmn.status,
+        "revealed": True,
+    }
+
+
+def battle_state_event(battle) -> dict:
+    """The battle's state in the shape the dashboard already reads from `/battle/state`"""
+    user_team = [p for p in [battle.user.active] + battle.user.reserve if p is not None]
+    opponent_team = [
+        p for p in [battle.opponent.active] + battle.opponent.reserve if p is not None
+    ]
+    return {
+        "format": battle.pokemon_format,
+        "turn": battle.turn or 0,
+        "your_team": [_pokemon_summary(p) for p in user_team],
+        "opponent_team": [_pokemon_summary(p) for p in opponent_team],
+        "your_active": battle.user.active.name if battle.user.active else None,
+        "opponent_active": battle.opponent.active.name if battle.opponent.active else None,
+        "field": {
+            "weather": battle.weather,
+            "terrain": battle.field,
+            "screens": sorted(k for k, v in battle.user.side_conditions.items() if v),
+        },
+        "time_remaining": battle.time_remaining,
+    }
+
+
+def publish_battle_state(battle):
+    try:
+        state = battle_state_event(battle)
+    except Exception as e:
+        logger.debug("Could not summarize battle state: {}".format(e))
+        return
+    event_publisher.publish("state", battle.battle_tag, **state)
+
+
+def publish_decision(battle_tag, turn, choice, search_stats):
+    event_publisher.publish(
+        "decision",
+        battle_tag,
+        turn=turn,
+        choice=choice,
+        final_policy=search_stats.get("final_policy", [])[:MAX_POLICY_MOVES],
+        timings_ms=search_stats.get("timings_ms", {}),
+        num_battles=search_stats.get("num_battles"),
+        total_visits=search_stats.get("total_visits"),
+    )
+
+
+event_publisher = EventPublisher()
@@ -0,0 +1,130 @@
+"""
+Per-format state of a long running bot
+
+Everything that depends on the format being played is kept in a FormatContext:
+its battle type, its team and its loaded set datasets. A context is loaded the
+first time its format is played and kept, so a bot playing several formats switches
+between them without loading their datasets again.
+
+Mods, and everything computed from the pokedex (stats, speed tables, type charts,
+engine Pokemon), only depend on the generation. poke-engine is built for a single
+generation, so every format one process plays is of the same generation: the mods
+are applied once and those caches stay warm across formats
+"""
+import logging
+import types
+from copy import deepcopy
+
+from config import FoulPlayConfig
+from constants import BattleType
+from data.mods.apply_mods import apply_mods
+from data.pkmn_sets import RandomBattleTeamDatasets, SmogonSets, TeamDatasets
+
+logger = logging.getLogger(__name__)
+
+# Classes holding the datasets of the format being played in their class attributes
+DATASET_CLASSES = (SmogonSets, TeamDatasets, RandomBattleTeamDatasets)
+
+
+def battle_type_of(pokemon_format: str) -> BattleType:
+    if "random" in pokemon_format:
+        return BattleType.RANDOM_BATTLE
+    elif "battlefactory" in pokemon_format:
+        return BattleType.BATTLE_FACTORY
+    return BattleType.STANDARD_BATTLE
+
+
+def load_format_datasets(pokemon_format):
+    if "random" in pokemon_format.lower():
+        SmogonSets.MODE = "randoms"
+        try:
+            RandomBattleTeamDatasets.load(pokemon_format)
+        except Exception as e:
+            logger.warning("Could not load the sets of {}: {}".format(pokemon_format, e))
+    else:
+        SmogonSets.MODE = "standard"
+        TeamDatasets.load()
+
+
+def _is_data_attribute(name, value) -> bool:
+    return not name.startswith("__") and not isinstance(
+        value, (classmethod, staticmethod, property, types.FunctionType)
+    )
+
+
+def _dataset_state(cls) -> dict:
+    return {k: v for k, v in vars(cls).items() if _is_data_attribute(k, v)}
+
+
+def _restore_dataset_state(cls, state: dict):
+    for name in [n for n in _dataset_state(cls) if n not in state]:
+        delattr(cls, name)
+    for name, value in state.items():
+        setattr(cls, name, value)
+
+
+class FormatContext:
+    def __init__(self, pokemon_format: str, team_name: str = None):
+        self.pokemon_format = pokemon_format
+        self.team_name = team_name or pokemon_format
+        self.generation = pokemon_format[:4]
+        self.battle_type = battle_type_of(pokemon_format)
+        # the class attributes of DATASET_CLASSES once this format's datasets are loaded
+        self.datasets = None
+
+
+class FormatContexts:
+    """The contexts of every format played so far. One of them is active at a time"""
+
+    def __init__(self):
+        self.contexts = {}
+        self.active = None
+        self.generation = None
+        self._unloaded_datasets = None
+
+    def get(self, pokemon_format: str) -> FormatContext:
+        context = self.contexts.get(pokemon_format)
+        if context is None:
+            context = self.contexts[pokemon_format] = FormatContext(pokemon_format)
+        return context
+
+    def activate(self, pokemon_format: str, team_name: str = None) -> FormatContext:
+        """Makes `pokemon_format` the format being played, loading it the first time"""
+        context = self.get(pokemon_format)
+        if team_name is not None:
+            context.team_name = team_name
+
+        if self.generation is None:
+            apply_mods(pokemon_format)
+            self.generation = context.generation
+        elif context.generation != self.generation:
+            raise ValueError(
+                "Cannot play {} in a process playing {} formats".format(
+                    pokemon_format, self.generation
+                )
+            )
+
+        FoulPlayConfig.pokemon_format = context.pokemon_format
+        FoulPlayConfig.team_name = context.team_name
+        if context.datasets is None:
+            if self._unloaded_datasets is None:
+                self._unloaded_datasets = {
+                    cls: deepcopy(_dataset_state(cls)) for cls in DATASET_CLASSES
+                }
+            else:
+                # every format loads into its own copy of the unloaded datasets
+                for cls, state in self._unloaded_datasets.items():
+                    _restore_dataset_state(cls, deepcopy(state))
+            load_format_datasets(pokemon_format)
+            context.datasets = {cls: _dataset_state(cls) for cls in DATASET_CLASSES}
+            logger.info("Loaded format {}".format(pokemon_format))
+        elif self.active is not context:
+            for cls, state in context.datasets.items():
+                _restore_dataset_state(cls, state)
+            logger.info("Switched to format {}".format(pokemon_format))
+
+        self.active = context
+        return context
+
+
+format_contexts = FormatContexts()
@@ -0,0 +1,295 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+METRICS_DIR = Path(os.environ.get("FP_LOG_DIR", "logs")) / "metrics"
+TEXTFILE_INTERVAL_SECONDS = 15
+
+# Rolling window for games per hour and win rates
+ROLLING_WINDOW_SECONDS = 3600
+
+DECISION_LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40]
+SEARCH_ITERATIONS_BUCKETS = [1e3, 5e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6]
+
+
+def _format_labels(label_names, label_values, extra=None) -> str:
+    pairs = list(zip(label_names, label_values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) for every sample of this metric"""
+        raise NotImplementedError
+
+    def render(self, extra_labels=None) -> list:
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} {}".format(self.name, self.metric_type),
+        ]
+        for suffix, label_values, sample_labels, value in self.samples():
+            labels = dict(extra_labels or {})
+            labels.update(sample_labels)
+            lines.append(
+                "{}{}{} {}".format(
+                    self.name,
+                    suffix,
+                    _format_labels(self.label_names, label_values, labels),
+                    _format_value(value),
+                )
+            )
+        return lines
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, {}, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            return [("", key, {}, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DECISION_LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, (None, 0))
+            if counts is None:
+                # one count per bucket plus the +Inf bucket
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((k, (list(c), t)) for k, (c, t) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], counts):
+                cumulative += count
+                samples.append(("_bucket", key, {"le": _format_value(float(bound))}, cumulative))
+            samples.append(("_sum", key, {}, round(total, 6)))
+            samples.append(("_count", key, {}, cumulative))
+        return samples
+
+
+class GameHistory:
+    """Finished games of the last `window_seconds`, for games per hour and win rates"""
+
+    def __init__(self, window_seconds=ROLLING_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.games = deque()
+        self._lock = threading.Lock()
+
+    def record(self, pokemon_format, team, won, now=None):
+        with self._lock:
+            self.games.append((now or time.time(), pokemon_format, team, won))
+
+    def _prune(self, now):
+        while self.games and self.games[0][0] < now - self.window_seconds:
+            self.games.popleft()
+
+    def summary(self, now=None):
+        """(games per hour, {(format, team): win rate})"""
+        now = now or time.time()
+        with self._lock:
+            self._prune(now)
+            games = list(self.games)
+
+        results = {}
+        for _, pokemon_format, team, won in games:
+            wins, total = results.get((pokemon_format, team), (0, 0))
+            results[(pokemon_format, team)] = (wins + int(won), total + 1)
+        games_per_hour = len(games) * 3600 / self.window_seconds
+        return games_per_hour, {k: wins / total for k, (wins, total) in results.items()}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.game_history = GameHistory()
+        self.games_per_hour = self.gauge(
+            "fp_games_per_hour", "Games finished during the last hour"
+        )
+        self.win_rate = self.gauge(
+            "fp_win_rate", "Win rate over the games of the last hour", ["format", "team"]
+        )
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DECISION_LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self, extra_labels=None) -> str:
+        games_per_hour, win_rates = self.game_history.summary()
+        self.games_per_hour.set(round(games_per_hour, 3))
+        # formats and teams with no games left in the window drop out
+        self.win_rate.clear()
+        for (pokemon_format, team), win_rate in win_rates.items():
+            self.win_rate.set(round(win_rate, 4), format=pokemon_format, team=team)
+
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render(extra_labels)
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path, extra_labels=None):
+        # written to a temporary file and renamed so readers never see a partial file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(self.render(extra_labels))
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+BATTLES = registry.counter(
+    "fp_battles_total", "Finished battles", ["format", "team", "result"]
+)
+DECISIONS = registry.counter("fp_decisions_total", "Decisions made", ["format"])
+DECISION_LATENCY = registry.histogram(
+    "fp_decision_latency_seconds",
+    "Wall time of a decision",
+    ["format"],
+    DECISION_LATENCY_BUCKETS,
+)
+SEARCH_ITERATIONS = registry.histogram(
+    "fp_search_iterations",
+    "MCTS iterations summed over the determinizations of a decision",
+    ["format"],
+    SEARCH_ITERATIONS_BUCKETS,
+)
+ACTIVE_BATTLES = registry.gauge("fp_active_battles", "Battles in progress")
+POOL_UTILIZATION = registry.gauge(
+    "fp_search_pool_utilization",
+    "Fraction of the search pool's worker time spent in MCTS during the last decision",
+)
+
+
+def record_decision(pokemon_format, latency_s, search_stats):
+    DECISIONS.inc(format=pokemon_format)
+    DECISION_LATENCY.observe(latency_s, format=pokemon_format)
+    if not search_stats:
+        return
+
+    SEARCH_ITERATIONS.observe(search_stats.get("total_visits", 0), format=pokemon_format)
+    search_ms = search_stats.get("timings_ms", {}).get("search", 0)
+    mcts_ms = sum(w["mcts_ms"] for w in search_stats.get("workers", {}).values())
+    if search_ms > 0:
+        POOL_UTILIZATION.set(
+            round(min(1.0, mcts_ms / (search_ms * search_stats.get("parallelism", 1))), 4)
+        )
+
+
+def record_battle(pokemon_format, team, won):
+    BATTLES.inc(format=pokemon_format, team=team, result="win" if won else "loss")
+    registry.game_history.record(pokemon_format, team, won)
+
+
+class TextfileWriter:
+    """Writes the registry to a Prometheus textfile every `interval` seconds from a background thread"""
+
+    def __init__(self, path: Path, interval=TEXTFILE_INTERVAL_SECONDS, extra_labels=None):
+        self.path = path
+        self.interval = interval
+        self.extra_labels = extra_labels
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        try:
+            registry.write_textfile(self.path, self.extra_labels)
+        except OSError as e:
+            logger.warning("Could not write metrics to {}: {}".format(self.path, e))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="fp-metrics", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.write()
+
+
+def start_metrics_writer() -> TextfileWriter:
+    instance = os.environ.get("FP_INSTANCE_ID") or "bot"
+    writer = TextfileWriter(METRICS_DIR / "{}.prom".format(instance), extra_labels={"instance": instance})
+    writer.start()
+    return writer
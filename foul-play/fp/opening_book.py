@@ -0,0 +1,282 @@
+"""
+Opening book of search results across battles
+
+With a fixed team the first turns against the same lead are the same decision
+every game. The aggregated policy of each of those searches is kept under a
+canonical hash of what is observable about the battle, merged across games by
+the number of visits behind it and saved to disk.
+
+Once a position has been searched in enough games the book is trusted: in
+"answer" mode the move is drawn from it without searching, in "refine" mode the
+search still runs and is added to the book before the move is drawn from it.
+
+The searches are written to disk in batches and when a battle ends, merged into
+the file under a lock so every bot sharing a book adds to it. Once the book is
+full, the positions searched least recently are dropped, untrusted ones first
+"""
+import atexit
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from config import FoulPlayConfig
+from fp.battle import Battle, Battler, Pokemon
+
+logger = logging.getLogger(__name__)
+
+BOOK_VERSION = 1
+
+# Positions after this turn are not kept
+MAX_TURN = 3
+# A position is answered from the book once it was searched in this many games
+MIN_GAMES = 3
+# Positions kept in the book
+MAX_ENTRIES = 20000
+# Searches recorded before the book is written to disk
+SAVE_EVERY = 20
+
+ANSWER_MODE = "answer"
+REFINE_MODE = "refine"
+
+
+def _percent(pkmn: Pokemon) -> int:
+    return round(100 * pkmn.hp / pkmn.max_hp) if pkmn.max_hp else 0
+
+
+def _observable_pokemon(pkmn: Pokemon) -> list:
+    return [
+        pkmn.name,
+        pkmn.level,
+        _percent(pkmn),
+        pkmn.status,
+        pkmn.item,
+        pkmn.ability,
+        pkmn.terastallized,
+        pkmn.tera_type if pkmn.terastallized else None,
+        sorted((m.name, m.disabled) for m in pkmn.moves),
+        sorted((k, v) for k, v in pkmn.boosts.items() if v),
+        sorted(pkmn.volatile_statuses),
+    ]
+
+
+def _observable_side(battler: Battler) -> list:
+    return [
+        _observable_pokemon(battler.active) if battler.active is not None else None,
+        sorted(_observable_pokemon(p) for p in battler.reserve),
+        sorted((k, v) for k, v in battler.side_conditions.items() if v),
+        battler.last_used_move.move,
+        list(battler.wish),
+        list(battler.future_sight),
+    ]
+
+
+def observable_state(battle: Battle) -> list:
+    """What both players can see of `battle`, in a canonical order"""
+    return [
+        battle.pokemon_format,
+        battle.turn,
+        battle.force_switch,
+        battle.weather,
+        battle.field,
+        battle.trick_room,
+        battle.gravity,
+        _observable_side(battle.user),
+        _observable_side(battle.opponent),
+    ]
+
+
+def position_key(battle: Battle) -> str:
+    serialized = json.dumps(observable_state(battle), separators=(",", ":"), default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()[:16]
+
+
+def _new_entry() -> dict:
+    return {"games": 0, "visits": 0, "policy": {}}
+
+
+def _merge_entry(entry: dict, added: dict):
+    entry["games"] += added["games"]
+    entry["visits"] += added["visits"]
+    for move, visits in added["policy"].items():
+        entry["policy"][move] = entry["policy"].get(move, 0) + visits
+
+
+class OpeningBook:
+    """
+    Policies of the opening positions of battles, by `position_key`
+
+    Every entry keeps the visits of each move summed over the searches of that
+    position: a search adds its policy weighted by its total visits.
+    Entries are kept in the order they were last searched
+    """
+
+    def __init__(
+        self,
+        path=None,
+        max_turn: int = MAX_TURN,
+        min_games: int = MIN_GAMES,
+        max_entries: int = MAX_ENTRIES,
+        save_every: int = SAVE_EVERY,
+    ):
+        self.path = Path(path) if path else None
+        self.max_turn = max_turn
+        self.min_games = min_games
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self.entries = {}
+        # the searches recorded since the book was last saved, by position
+        self._unsaved = {}
+        self._unsaved_searches = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read the opening book {}: {}".format(self.path, e))
+            return {}
+        if data.get("version") != BOOK_VERSION:
+            logger.warning("Ignoring opening book {}: unknown version".format(self.path))
+            return {}
+        return data["entries"]
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        self.entries = self._read()
+        if self.entries:
+            logger.info("Loaded {} opening book positions".format(len(self.entries)))
+
+    def _evict(self):
+        excess = len(self.entries) - self.max_entries
+        if excess <= 0:
+            return
+        # untrusted positions first, but not the ones just searched: they are still learning
+        untrusted = [
+            k
+            for k, e in self.entries.items()
+            if e["games"] < self.min_games and k not in self._unsaved
+        ]
+        trusted = [k for k, e in self.entries.items() if e["games"] >= self.min_games]
+        recent = [
+            k
+            for k in self._unsaved
+            if k in self.entries and self.entries[k]["games"] < self.min_games
+        ]
+        for key in (untrusted + trusted + recent)[:excess]:
+            del self.entries[key]
+        logger.info("Dropped {} opening book positions".format(excess))
+
+    def _save(self):
+        if self.path is None or not self._unsaved:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(".lock"), "a") as lock_file:
+            # other bots sharing the book save between our reads and writes otherwise
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = self._read()
+            for key, added in self._unsaved.items():
+                entry = entries.pop(key, None) or _new_entry()
+                _merge_entry(entry, added)
+                entries[key] = entry
+            self.entries = entries
+            self._evict()
+            # written to a temporary file and renamed so a crash never leaves a partial book
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({"version": BOOK_VERSION, "entries": self.entries}))
+            os.replace(tmp_path, self.path)
+        self._unsaved = {}
+        self._unsaved_searches = 0
+
+    def _try_save(self):
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning("Could not save the opening book {}: {}".format(self.path, e))
+
+    def save(self):
+        """Merges the searches recorded since the last save into the book on disk"""
+        with self._lock:
+            self._try_save()
+
+    def key(self, battle: Battle):
+        """The position of `battle`, or None if it is not an opening position"""
+        if battle.team_preview or not battle.turn or battle.turn > self.max_turn:
+            return None
+        return position_key(battle)
+
+    def policy(self, key) -> list:
+        """[(move, weight)] of a position, best first. Empty if it was never searched"""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self.entries.get(key)
+            if entry is None or not entry["visits"]:
+                return []
+            return sorted(
+                ((move, visits / entry["visits"]) for move, visits in entry["policy"].items()),
+                key=lambda x: x[1],
+                reverse=True,
+            )
+
+    def is_trusted(self, key) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            entry = self.entries.get(key)
+            return entry is not None and entry["games"] >= self.min_games
+
+    def games(self, key) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return self.entries.get(key, {}).get("games", 0)
+
+    def record(self, key, final_policy: list, total_visits: int):
+        """Adds a search of a position: its aggregated policy and how many visits it made"""
+        if not total_visits:
+            return
+        added = {
+            "games": 1,
+            "visits": total_visits,
+            "policy": {move: weight * total_visits for move, weight in final_policy},
+        }
+        with self._lock:
+            self._ensure_loaded()
+            entry = self.entries.pop(key, None) or _new_entry()
+            _merge_entry(entry, added)
+            self.entries[key] = entry
+            _merge_entry(self._unsaved.setdefault(key, _new_entry()), added)
+            self._evict()
+            self._unsaved_searches += 1
+            if self._unsaved_searches >= self.save_every:
+                self._try_save()
+
+
+_opening_book = None
+
+
+def get_opening_book():
+    """The configured opening book, or None if it is disabled"""
+    global _opening_book
+    path = FoulPlayConfig.opening_book
+    if not path:
+        return None
+    if _opening_book is None or _opening_book.path != Path(path):
+        flush_opening_book()
+        _opening_book = OpeningBook(path, max_entries=FoulPlayConfig.opening_book_max_entries)
+    return _opening_book
+
+
+def flush_opening_book():
+    """Saves the searches the opening book has not written to disk yet"""
+    if _opening_book is not None:
+        _opening_book.save()
+
+
+atexit.register(flush_opening_book)
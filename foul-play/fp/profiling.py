@@ -0,0 +1,73 @@
+"""
+Sampling profiler for single decisions
+
+A background thread samples the stack of the profiled thread every few milliseconds
+and counts the collapsed stacks ("outer;inner;innermost count"), the input format of
+flamegraph.pl, speedscope and inferno. Sampling from another thread costs the
+profiled thread nothing but the GIL switches, so production turns can be profiled
+"""
+import logging
+import sys
+import threading
+from collections import Counter
+
+from config import FoulPlayConfig
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    def __init__(self, interval_ms: float, thread_id: int = None):
+        self.interval_s = interval_ms / 1000
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(
+                "{} ({}:{})".format(
+                    code.co_name, code.co_filename.rsplit("/", 1)[-1], code.co_firstlineno
+                )
+            )
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="fp-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+
+def profiling_enabled() -> bool:
+    return bool(FoulPlayConfig.profile_every_n_turns or FoulPlayConfig.profile_slow_turn_ms)
+
+
+def should_save_profile(turn: int, elapsed_ms: float) -> bool:
+    every_n = FoulPlayConfig.profile_every_n_turns
+    slow_ms = FoulPlayConfig.profile_slow_turn_ms
+    return bool(
+        (every_n and (turn or 0) % every_n == 0) or (slow_ms and elapsed_ms >= slow_ms)
+    )
+
+
+def start_profiler() -> SamplingProfiler:
+    """A profiler of the calling thread if profiling is enabled, otherwise None"""
+    if not profiling_enabled():
+        return None
+    return SamplingProfiler(FoulPlayConfig.profile_interval_ms).start()
@@ -5,25 +5,23 @@ from copy import deepcopy
 import logging
 import time
 
-from data.pkmn_sets import RandomBattleTeamDatasets, TeamDatasets
-
-def _rbts_load_safe(fmt: str):
-    try:
-        _rbts_load_safe(fmt)
-    except Exception:
-        return None
-
-from data.pkmn_sets import SmogonSets
 import constants
 from constants import BattleType
 from config import FoulPlayConfig, SaveReplay
 from fp.battle import LastUsedMove, Pokemon, Battle
 from fp.battle_modifier import process_battle_updates
+from fp.format_context import format_contexts
 from fp.helpers import normalize_name
+from fp.opening_book import flush_opening_book
 from fp.search.main import find_best_move
+from fp.search.team_preview import find_team_order
+from fp.search.time_budget import search_budget
+from fp.search.determinizations import determinization_controller
 from fp.websocket_client import PSWebsocketClient
 from fp.epoke_client import epoke_enabled, epoke_suggest_move_async
-from fp.decision_logger import log_hybrid_decision, log_mcts_decision
+from fp.decision_logger import is_replayable, log_hybrid_decision, log_mcts_decision, save_search_snapshot
+from fp.event_publisher import event_publisher, publish_battle_state, publish_decision
+from fp.metrics import ACTIVE_BATTLES, record_decision
 import re
 
 logger = logging.getLogger(__name__)
@@ -63,6 +61,14 @@ def format_decision(battle, decision):
 def battle_is_finished(battle_tag, msg):
     return msg.startswith(">{}".format(battle_tag)) and (constants.WIN_STRING in msg or constants.TIE_STRING in msg) and constants.CHAT_STRING not in msg
 
+def _decision_extra(battle_copy, search_stats):
+    extra = {"search": search_stats}
+    if FoulPlayConfig.save_decision_snapshots and is_replayable(search_stats):
+        battle_id = getattr(battle_copy, 'battle_tag', 'unknown')
+        turn = getattr(battle_copy, 'turn', 0)
+        extra["snapshot"] = save_search_snapshot(battle_id, turn, battle_copy, search_stats)
+    return extra
+
 async def async_pick_move(battle_copy):
     global _FP_EXECUTOR
     battle_id = getattr(battle_copy, 'battle_tag', 'unknown')
@@ -78,16 +84,21 @@ async def async_pick_move(battle_copy):
     if _FP_EXECUTOR is None:
         _FP_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fp-search")
     
+    search_stats = {}
     if not enable_epoke:
         start_time = time.time()
-        mcts_move = await loop.run_in_executor(_FP_EXECUTOR, find_best_move, battle_copy)
+        mcts_move = await loop.run_in_executor(_FP_EXECUTOR, find_best_move, battle_copy, search_stats)
         search_time_ms = (time.time() - start_time) * 1000
         logger.info(f"[MCTS] Turn {turn}: {mcts_move}")
-        log_mcts_decision(battle_id, turn, mcts_move, None, search_time_ms)
+        publish_decision(battle_id, turn, mcts_move, search_stats)
+        record_decision(battle_copy.pokemon_format, search_time_ms / 1000, search_stats)
+        extra = _decision_extra(battle_copy, search_stats)
+        extra["timings_ms"] = search_stats.get("timings_ms", {})
+        log_mcts_decision(battle_id, turn, mcts_move, search_stats.get("final_policy"), search_time_ms, extra)
         return mcts_move
     
     start_time = time.time()
-    mcts_task = loop.run_in_executor(_FP_EXECUTOR, find_best_move, battle_copy)
+    mcts_task = loop.run_in_executor(_FP_EXECUTOR, find_best_move, battle_copy, search_stats)
     epoke_task = epoke_suggest_move_async(battle_copy)
     
     try:
@@ -114,24 +125,42 @@ async def async_pick_move(battle_copy):
         chosen_source = "MCTS"
         logger.warning(f"[HYBRID] EPoké failed: {chosen_move}")
     
-    log_hybrid_decision(battle_id, turn, mcts_move, 0.7, epoke_move or "FAILED", epoke_conf, chosen_move, chosen_source, None, {"elapsed_ms": elapsed_ms})
+    publish_decision(battle_id, turn, chosen_move, search_stats)
+    record_decision(battle_copy.pokemon_format, elapsed_ms / 1000, search_stats)
+    timings_ms = dict(search_stats.get("timings_ms", {}), elapsed_ms=elapsed_ms)
+    log_hybrid_decision(battle_id, turn, mcts_move, 0.7, epoke_move or "FAILED", epoke_conf, chosen_move, chosen_source, search_stats.get("final_policy"), timings_ms, _decision_extra(battle_copy, search_stats))
     return chosen_move
 
+async def async_pick_team_order(battle_copy):
+    global _FP_EXECUTOR
+    battle_id = getattr(battle_copy, 'battle_tag', 'unknown')
+    turn = getattr(battle_copy, 'turn', 0)
+    loop = asyncio.get_running_loop()
+    if _FP_EXECUTOR is None:
+        _FP_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fp-search")
+
+    search_stats = {}
+    start_time = time.time()
+    team_order = await loop.run_in_executor(_FP_EXECUTOR, find_team_order, battle_copy, search_stats)
+    search_time_ms = (time.time() - start_time) * 1000
+    choice = search_stats["choice"]
+    logger.info(f"[MCTS] Team preview: {choice}")
+    publish_decision(battle_id, turn, choice, search_stats)
+    record_decision(battle_copy.pokemon_format, search_time_ms / 1000, search_stats)
+    extra = _decision_extra(battle_copy, search_stats)
+    extra["timings_ms"] = search_stats.get("timings_ms", {})
+    log_mcts_decision(battle_id, turn, choice, search_stats.get("final_policy"), search_time_ms, extra)
+    return team_order
+
 async def handle_team_preview(battle, ps_websocket_client):
     battle_copy = deepcopy(battle)
     battle_copy.user.active = Pokemon.get_dummy()
     battle_copy.opponent.active = Pokemon.get_dummy()
     battle_copy.team_preview = True
-    best_move = await async_pick_move(battle_copy)
-    reserve = battle.user.reserve
-    idx = int(best_move.split()[-1]) - 1
-    pkmn_name = reserve[idx].name
-    battle.user.last_selected_move = LastUsedMove("teampreview", "switch {}".format(pkmn_name), battle.turn)
-    size_of_team = len(battle.user.reserve) + 1
-    team_list_indexes = list(range(1, size_of_team))
-    choice_digit = int(best_move.split()[-1])
-    team_list_indexes.remove(choice_digit)
-    message = ["/team {}{}|{}".format(choice_digit, "".join(str(x) for x in team_list_indexes), battle.rqid)]
+    team_order = await async_pick_team_order(battle_copy)
+    index_by_name = {p.name: p.index for p in battle.user.reserve}
+    battle.user.last_selected_move = LastUsedMove("teampreview", "switch {}".format(team_order[0]), battle.turn)
+    message = ["/team {}|{}".format("".join(str(index_by_name[name]) for name in team_order), battle.rqid)]
     await ps_websocket_client.send_message(battle.battle_tag, message)
 
 async def get_battle_tag_and_opponent(ps_websocket_client):
@@ -153,6 +182,7 @@ async def get_battle_tag_and_opponent(ps_websocket_client):
                 continue
             else:
                 active_battles.add(battle_tag)
+                ACTIVE_BATTLES.set(len(active_battles))
                 logger.info(f"Battle started: {battle_tag} ({len(active_battles)}/{max_concurrent} active)")
             
             user_name = FoulPlayConfig.username
@@ -170,30 +200,37 @@ async def start_battle_common(ps_websocket_client, pokemon_battle_type):
         battle.opponent.account_name = opponent_name
         battle.pokemon_format = pokemon_battle_type
         battle.generation = pokemon_battle_type[:4]
+        battle.battle_type = format_contexts.get(pokemon_battle_type).battle_type
+        event_publisher.publish("battle_start", battle_tag, opponent=opponent_name, format=pokemon_battle_type)
         
         while True:
             msg = await ps_websocket_client.receive_message()
             if battle_is_finished(battle_tag, msg):
                 winner = msg.split(constants.WIN_STRING)[-1].split("\n")[0].strip()
+                event_publisher.publish("battle_end", battle_tag, winner=winner)
                 await ps_websocket_client.leave_battle(battle_tag)
                 return winner
             action_required = process_battle_updates(battle, msg.split('\n'))
+            publish_battle_state(battle)
             if action_required and not battle.wait:
+                if battle.team_preview:
+                    await handle_team_preview(battle, ps_websocket_client)
+                    continue
                 battle_copy = deepcopy(battle)
+                # the request is the truth about the bot's own side
+                battle_copy.user.update_from_request_json(battle_copy.request_json)
                 best_move = await async_pick_move(battle_copy)
                 choice = format_decision(battle, best_move)
                 await ps_websocket_client.send_message(battle.battle_tag, choice)
     finally:
+        search_budget.forget(battle_tag)
+        determinization_controller.forget(battle_tag)
+        flush_opening_book()
         if battle_tag in active_battles:
             active_battles.discard(battle_tag)
+            ACTIVE_BATTLES.set(len(active_battles))
             logger.info(f"Battle ended: {battle_tag} ({len(active_battles)}/{FoulPlayConfig.max_concurrent_battles} active)")
 
 async def pokemon_battle(ps_websocket_client, pokemon_format, team_dict):
-    if "random" in pokemon_format.lower():
-        SmogonSets.MODE = "randoms"
-        _rbts_load_safe(pokemon_format)
-    else:
-        SmogonSets.MODE = "standard"
-        TeamDatasets.load()
-    
+    format_contexts.activate(pokemon_format)
     return await start_battle_common(ps_websocket_client, pokemon_format)
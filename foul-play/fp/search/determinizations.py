@@ -0,0 +1,104 @@
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+# The number of sampled battles is scaled by a factor between these bounds.
+# The search time per battle is scaled inversely so the wall time of a decision stays the same
+MIN_SAMPLE_FACTOR = 0.5
+MAX_SAMPLE_FACTOR = 4
+# The factor scales the 1-4 rounds of `parallelism` battles that `search_time_num_battles`
+# plans, and never makes more than this many rounds
+MAX_ROUNDS = 4
+
+# Determinizations disagreeing more than this -> sample more battles, search each one shallower
+HIGH_DISAGREEMENT = 0.4
+# Determinizations disagreeing less than this -> sample fewer battles, search each one deeper
+LOW_DISAGREEMENT = 0.15
+
+MIN_SEARCH_TIME_MS = 20
+
+
+def determinization_stats(mcts_results) -> dict:
+    """
+    Statistics about how much the sampled battles agree on the best move
+
+    disagreement: fraction of sampled battles whose most visited move is not the most common one
+    entropy: entropy (bits) of the distribution of each sampled battle's most visited move
+    """
+    best_move_counts = {}
+    for mcts_result, _, _ in mcts_results:
+        best = max(mcts_result.side_one, key=lambda x: x.visits).move_choice
+        best_move_counts[best] = best_move_counts.get(best, 0) + 1
+
+    num_results = len(mcts_results)
+    if num_results == 0:
+        return {
+            "num_determinizations": 0,
+            "best_move_counts": {},
+            "disagreement": 0.0,
+            "entropy": 0.0,
+        }
+
+    entropy = -sum(
+        (c / num_results) * math.log2(c / num_results)
+        for c in best_move_counts.values()
+    )
+    return {
+        "num_determinizations": num_results,
+        "best_move_counts": best_move_counts,
+        "disagreement": 1 - max(best_move_counts.values()) / num_results,
+        "entropy": round(entropy, 4),
+    }
+
+
+class DeterminizationController:
+    """
+    Trades off the number of sampled battles against the search time of each one
+
+    After every decision the disagreement between the sampled battles is recorded.
+    The next decision in the same battle samples more battles if they disagreed
+    and fewer, deeper searched battles if they agreed: the factor applied to a
+    decision comes from the disagreement of the ones before it.
+    It scales the number of battles the format's heuristics plan, up to `MAX_ROUNDS`
+    """
+
+    def __init__(self):
+        self.sample_factors = {}
+
+    def forget(self, battle_tag):
+        self.sample_factors.pop(battle_tag, None)
+
+    def get_sample_factor(self, battle_tag):
+        return self.sample_factors.get(battle_tag, 1)
+
+    def apply(self, battle, num_battles, search_time_ms, parallelism):
+        factor = self.get_sample_factor(battle.battle_tag)
+        if factor == 1:
+            return num_battles, search_time_ms
+
+        rounds = math.ceil(num_battles / parallelism)
+        new_rounds = min(max(rounds, MAX_ROUNDS), max(1, round(rounds * factor)))
+        new_search_time_ms = max(
+            MIN_SEARCH_TIME_MS, int(search_time_ms * rounds / new_rounds)
+        )
+        new_num_battles = new_rounds * parallelism
+        logger.info(
+            "Determinizations: sample_factor={} {}x{}ms -> {}x{}ms".format(
+                factor, num_battles, search_time_ms, new_num_battles, new_search_time_ms
+            )
+        )
+        return new_num_battles, new_search_time_ms
+
+    def update(self, battle_tag, stats):
+        factor = self.get_sample_factor(battle_tag)
+        if stats["disagreement"] > HIGH_DISAGREEMENT:
+            factor = min(MAX_SAMPLE_FACTOR, factor * 2)
+        elif stats["disagreement"] < LOW_DISAGREEMENT:
+            factor = max(MIN_SAMPLE_FACTOR, factor / 2)
+        self.sample_factors[battle_tag] = factor
+        return factor
+
+
+determinization_controller = DeterminizationController()
@@ -1,5 +1,10 @@
+import hashlib
 import logging
+import math
+import os
 import random
+import time
+from collections import Counter
 from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 
@@ -12,11 +17,21 @@ from .random_battles import prepare_random_battles
 from poke_engine import State as PokeEngineState, monte_carlo_tree_search, MctsResult
 
 from fp.search.poke_engine_helpers import battle_to_poke_engine_state
+from fp.search.policy import select_move_from_policy
+from fp.search.time_budget import search_budget
+from fp.search.transpositions import merge_duplicate_states, transposition_table
+from fp.search.determinizations import (
+    determinization_controller,
+    determinization_stats,
+)
+from fp.decision_logger import save_decision_profile
+from fp.opening_book import ANSWER_MODE, get_opening_book
+from fp.profiling import SamplingProfiler, should_save_profile, start_profiler
 
 logger = logging.getLogger(__name__)
 
 
-def select_move_from_mcts_results(mcts_results: list[(MctsResult, float, int)]) -> str:
+def aggregate_mcts_results(mcts_results: list[(MctsResult, float, int)]) -> list:
     final_policy = {}
     for mcts_result, sample_chance, index in mcts_results:
         this_policy = max(mcts_result.side_one, key=lambda x: x.visits)
@@ -34,17 +49,28 @@ def select_move_from_mcts_results(mcts_results: list[(MctsResult, float, int)])
                 s1_option.move_choice, 0
             ) + (sample_chance * (s1_option.visits / mcts_result.total_visits))
 
-    final_policy = sorted(final_policy.items(), key=lambda x: x[1], reverse=True)
+    return sorted(final_policy.items(), key=lambda x: x[1], reverse=True)
 
-    # Consider all moves that are close to the best move
-    highest_percentage = final_policy[0][1]
-    final_policy = [i for i in final_policy if i[1] >= highest_percentage * 0.75]
-    logger.info("Considered Choices:")
-    for i, policy in enumerate(final_policy):
-        logger.info(f"\t{round(policy[1] * 100, 3)}%: {policy[0]}")
 
-    choice = random.choices(final_policy, weights=[p[1] for p in final_policy])[0]
-    return choice[0]
+def select_move_from_mcts_results(
+    mcts_results: list[(MctsResult, float, int)], rng=random
+) -> str:
+    return select_move_from_policy(aggregate_mcts_results(mcts_results), rng)
+
+
+def merge_mcts_result_batches(
+    batches: list, batch_sizes: list[int] = None
+) -> list[(MctsResult, float, int)]:
+    # each batch's sample chances sum to 1
+    # weight every batch by how many battles it sampled: duplicate battles share a result
+    if batch_sizes is None:
+        batch_sizes = [len(b) for b in batches]
+    total_battles = sum(batch_sizes)
+    merged = []
+    for batch, batch_size in zip(batches, batch_sizes):
+        for mcts_result, chance, index in batch:
+            merged.append((mcts_result, chance * batch_size / total_battles, index))
+    return merged
 
 
 def get_result_from_mcts(state: str, search_time_ms: int, index: int) -> MctsResult:
@@ -62,7 +88,6 @@ def search_time_num_battles_randombattles(battle):
         revealed_pkmn += 1
 
     opponent_active_num_moves = len(battle.opponent.active.moves)
-    in_time_pressure = battle.time_remaining is not None and battle.time_remaining <= 60
 
     # it is still quite early in the battle and the pkmn in front of us
     # hasn't revealed any moves: search a lot of battles shallowly
@@ -71,75 +96,557 @@ def search_time_num_battles_randombattles(battle):
         and battle.opponent.active.hp > 0
         and opponent_active_num_moves == 0
     ):
-        num_battles_multiplier = 2 if in_time_pressure else 4
-        return FoulPlayConfig.parallelism * num_battles_multiplier, int(
-            FoulPlayConfig.search_time_ms // 2
-        )
+        return FoulPlayConfig.parallelism * 4, int(FoulPlayConfig.search_time_ms // 2)
 
     else:
-        num_battles_multiplier = 1 if in_time_pressure else 2
-        return FoulPlayConfig.parallelism * num_battles_multiplier, int(
-            FoulPlayConfig.search_time_ms
-        )
+        return FoulPlayConfig.parallelism * 2, int(FoulPlayConfig.search_time_ms)
 
 
 def search_time_num_battles_standard_battle(battle):
     opponent_active_num_moves = len(battle.opponent.active.moves)
-    in_time_pressure = battle.time_remaining is not None and battle.time_remaining <= 60
 
     if (
         battle.team_preview
         or (battle.opponent.active.hp > 0 and opponent_active_num_moves == 0)
         or opponent_active_num_moves < 3
     ):
-        num_battles_multiplier = 1 if in_time_pressure else 2
-        return FoulPlayConfig.parallelism * num_battles_multiplier, int(
-            FoulPlayConfig.search_time_ms
-        )
+        return FoulPlayConfig.parallelism * 2, int(FoulPlayConfig.search_time_ms)
     else:
         return FoulPlayConfig.parallelism, FoulPlayConfig.search_time_ms
 
 
-def find_best_move(battle: Battle) -> str:
+def search_time_num_battles(battle):
+    if battle.battle_type == BattleType.RANDOM_BATTLE:
+        return search_time_num_battles_randombattles(battle)
+    elif battle.battle_type in [BattleType.BATTLE_FACTORY, BattleType.STANDARD_BATTLE]:
+        return search_time_num_battles_standard_battle(battle)
+    else:
+        raise ValueError("Unsupported battle type: {}".format(battle.battle_type))
+
+
+def sample_battles(
+    battle: Battle, num_battles: int, rng=random, stratified: bool = False
+) -> list[(Battle, float)]:
+    """
+    At most `num_battles` distinct battles sampled from `battle` with their weights
+    `stratified`: the most probable joint sets of the opponent instead of random draws
+    """
+    if battle.battle_type in [BattleType.RANDOM_BATTLE, BattleType.BATTLE_FACTORY]:
+        return prepare_random_battles(battle, num_battles, rng, stratified)
+    elif battle.battle_type == BattleType.STANDARD_BATTLE:
+        return prepare_battles(battle, num_battles, rng, stratified)
+    else:
+        raise ValueError("Unsupported battle type: {}".format(battle.battle_type))
+
+
+def state_digest(state: str) -> str:
+    return hashlib.sha1(state.encode("utf-8")).hexdigest()[:16]
+
+
+def combined_digest(digests: list[str]) -> str:
+    return hashlib.sha1(",".join(digests).encode("utf-8")).hexdigest()[:16]
+
+
+class SearchTelemetry:
+    """
+    Where the time of a decision's search went
+
+    stages_ms: wall time per stage (deepcopy, sampling, conversion, submit, search, aggregation)
+    determinizations: MCTS time, visits and worker of every searched battle
+    transpositions: duplicate determinizations merged and searches reused from the transposition table
+    profile: collapsed stacks sampled in the workers when the decision is profiled
+    """
+
+    def __init__(self, profile_interval_ms: float = 0):
+        self.stages_ms = {}
+        self.determinizations = []
+        self.profile_interval_ms = profile_interval_ms
+        self.profile = Counter()
+        self.transpositions = Counter()
+
+    def add_transpositions(self, duplicates: int = 0, cache_hits: int = 0):
+        self.transpositions["duplicates"] += duplicates
+        self.transpositions["cache_hits"] += cache_hits
+
+    def add_stage(self, stage: str, elapsed_ms: float):
+        self.stages_ms[stage] = self.stages_ms.get(stage, 0) + elapsed_ms
+
+    def add_determinization(
+        self, index: int, chance: float, mcts_result: MctsResult, worker: int, mcts_ms: float
+    ):
+        self.determinizations.append(
+            {
+                "index": index,
+                "sample_chance": round(chance, 4),
+                "total_visits": mcts_result.total_visits,
+                "mcts_ms": round(mcts_ms, 2),
+                "worker": worker,
+            }
+        )
+
+    def add_workers(self, worker_telemetries: list["SearchTelemetry"]):
+        # workers run their stages concurrently: the slowest worker is what the decision waits on
+        for stage in {s for t in worker_telemetries for s in t.stages_ms}:
+            self.add_stage(stage, max(t.stages_ms.get(stage, 0) for t in worker_telemetries))
+        for t in worker_telemetries:
+            self.determinizations += t.determinizations
+            self.profile.update(t.profile)
+            self.transpositions.update(t.transpositions)
+
+    def add_profile(self, stacks: Counter, root: str = None):
+        for stack, count in stacks.items():
+            self.profile[stack if root is None else "{};{}".format(root, stack)] += count
+
+    def workers(self) -> dict:
+        workers = {}
+        for d in self.determinizations:
+            worker = workers.setdefault(str(d["worker"]), {"mcts_ms": 0, "determinizations": 0})
+            worker["mcts_ms"] = round(worker["mcts_ms"] + d["mcts_ms"], 2)
+            worker["determinizations"] += 1
+        return workers
+
+
+def _start_worker_profiler(profile_interval_ms: float) -> SamplingProfiler:
+    if not profile_interval_ms:
+        return None
+    return SamplingProfiler(profile_interval_ms).start()
+
+
+def timed_result_from_mcts(
+    state: str, search_time_ms: int, index: int, profile_interval_ms: float = 0
+) -> (MctsResult, int, float, Counter):
+    """
+    Runs in a worker process: returns the result along with the worker's pid, the MCTS time
+    and, if `profile_interval_ms` is set, the stacks sampled during the search
+    """
+    profiler = _start_worker_profiler(profile_interval_ms)
+    start_time = time.time()
+    result = get_result_from_mcts(state, search_time_ms, index)
+    mcts_ms = (time.time() - start_time) * 1000
+    return result, os.getpid(), mcts_ms, profiler.stop() if profiler else None
+
+
+def search_battles(
+    battles: list[(Battle, float)],
+    search_time_per_battle: int,
+    index_offset=0,
+    telemetry: SearchTelemetry = None,
+) -> (list[(MctsResult, float, int)], list[str]):
+    telemetry = telemetry or SearchTelemetry()
+    digests = []
+    states = []
+    start_time = time.time()
+    for index, (b, chance) in enumerate(battles, start=index_offset):
+        state = battle_to_poke_engine_state(b).to_string()
+        digest = state_digest(state)
+        digests.append(digest)
+        states.append((digest, state, chance, index))
+    conversion_ms = (time.time() - start_time) * 1000
+
+    # identical determinizations are searched once and states searched before not at all
+    states, duplicates = merge_duplicate_states(states)
+    telemetry.add_transpositions(duplicates=duplicates)
+    results = []
+    to_search = []
+    for digest, state, chance, index in states:
+        cached = transposition_table.get(digest, search_time_per_battle)
+        if cached is None:
+            to_search.append((digest, state, chance, index))
+        else:
+            telemetry.add_transpositions(cache_hits=1)
+            results.append((cached, chance, index))
+
+    submit_ms = 0
+    if to_search:
+        with ProcessPoolExecutor(max_workers=FoulPlayConfig.parallelism) as executor:
+            futures = []
+            for digest, state, chance, index in to_search:
+                submit_start_time = time.time()
+                fut = executor.submit(
+                    timed_result_from_mcts,
+                    state,
+                    search_time_per_battle,
+                    index,
+                    telemetry.profile_interval_ms,
+                )
+                submit_ms += (time.time() - submit_start_time) * 1000
+                futures.append((fut, digest, chance, index))
+
+        for fut, digest, chance, index in futures:
+            mcts_result, worker, mcts_ms, stacks = fut.result()
+            transposition_table.put(digest, mcts_result, search_time_per_battle)
+            telemetry.add_determinization(index, chance, mcts_result, worker, mcts_ms)
+            if stacks:
+                telemetry.add_profile(stacks, "worker")
+            results.append((mcts_result, chance, index))
+
+    telemetry.add_stage("conversion", conversion_ms)
+    telemetry.add_stage("submit", submit_ms)
+    telemetry.add_stage(
+        "search", (time.time() - start_time) * 1000 - conversion_ms - submit_ms
+    )
+    return sorted(results, key=lambda r: r[2]), digests
+
+
+def _initialize_search_worker(pokemon_format):
+    # workers started with "fork" already have this format's data from the main process
+    if FoulPlayConfig.pokemon_format == pokemon_format:
+        return
+
+    from fp.format_context import format_contexts
+
+    format_contexts.activate(pokemon_format)
+
+
+def sample_and_search(
+    battle: Battle,
+    seed: int,
+    num_battles: int,
+    search_time_per_battle: int,
+    index_offset: int,
+    profile_interval_ms: float = 0,
+) -> (list[(MctsResult, float, int)], list[str], SearchTelemetry):
+    """
+    Runs in a worker process: samples `num_battles` battles from the observed `battle`
+    using `seed` and searches each of them
+    """
+    profiler = _start_worker_profiler(profile_interval_ms)
+    rng = random.Random(seed)
+    telemetry = SearchTelemetry()
+    results = []
+    digests = []
+
+    start_time = time.time()
+    battles = sample_battles(battle, num_battles, rng)
+    telemetry.add_stage("sampling", (time.time() - start_time) * 1000)
+
+    states = []
+    start_time = time.time()
+    for index, (b, chance) in enumerate(battles, start=index_offset):
+        state = battle_to_poke_engine_state(b).to_string()
+        digest = state_digest(state)
+        digests.append(digest)
+        states.append((digest, state, chance, index))
+    telemetry.add_stage("conversion", (time.time() - start_time) * 1000)
+
+    states, duplicates = merge_duplicate_states(states)
+    telemetry.add_transpositions(duplicates=duplicates)
+    for _, state, chance, index in states:
+        start_time = time.time()
+        mcts_result = get_result_from_mcts(state, search_time_per_battle, index)
+        mcts_ms = (time.time() - start_time) * 1000
+        telemetry.add_stage("search", mcts_ms)
+        telemetry.add_determinization(index, chance, mcts_result, os.getpid(), mcts_ms)
+        results.append((mcts_result, chance, index))
+
+    if profiler is not None:
+        telemetry.add_profile(profiler.stop(), "worker")
+    return results, digests, telemetry
+
+
+def fused_search(
+    battle: Battle,
+    num_battles: int,
+    search_time_per_battle: int,
+    rng: random.Random,
+    index_offset=0,
+    telemetry: SearchTelemetry = None,
+) -> (list[(MctsResult, float, int)], list[str]):
+    telemetry = telemetry or SearchTelemetry()
+    # each worker gets the observed battle once and samples its share of the battles
+    num_workers = min(FoulPlayConfig.parallelism, num_battles)
+    submit_ms = 0
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=_initialize_search_worker,
+        initargs=(FoulPlayConfig.pokemon_format,),
+    ) as executor:
+        futures = []
+        for worker_index in range(num_workers):
+            worker_num_battles = num_battles // num_workers + (
+                1 if worker_index < num_battles % num_workers else 0
+            )
+            submit_start_time = time.time()
+            futures.append(
+                executor.submit(
+                    sample_and_search,
+                    battle,
+                    rng.getrandbits(32),
+                    worker_num_battles,
+                    search_time_per_battle,
+                    index_offset,
+                    telemetry.profile_interval_ms,
+                )
+            )
+            submit_ms += (time.time() - submit_start_time) * 1000
+            index_offset += worker_num_battles
+
+    worker_results = [fut.result() for fut in futures]
+    digests = [d for _, worker_digests, _ in worker_results for d in worker_digests]
+    telemetry.add_stage("submit", submit_ms)
+    telemetry.add_workers([t for _, _, t in worker_results])
+    return (
+        merge_mcts_result_batches(
+            [r for r, _, _ in worker_results], [len(d) for _, d, _ in worker_results]
+        ),
+        digests,
+    )
+
+
+def sample_and_search_battles(
+    battle: Battle,
+    num_battles: int,
+    search_time_per_battle: int,
+    rng: random.Random,
+    index_offset=0,
+    telemetry: SearchTelemetry = None,
+) -> (list[(MctsResult, float, int)], list[str]):
+    """
+    Samples `num_battles` battles from `battle` and searches them
+    All randomness is drawn from `rng` so a seeded `rng` always samples the same battles
+    Fused workers sample independently so they never sample stratified: they would all
+    search the same most probable sets
+    Returns the results along with a digest of each searched state
+    `telemetry`: if given, records where the time was spent
+    """
+    if FoulPlayConfig.fused_search:
+        return fused_search(
+            battle, num_battles, search_time_per_battle, rng, index_offset, telemetry
+        )
+
+    telemetry = telemetry or SearchTelemetry()
+    start_time = time.time()
+    battles = sample_battles(battle, num_battles, rng, FoulPlayConfig.stratified_sampling)
+    telemetry.add_stage("sampling", (time.time() - start_time) * 1000)
+    return search_battles(battles, search_time_per_battle, index_offset, telemetry)
+
+
+def prepare_battle_for_search(battle: Battle) -> Battle:
     battle = deepcopy(battle)
     if battle.team_preview:
         battle.user.active = battle.user.reserve.pop(0)
         battle.opponent.active = battle.opponent.reserve.pop(0)
+    return battle
 
-    if battle.battle_type == BattleType.RANDOM_BATTLE:
-        num_battles, search_time_per_battle = search_time_num_battles_randombattles(
-            battle
+
+def new_search_seed() -> int:
+    return random.SystemRandom().getrandbits(32)
+
+
+def answer_from_opening_book(
+    book, book_key: str, rng: random.Random, search_stats: dict, start_time: float
+) -> str:
+    final_policy = book.policy(book_key)
+    logger.info(
+        "Answering from the opening book: {} games".format(book.games(book_key))
+    )
+    choice = select_move_from_policy(final_policy, rng)
+    if search_stats is not None:
+        # nothing is searched, so there is nothing to replay either
+        search_stats["choice"] = choice
+        search_stats["fused"] = FoulPlayConfig.fused_search
+        search_stats["parallelism"] = FoulPlayConfig.parallelism
+        search_stats["stratified_sampling"] = FoulPlayConfig.stratified_sampling
+        search_stats["num_battles"] = 0
+        search_stats["search_time_per_battle_ms"] = 0
+        search_stats["refinement_ms"] = 0
+        search_stats["sample_digest"] = combined_digest([])
+        search_stats["total_visits"] = 0
+        search_stats["final_policy"] = [
+            {"move": move, "weight": round(weight, 4)} for move, weight in final_policy
+        ]
+        search_stats["timings_ms"] = {"total": round((time.time() - start_time) * 1000, 2)}
+        search_stats["opening_book"] = {
+            "key": book_key,
+            "games": book.games(book_key),
+            "answered": True,
+        }
+    logger.info("Choice: {}".format(choice))
+    return choice
+
+
+def find_best_move(battle: Battle, search_stats: dict = None, seed: int = None) -> str:
+    """
+    `search_stats`: if given, filled with statistics about the search for the decision log
+    `seed`: seeds all sampling and the final move selection. A new one is drawn if not given
+    """
+    start_time = time.time()
+    profiler = start_profiler()
+    telemetry = SearchTelemetry(profiler.interval_s * 1000 if profiler else 0)
+    battle = prepare_battle_for_search(battle)
+    telemetry.add_stage("deepcopy", (time.time() - start_time) * 1000)
+    if seed is None:
+        seed = new_search_seed()
+    rng = random.Random(seed)
+
+    book = get_opening_book()
+    book_key = book.key(battle) if book is not None else None
+    if (
+        book_key is not None
+        and FoulPlayConfig.opening_book_mode == ANSWER_MODE
+        and book.is_trusted(book_key)
+    ):
+        if profiler is not None:
+            profiler.stop()
+        if search_stats is not None:
+            search_stats["seed"] = seed
+        return answer_from_opening_book(book, book_key, rng, search_stats, start_time)
+
+    num_battles, search_time_per_battle = search_time_num_battles(battle)
+    num_battles, search_time_per_battle = determinization_controller.apply(
+        battle, num_battles, search_time_per_battle, FoulPlayConfig.parallelism
+    )
+    num_battles, search_time_per_battle = search_budget.allocate(
+        battle, num_battles, search_time_per_battle, FoulPlayConfig.parallelism
+    )
+
+    logger.info("Searching for a move using MCTS...")
+    logger.info(
+        "Sampling {} battles at {}ms each (seed={} fused={})".format(
+            num_battles, search_time_per_battle, seed, FoulPlayConfig.fused_search
         )
-        battles = prepare_random_battles(battle, num_battles)
-    elif battle.battle_type == BattleType.BATTLE_FACTORY:
-        num_battles, search_time_per_battle = search_time_num_battles_standard_battle(
-            battle
+    )
+    mcts_results, digests = sample_and_search_battles(
+        battle, num_battles, search_time_per_battle, rng, telemetry=telemetry
+    )
+    searched_ms = (
+        math.ceil(num_battles / FoulPlayConfig.parallelism) * search_time_per_battle
+    )
+    aggregation_start_time = time.time()
+    final_policy = aggregate_mcts_results(mcts_results)
+    stats = determinization_stats(mcts_results)
+    telemetry.add_stage("aggregation", (time.time() - aggregation_start_time) * 1000)
+    sample_factor = determinization_controller.get_sample_factor(battle.battle_tag)
+
+    refinement_ms = search_budget.refinement_time_ms(
+        battle,
+        final_policy,
+        stats["disagreement"],
+        (time.time() - start_time) * 1000,
+        search_time_per_battle,
+    )
+    if refinement_ms:
+        refinement_results, refinement_digests = sample_and_search_battles(
+            battle,
+            FoulPlayConfig.parallelism,
+            refinement_ms,
+            rng,
+            index_offset=len(digests),
+            telemetry=telemetry,
         )
-        battles = prepare_random_battles(battle, num_battles)
-    elif battle.battle_type == BattleType.STANDARD_BATTLE:
-        num_battles, search_time_per_battle = search_time_num_battles_standard_battle(
-            battle
+        aggregation_start_time = time.time()
+        mcts_results = merge_mcts_result_batches(
+            [mcts_results, refinement_results], [len(digests), len(refinement_digests)]
         )
-        battles = prepare_battles(battle, num_battles)
-    else:
-        raise ValueError("Unsupported battle type: {}".format(battle.battle_type))
+        digests += refinement_digests
+        final_policy = aggregate_mcts_results(mcts_results)
+        telemetry.add_stage("aggregation", (time.time() - aggregation_start_time) * 1000)
+        searched_ms += refinement_ms
 
-    logger.info("Searching for a move using MCTS...")
     logger.info(
-        "Sampling {} battles at {}ms each".format(num_battles, search_time_per_battle)
+        "Determinizations: {} disagreement={} entropy={} best moves: {}".format(
+            stats["num_determinizations"],
+            round(stats["disagreement"], 3),
+            stats["entropy"],
+            stats["best_move_counts"],
+        )
     )
-    with ProcessPoolExecutor(max_workers=FoulPlayConfig.parallelism) as executor:
-        futures = []
-        for index, (b, chance) in enumerate(battles):
-            fut = executor.submit(
-                get_result_from_mcts,
-                battle_to_poke_engine_state(b).to_string(),
-                search_time_per_battle,
-                index,
+    next_sample_factor = determinization_controller.update(battle.battle_tag, stats)
+
+    total_visits = sum(r.total_visits for r, _, _ in mcts_results)
+    policy_from_book = False
+    if book_key is not None:
+        book.record(book_key, final_policy, total_visits)
+        if book.is_trusted(book_key):
+            final_policy = book.policy(book_key)
+            policy_from_book = True
+            logger.info(
+                "Choosing from the opening book: {} games".format(book.games(book_key))
             )
-            futures.append((fut, chance, index))
 
-    mcts_results = [(fut.result(), chance, index) for (fut, chance, index) in futures]
-    choice = select_move_from_mcts_results(mcts_results)
+    choice = select_move_from_policy(final_policy, rng)
+    search_budget.record(
+        battle, (time.time() - start_time) * 1000, searched_ms, final_policy
+    )
+    if search_stats is not None:
+        search_stats["seed"] = seed
+        search_stats["choice"] = choice
+        search_stats["fused"] = FoulPlayConfig.fused_search
+        search_stats["parallelism"] = FoulPlayConfig.parallelism
+        search_stats["stratified_sampling"] = FoulPlayConfig.stratified_sampling
+        search_stats["num_battles"] = num_battles
+        search_stats["search_time_per_battle_ms"] = search_time_per_battle
+        search_stats["refinement_ms"] = refinement_ms
+        search_stats["sample_digest"] = combined_digest(digests)
+        search_stats["total_visits"] = total_visits
+        search_stats["final_policy"] = [
+            {"move": move, "weight": round(weight, 4)} for move, weight in final_policy
+        ]
+        search_stats["timings_ms"] = {
+            k: round(v, 2) for k, v in telemetry.stages_ms.items()
+        }
+        search_stats["timings_ms"]["total"] = round((time.time() - start_time) * 1000, 2)
+        search_stats["workers"] = telemetry.workers()
+        search_stats["determinization_results"] = telemetry.determinizations
+        search_stats["transpositions"] = dict(telemetry.transpositions)
+        search_stats["determinizations"] = dict(
+            stats,
+            sample_factor=sample_factor,
+            next_sample_factor=next_sample_factor,
+        )
+        if book_key is not None:
+            search_stats["opening_book"] = {
+                "key": book_key,
+                "games": book.games(book_key),
+                "answered": False,
+                # the choice was drawn from the book's policy, not the one the search found
+                "policy_from_book": policy_from_book,
+            }
+    if profiler is not None:
+        telemetry.add_profile(profiler.stop())
+        elapsed_ms = (time.time() - start_time) * 1000
+        if should_save_profile(battle.turn, elapsed_ms):
+            profile_path = save_decision_profile(battle.battle_tag, battle.turn, telemetry.profile)
+            logger.info("Profiled decision ({}ms): {}".format(round(elapsed_ms), profile_path))
+            if search_stats is not None:
+                search_stats["profile"] = profile_path
     logger.info("Choice: {}".format(choice))
     return choice
+
+
+def replay_search(battle: Battle, search_stats: dict) -> (str, dict):
+    """
+    Re-runs a logged decision with the same seed and search plan
+    `battle` is the battle that was given to `find_best_move` and `search_stats` what it recorded
+
+    The sampled battles and the final random draw are identical to the original decision.
+    MCTS is time-bounded so visit counts, and therefore possibly the choice, can differ
+    """
+    battle = prepare_battle_for_search(battle)
+    rng = random.Random(search_stats["seed"])
+
+    mcts_results, digests = sample_and_search_battles(
+        battle,
+        search_stats["num_battles"],
+        search_stats["search_time_per_battle_ms"],
+        rng,
+    )
+    if search_stats["refinement_ms"]:
+        refinement_results, refinement_digests = sample_and_search_battles(
+            battle,
+            search_stats["parallelism"],
+            search_stats["refinement_ms"],
+            rng,
+            index_offset=len(digests),
+        )
+        mcts_results = merge_mcts_result_batches(
+            [mcts_results, refinement_results], [len(digests), len(refinement_digests)]
+        )
+        digests += refinement_digests
+
+    final_policy = aggregate_mcts_results(mcts_results)
+    choice = select_move_from_policy(final_policy, rng)
+    return choice, {
+        "sample_digest": combined_digest(digests),
+        "final_policy": final_policy,
+    }
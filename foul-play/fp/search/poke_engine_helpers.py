@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 
 import constants
 from data import pokedex
@@ -11,7 +12,6 @@ from poke_engine import (
     VolatileStatusDurations as PokeEngineVolatileStatusDurations,
     Pokemon as PokeEnginePokemon,
     Move as PokeEngineMove,
-    calculate_damage,
 )
 
 logger = logging.getLogger(__name__)
@@ -35,54 +35,73 @@ def status_to_string(status):
     raise ValueError(f"Unknown status: {status}")
 
 
-def pokemon_to_poke_engine_pkmn(pkmn: Pokemon):
+# Engine Pokemon kept by a PokemonConverter before it starts over
+MAX_CACHED_POKEMON = 4096
+
+
+# Mods are applied to the pokedex before any battle is converted
+@lru_cache(maxsize=None)
+def pokedex_base_types(pkmn_name):
+    base_types = pokedex[pkmn_name][constants.TYPES]
+    if len(base_types) == 1:
+        return base_types[0], "typeless"
+    return tuple(base_types)
+
+
+@lru_cache(maxsize=None)
+def pokedex_weight_kg(pkmn_name):
+    return float(pokedex[pkmn_name][constants.WEIGHT])
+
+
+def pokemon_to_poke_engine_kwargs(pkmn: Pokemon):
     """
+    The arguments of the engine Pokemon of `pkmn`. `pkmn` is not modified
+
     id,level,type0,type1,hp,maxhp,ability,item,atk,def,spa,spd,spe,atkb,defb,spab,spdb,speb,accb,evab,status,subhp,restturns
     nature,volatiles,m0,m1,m2,m3
     """
 
     # Gen 3/4 don't remove items if knocked off
     # but the item is not active, so lets remove it
-    if pkmn.knocked_off or pkmn.item == "" or pkmn.item is None:
-        pkmn.item = "None"
+    item = pkmn.item
+    if pkmn.knocked_off or item == "" or item is None:
+        item = "None"
 
-    base_types = pokedex[str(pkmn.name)][constants.TYPES]
-    if len(base_types) == 1:
-        base_types = (base_types[0], "typeless")
-    if len(pkmn.types) == 1:
-        pkmn.types = (pkmn.types[0], "typeless")
-    num_moves = len(pkmn.moves)
-    if num_moves > 4:
+    types = tuple(pkmn.types)
+    if len(types) == 1:
+        types = (types[0], "typeless")
+
+    moves = pkmn.moves
+    if len(moves) > 4:
         logger.warning(
             "More than 4 moves on pokemon: {} moves: {}".format(
-                pkmn.name, [m.name for m in pkmn.moves]
+                pkmn.name, [m.name for m in moves]
             )
         )
         logger.warning("Truncating moves to first 4")
-        pkmn.moves = pkmn.moves[:4]
+        moves = moves[:4]
 
     pkmn_moves = [
         PokeEngineMove(id=str(m.name), disabled=m.disabled, pp=m.current_pp)
-        for m in pkmn.moves
+        for m in moves
     ]
-    while num_moves < 4:
+    while len(pkmn_moves) < 4:
         pkmn_moves.append(PokeEngineMove(id="none", disabled=True, pp=0))
-        num_moves += 1
 
     base_ability = ""
     if pkmn.original_ability:
         base_ability = str(pkmn.original_ability)
 
-    return PokeEnginePokemon(
+    return dict(
         id=str(pkmn.name),
         level=pkmn.level,
-        types=tuple(pkmn.types),
-        base_types=tuple(base_types),
+        types=types,
+        base_types=pokedex_base_types(pkmn.name),
         hp=int(pkmn.hp),
         maxhp=int(pkmn.max_hp),
         ability=str(pkmn.ability),
         base_ability=base_ability,
-        item=str(pkmn.item),
+        item=str(item),
         nature=pkmn.nature,
         evs=tuple(pkmn.evs),
         attack=pkmn.stats[constants.ATTACK],
@@ -93,19 +112,87 @@ def pokemon_to_poke_engine_pkmn(pkmn: Pokemon):
         status=status_to_string(pkmn.status),
         rest_turns=pkmn.rest_turns,
         sleep_turns=pkmn.sleep_turns,
-        weight_kg=float(pokedex[pkmn.name][constants.WEIGHT]),
+        weight_kg=pokedex_weight_kg(pkmn.name),
         moves=pkmn_moves,
         tera_type=pkmn.tera_type or "typeless",
         terastallized=pkmn.terastallized,
     )
 
 
+def pokemon_to_poke_engine_pkmn(pkmn: Pokemon):
+    return PokeEnginePokemon(**pokemon_to_poke_engine_kwargs(pkmn))
+
+
+def pokemon_fingerprint(pkmn: Pokemon):
+    """Everything the engine Pokemon of `pkmn` is built from"""
+    return (
+        pkmn.name,
+        pkmn.level,
+        tuple(pkmn.types),
+        pkmn.hp,
+        pkmn.max_hp,
+        pkmn.ability,
+        pkmn.original_ability,
+        pkmn.item,
+        pkmn.knocked_off,
+        pkmn.nature,
+        tuple(pkmn.evs),
+        tuple(pkmn.stats.values()),
+        pkmn.status,
+        pkmn.rest_turns,
+        pkmn.sleep_turns,
+        tuple((m.name, m.disabled, m.current_pp) for m in pkmn.moves),
+        pkmn.tera_type,
+        pkmn.terastallized,
+    )
+
+
+class PokemonConverter:
+    """
+    Engine Pokemon by the value of the Pokemon they were converted from
+
+    The battles sampled for one decision are copies of the same battle: our
+    whole side and the opponent's revealed Pokemon are equal in all of them and
+    are converted once, only the sampled Pokemon are built per battle
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_POKEMON):
+        self.max_size = max_size
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pkmn: Pokemon):
+        """(engine kwargs, engine pokemon) of `pkmn`"""
+        key = pokemon_fingerprint(pkmn)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        if len(self._cache) >= self.max_size:
+            self._cache.clear()
+        kwargs = pokemon_to_poke_engine_kwargs(pkmn)
+        entry = self._cache[key] = (kwargs, PokeEnginePokemon(**kwargs))
+        return entry
+
+    def convert(self, pkmn: Pokemon):
+        return self.get(pkmn)[1]
+
+
+pokemon_converter = PokemonConverter()
+
+
 def get_dummy_poke_engine_pkmn():
     return PokeEnginePokemon(id="pikachu", level=1, hp=0)
 
 
 def battler_to_poke_engine_side(
-    battler: Battler, force_switch=False, stayed_in_on_switchout_move=False
+    battler: Battler,
+    force_switch=False,
+    stayed_in_on_switchout_move=False,
+    convert_pokemon=pokemon_to_poke_engine_pkmn,
 ):
     num_reserves = len(battler.reserve)
     last_used_move = "move:none"
@@ -159,8 +246,8 @@ def battler_to_poke_engine_side(
         active_index="0",
         baton_passing=battler.baton_passing,
         shed_tailing=battler.shed_tailing,
-        pokemon=[pokemon_to_poke_engine_pkmn(battler.active)]
-        + [pokemon_to_poke_engine_pkmn(p) for p in battler.reserve],
+        pokemon=[convert_pokemon(battler.active)]
+        + [convert_pokemon(p) for p in battler.reserve],
         side_conditions=PokeEngineSideConditions(
             aurora_veil=battler.side_conditions[constants.AURORA_VEIL],
             crafty_shield=battler.side_conditions["craftyshield"],
@@ -291,7 +378,11 @@ def replace_return_last_used_move(battler: Battler):
         )
 
 
-def battle_to_poke_engine_state(battle: Battle, swap=False):
+def prepare_last_used_moves(battle: Battle):
+    """
+    Replaces last used moves the engine can't know (hiddenpower, return) in place
+    Returns whether the opponent stayed in after our switch-out move
+    """
     # Boolean that represents if we have used a switch-out move first (i.e. fast uturn)
     # this is toggled to True if we did, and signifies to the engine that the opponent has
     # selected a move and that should be accounted for in the search
@@ -311,17 +402,11 @@ def battle_to_poke_engine_state(battle: Battle, swap=False):
     if battle.user.last_used_move.move == "return":
         replace_return_last_used_move(battle.user)
 
-    side_one = battler_to_poke_engine_side(
-        battle.user, force_switch=battle.force_switch
-    )
-    side_two = battler_to_poke_engine_side(
-        battle.opponent, stayed_in_on_switchout_move=opponent_switchout_move_stayed_in
-    )
+    return opponent_switchout_move_stayed_in
 
-    if swap:
-        side_one, side_two = side_two, side_one
 
-    state = PokeEngineState(
+def poke_engine_state(battle: Battle, side_one, side_two):
+    return PokeEngineState(
         side_one=side_one,
         side_two=side_two,
         weather=get_weather_string(battle.weather),
@@ -333,40 +418,22 @@ def battle_to_poke_engine_state(battle: Battle, swap=False):
         team_preview=battle.team_preview,
     )
 
-    return state
 
+def battle_to_poke_engine_state(battle: Battle, swap=False):
+    opponent_switchout_move_stayed_in = prepare_last_used_moves(battle)
 
-def poke_engine_get_damage_rolls(
-    battle: Battle, side_one_move, side_two_move, side_one_went_first
-):
-    if side_one_move.startswith("switch"):
-        side_one_move = "switch"
-    if side_two_move.startswith("switch"):
-        side_two_move = "switch"
-
-    state = battle_to_poke_engine_state(battle)
-
-    logger.debug(
-        "Calling calculate damage with state: {}, m1: {}, m2: {}, s1_went_first: {}".format(
-            state.to_string(),
-            side_one_move,
-            side_two_move,
-            side_one_went_first,
-        )
+    side_one = battler_to_poke_engine_side(
+        battle.user,
+        force_switch=battle.force_switch,
+        convert_pokemon=pokemon_converter.convert,
     )
-
-    s1_rolls, s2_rolls = calculate_damage(
-        state,
-        side_one_move,
-        side_two_move,
-        side_one_went_first,
+    side_two = battler_to_poke_engine_side(
+        battle.opponent,
+        stayed_in_on_switchout_move=opponent_switchout_move_stayed_in,
+        convert_pokemon=pokemon_converter.convert,
     )
 
-    logger.debug(
-        "Got Rolls s1_rolls: {}, s2_rolls: {}".format(
-            s1_rolls,
-            s2_rolls,
-        )
-    )
+    if swap:
+        side_one, side_two = side_two, side_one
 
-    return s1_rolls, s2_rolls
+    return poke_engine_state(battle, side_one, side_two)
@@ -0,0 +1,19 @@
+"""
+Choosing a move from the policy aggregated over the sampled battles
+"""
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+
+def select_move_from_policy(final_policy: list, rng=random) -> str:
+    # Consider all moves that are close to the best move
+    highest_percentage = final_policy[0][1]
+    final_policy = [i for i in final_policy if i[1] >= highest_percentage * 0.75]
+    logger.info("Considered Choices:")
+    for i, policy in enumerate(final_policy):
+        logger.info(f"\t{round(policy[1] * 100, 3)}%: {policy[0]}")
+
+    choice = rng.choices(final_policy, weights=[p[1] for p in final_policy])[0]
+    return choice[0]
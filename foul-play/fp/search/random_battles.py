@@ -6,16 +6,21 @@ from constants import BattleType
 from fp.battle import Battle, Pokemon
 from data.pkmn_sets import RandomBattleTeamDatasets, TeamDatasets
 from fp.search.helpers import populate_pkmn_from_set
-from fp.helpers import (
-    POKEMON_TYPE_INDICES,
-    is_super_effective,
-    type_effectiveness_modifier,
+from fp.search.sampling import (
+    allocate_battles,
+    alive_opponent_pkmn,
+    draw_index,
+    normalize,
+    top_joint_draws,
+    weight_samples,
 )
+from fp.speed_inference import filter_sets_by_speed
+from fp.type_chart import current_type_chart
 
 logger = logging.getLogger(__name__)
 
 
-def get_all_remaining_sets_for_revealed_pkmn(battle: Battle) -> dict:
+def get_all_remaining_sets_for_revealed_pkmn(battle: Battle, rng=random) -> dict:
     if battle.battle_type == BattleType.RANDOM_BATTLE:
         datasets = RandomBattleTeamDatasets
     elif battle.battle_type == BattleType.BATTLE_FACTORY:
@@ -31,46 +36,88 @@ def get_all_remaining_sets_for_revealed_pkmn(battle: Battle) -> dict:
 
     ret = {}
     for pkmn in revealed_pkmn:
-        sets = datasets.get_all_remaining_sets(pkmn)
-        random.shuffle(sets)
+        sets = filter_sets_by_speed(
+            pkmn, datasets.get_all_remaining_sets(pkmn), lambda s: s.pkmn_set
+        )
+        rng.shuffle(sets)
         ret[pkmn.name] = sets
 
     return ret
 
 
-def prepare_random_battles(battle: Battle, num_battles: int) -> list[(Battle, float)]:
-    revealed_pkmn_sets = get_all_remaining_sets_for_revealed_pkmn(deepcopy(battle))
+def prepare_random_battles(
+    battle: Battle, num_battles: int, rng=random, stratified: bool = False
+) -> list[(Battle, float)]:
+    revealed_pkmn_sets = get_all_remaining_sets_for_revealed_pkmn(deepcopy(battle), rng)
+    probabilities = {
+        name: normalize([s.pkmn_set.count for s in sets])
+        for name, sets in revealed_pkmn_sets.items()
+    }
+    if stratified:
+        return prepare_stratified_random_battles(
+            battle, num_battles, revealed_pkmn_sets, probabilities, rng
+        )
 
-    sampled_battles = []
+    samples = []
     for index in range(num_battles):
         logger.info("Sampling battle {}".format(index))
         battle_copy = deepcopy(battle)
 
-        active = battle_copy.opponent.active
-        if revealed_pkmn_sets[active.name]:
-            pkmn_full_set = random.choices(
-                revealed_pkmn_sets[active.name],
-                weights=[s.pkmn_set.count for s in revealed_pkmn_sets[active.name]],
-            )[0]
-            populate_pkmn_from_set(active, pkmn_full_set)
-
-        for pkmn in filter(lambda x: x.is_alive(), battle_copy.opponent.reserve):
+        likelihood = 1.0
+        draw = []
+        for pkmn in alive_opponent_pkmn(battle_copy):
             if not revealed_pkmn_sets[pkmn.name]:
                 continue
-            pkmn_full_set = random.choices(
-                revealed_pkmn_sets[pkmn.name],
-                weights=[s.pkmn_set.count for s in revealed_pkmn_sets[pkmn.name]],
-            )[0]
-            populate_pkmn_from_set(pkmn, pkmn_full_set)
+            set_index = draw_index(probabilities[pkmn.name], rng)
+            populate_pkmn_from_set(pkmn, revealed_pkmn_sets[pkmn.name][set_index])
+            likelihood *= probabilities[pkmn.name][set_index]
+            draw.append((pkmn.name, set_index))
 
-        populate_randombattle_unrevealed_pkmn(battle_copy)
+        populate_randombattle_unrevealed_pkmn(battle_copy, rng)
         battle_copy.opponent.lock_moves()
-        sampled_battles.append((battle_copy, 1 / num_battles))
+        samples.append((battle_copy, likelihood, tuple(draw)))
+
+    return weight_samples(samples)
+
+
+def prepare_stratified_random_battles(
+    battle: Battle,
+    num_battles: int,
+    revealed_pkmn_sets: dict,
+    probabilities: dict,
+    rng=random,
+) -> list[(Battle, float)]:
+    """Battles for the most probable joint draws of the opponent's revealed sets"""
+    opponent_pkmn = alive_opponent_pkmn(battle)
+    sampled = [i for i, p in enumerate(opponent_pkmn) if revealed_pkmn_sets[p.name]]
+    draws = top_joint_draws(
+        [probabilities[opponent_pkmn[i].name] for i in sampled], num_battles
+    )
+    # the unrevealed Pokemon are still sampled
+    has_unrevealed = len(battle.opponent.reserve) + 1 < 6
+    counts = allocate_battles(draws, num_battles, [not has_unrevealed] * len(draws))
+    logger.info(
+        "Stratified sampling: {} joint draws covering {}%".format(
+            len(draws), round(100 * sum(p for _, p in draws), 2)
+        )
+    )
 
-    return sampled_battles
+    samples = []
+    for (draw, probability), count in zip(draws, counts):
+        for _ in range(count):
+            battle_copy = deepcopy(battle)
+            copied_pkmn = alive_opponent_pkmn(battle_copy)
+            for i, set_index in zip(sampled, draw):
+                pkmn = copied_pkmn[i]
+                populate_pkmn_from_set(pkmn, revealed_pkmn_sets[pkmn.name][set_index])
+            populate_randombattle_unrevealed_pkmn(battle_copy, rng)
+            battle_copy.opponent.lock_moves()
+            samples.append((battle_copy, probability, draw))
 
+    return weight_samples(samples)
 
-def sample_randombattle_pokemon(existing_pokemon: list[Pokemon]) -> Pokemon:
+
+def sample_randombattle_pokemon(existing_pokemon: list[Pokemon], rng=random) -> Pokemon:
     ok = False
     existing_pokemon_names = {pkmn.name for pkmn in existing_pokemon}
 
@@ -78,10 +125,10 @@ def sample_randombattle_pokemon(existing_pokemon: list[Pokemon]) -> Pokemon:
     while not ok:
         sample_count += 1
         ok = True
-        pkmn_name, pkmn_sets = random.choice(
+        pkmn_name, pkmn_sets = rng.choice(
             list(RandomBattleTeamDatasets.pkmn_sets.items())
         )
-        pkmn_full_set = random.choice(pkmn_sets)
+        pkmn_full_set = rng.choice(pkmn_sets)
         pkmn = Pokemon(pkmn_name, pkmn_full_set.pkmn_set.level)
         if pkmn_name in existing_pokemon_names:
             ok = False
@@ -110,16 +157,10 @@ def sample_randombattle_pokemon(existing_pokemon: list[Pokemon]) -> Pokemon:
 #   more than 2 Pokemon of any given type,
 #   or more than 1 Pokemon that shares a 4x weakness
 def _more_than_3_pokemon_weak_to_a_given_typing(team: list[Pokemon]) -> bool:
-    num_pkmn_weak_to_typing = {}
-    for pkmn in team:
-        for t in POKEMON_TYPE_INDICES.keys():
-            if is_super_effective(t, pkmn.types):
-                num_pkmn_weak_to_typing[t] = num_pkmn_weak_to_typing.get(t, 0) + 1
-
-    if any(x > 3 for x in num_pkmn_weak_to_typing.values()):
-        return True
-
-    return False
+    num_pkmn_weak_to_typing = current_type_chart().count_team(
+        [pkmn.types for pkmn in team], lambda m: m > 1
+    )
+    return any(x > 3 for x in num_pkmn_weak_to_typing)
 
 
 def _more_than_2_pokemon_of_any_type(team: list[Pokemon]) -> bool:
@@ -136,20 +177,14 @@ def _more_than_2_pokemon_of_any_type(team: list[Pokemon]) -> bool:
 
 
 def _more_than_1_pokemon_with_4x_weakness(team: list[Pokemon]) -> bool:
-    num_of_each_4x_weakness = {}
-    for pkmn in team:
-        for t in POKEMON_TYPE_INDICES.keys():
-            if type_effectiveness_modifier(t, pkmn.types) == 4:
-                num_of_each_4x_weakness[t] = num_of_each_4x_weakness.get(t, 0) + 1
-
-    if any(x > 1 for x in num_of_each_4x_weakness.values()):
-        return True
-
-    return False
+    num_of_each_4x_weakness = current_type_chart().count_team(
+        [pkmn.types for pkmn in team], lambda m: m == 4
+    )
+    return any(x > 1 for x in num_of_each_4x_weakness)
 
 
 # take a Battle and fill in the unrevealed pkmn for the opponent
-def populate_randombattle_unrevealed_pkmn(battle: Battle):
+def populate_randombattle_unrevealed_pkmn(battle: Battle, rng=random):
     num_revealed_pkmn = 0
     existing_pkmn = []
     for pkmn in battle.opponent.reserve:
@@ -164,7 +199,7 @@ def populate_randombattle_unrevealed_pkmn(battle: Battle):
 
     logger.info("Sampling {} unrevealed pokemon".format(6 - num_revealed_pkmn))
     while num_revealed_pkmn < 6:
-        pkmn = sample_randombattle_pokemon(existing_pkmn)
+        pkmn = sample_randombattle_pokemon(existing_pkmn, rng)
         existing_pkmn.append(pkmn)
         battle.opponent.reserve.append(pkmn)
         num_revealed_pkmn += 1
@@ -0,0 +1,151 @@
+"""
+Weights of sampled battles
+
+Every sampled battle draws a set for each of the opponent's revealed Pokemon from
+a distribution that is known: the probability of the drawn sets is the likelihood
+of the battle. Anything else in it is sampled without a known probability: the
+movesets of sets that do not include one, the opponent's unrevealed Pokemon.
+
+Battles are weighted by the likelihood of their drawn sets normalised over the
+distinct draws, and battles with the same draw share its weight by how often each
+of them was sampled. Equal battles are searched once.
+
+Stratified sampling does not draw the sets: the most probable joint draws are
+enumerated until they cover most of the probability, and the battles left are
+spent on the draws that still sample something
+"""
+import heapq
+import logging
+
+from fp.battle import Battle, Pokemon
+
+logger = logging.getLogger(__name__)
+
+# Stratified sampling stops enumerating joint draws once they cover this probability
+STRATIFIED_COVERAGE = 0.95
+
+
+def alive_opponent_pkmn(battle: Battle) -> list[Pokemon]:
+    """The opponent's Pokemon that have sets to sample: the active one first"""
+    return [battle.opponent.active] + [p for p in battle.opponent.reserve if p.is_alive()]
+
+
+def normalize(weights: list) -> list:
+    total = sum(weights)
+    if total <= 0:
+        return [1 / len(weights)] * len(weights) if weights else []
+    return [w / total for w in weights]
+
+
+def draw_index(probabilities: list, rng) -> int:
+    return rng.choices(range(len(probabilities)), weights=probabilities)[0]
+
+
+def top_joint_draws(
+    distributions: list, max_draws: int, coverage: float = STRATIFIED_COVERAGE
+) -> list:
+    """
+    The most probable draws of one index from each of `distributions`, which are
+    independent: [(indices, probability)], best first. Stops after `max_draws`
+    draws or once they cover `coverage`
+    """
+    if not distributions:
+        return [((), 1.0)]
+
+    # best-first over index vectors into the distributions sorted by probability
+    orders = [sorted(range(len(d)), key=lambda i: -d[i]) for d in distributions]
+
+    def probability(ranks):
+        p = 1.0
+        for d, order, rank in zip(distributions, orders, ranks):
+            p *= d[order[rank]]
+        return p
+
+    start = (0,) * len(distributions)
+    heap = [(-probability(start), start)]
+    seen = {start}
+    draws = []
+    covered = 0
+    while heap and len(draws) < max_draws and covered < coverage:
+        negative_p, ranks = heapq.heappop(heap)
+        draws.append((tuple(order[r] for order, r in zip(orders, ranks)), -negative_p))
+        covered -= negative_p
+        for i in range(len(ranks)):
+            if ranks[i] + 1 < len(orders[i]):
+                successor = ranks[:i] + (ranks[i] + 1,) + ranks[i + 1 :]
+                if successor not in seen:
+                    seen.add(successor)
+                    heapq.heappush(heap, (-probability(successor), successor))
+    return draws
+
+
+def allocate_battles(draws: list, num_battles: int, determined: list) -> list:
+    """
+    How many battles to sample for each of `draws`: one for every draw and the rest in
+    proportion to the probability of the draws that are not `determined`
+    """
+    counts = [1] * len(draws)
+    remaining = num_battles - len(draws)
+    open_draws = [i for i, d in enumerate(determined) if not d]
+    open_probability = sum(draws[i][1] for i in open_draws)
+    if remaining <= 0 or not open_draws or open_probability <= 0:
+        return counts
+
+    shares = {i: remaining * draws[i][1] / open_probability for i in open_draws}
+    for i, share in shares.items():
+        counts[i] += int(share)
+    leftover = remaining - sum(int(s) for s in shares.values())
+    for i in sorted(open_draws, key=lambda i: shares[i] - int(shares[i]), reverse=True)[
+        :leftover
+    ]:
+        counts[i] += 1
+    return counts
+
+
+def _pokemon_signature(pkmn: Pokemon) -> tuple:
+    return (
+        pkmn.name,
+        pkmn.item,
+        pkmn.ability,
+        pkmn.nature,
+        tuple(pkmn.evs),
+        pkmn.tera_type,
+        tuple(sorted(m.name for m in pkmn.moves)),
+    )
+
+
+def opponent_signature(battle: Battle) -> tuple:
+    """The sampled sets of the opponent's team"""
+    opponent = battle.opponent
+    active = _pokemon_signature(opponent.active) if opponent.active is not None else None
+    return active, tuple(sorted(_pokemon_signature(p) for p in opponent.reserve))
+
+
+def weight_samples(samples: list) -> list[(Battle, float)]:
+    """
+    `samples`: [(battle, likelihood of its drawn sets, key of its drawn sets)]
+    Returns the distinct battles with their weights, which sum to 1
+    """
+    draws = {}
+    for battle, likelihood, key in samples:
+        draw = draws.setdefault(key, {"likelihood": likelihood, "count": 0, "battles": {}})
+        draw["count"] += 1
+        signature = opponent_signature(battle)
+        if signature in draw["battles"]:
+            draw["battles"][signature][1] += 1
+        else:
+            draw["battles"][signature] = [battle, 1]
+
+    weights = normalize([d["likelihood"] for d in draws.values()])
+    weighted = []
+    for draw, weight in zip(draws.values(), weights):
+        for battle, count in draw["battles"].values():
+            weighted.append((battle, weight * count / draw["count"]))
+
+    if len(weighted) < len(samples):
+        logger.info(
+            "Merged {} sampled battles into {} distinct battles".format(
+                len(samples), len(weighted)
+            )
+        )
+    return weighted
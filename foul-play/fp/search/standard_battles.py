@@ -1,5 +1,6 @@
 import logging
 import random
+from collections import namedtuple
 from copy import deepcopy
 
 import constants
@@ -9,6 +10,15 @@ from fp.search.helpers import (
 )
 from fp.helpers import natures
 from fp.battle import Pokemon, Battle, Battler
+from fp.search.sampling import (
+    allocate_battles,
+    alive_opponent_pkmn,
+    draw_index,
+    normalize,
+    top_joint_draws,
+    weight_samples,
+)
+from fp.speed_inference import filter_sets_by_speed
 from data.pkmn_sets import (
     SmogonSets,
     PokemonSet,
@@ -210,10 +220,12 @@ def get_filtered_sets(
         ):
             filtered_sets.append(pkmn_set)
 
-    return filtered_sets
+    return filter_sets_by_speed(pkmn, filtered_sets)
 
 
-def sample_pokemon_moveset_with_known_pkmn_set(pkmn: Pokemon, pkmn_set: PokemonSet):
+def sample_pokemon_moveset_with_known_pkmn_set(
+    pkmn: Pokemon, pkmn_set: PokemonSet, rng=random
+):
     pkmn_known_moves = [m.name for m in pkmn.moves]
     num_known_moves = len(pkmn_known_moves)
     if num_known_moves >= 4:
@@ -241,7 +253,7 @@ def sample_pokemon_moveset_with_known_pkmn_set(pkmn: Pokemon, pkmn_set: PokemonS
         remaining_team_movesets.append((pkmn_moveset, count))
 
     if remaining_team_movesets:
-        sampled_moveset, count = random.choices(
+        sampled_moveset, count = rng.choices(
             remaining_team_movesets, weights=[m[1] for m in remaining_team_movesets]
         )[0]
         for mv in sampled_moveset:
@@ -269,7 +281,7 @@ def sample_pokemon_moveset_with_known_pkmn_set(pkmn: Pokemon, pkmn_set: PokemonS
             break
         index = index % len(moves_adjusted_probabilities)
         mv, chance = moves_adjusted_probabilities[index]
-        if random.random() < chance:
+        if rng.random() < chance:
             pkmn_known_moves.append(mv)
             if not smogon_set_makes_sense(
                 PredictedPokemonSet(
@@ -303,71 +315,121 @@ def set_most_likely_hidden_power(pkmn: Pokemon):
                 break
 
 
-def sample_pokemon(pkmn: Pokemon):
-    if not pkmn.mega_name:
-        _sample_pokemon(pkmn)
-        return
+# A set one of the opponent's Pokemon may have and the probability of drawing it
+# Sets from "teamdatasets-partial" and "smogonsets" have their moveset sampled when used
+SetCandidate = namedtuple("SetCandidate", ["pkmn_set", "source", "probability"])
 
-    # the ability of a mega pokemon that has not yet mega-evolved
-    # needs to be sampled from its non-mega version
-    pkmn_without_mega = deepcopy(pkmn)
-    pkmn_without_mega.mega_name = None
-    _sample_pokemon(pkmn_without_mega)
-    pkmn.ability = pkmn_without_mega.ability
-    _sample_pokemon(pkmn)
 
+def pokemon_set_candidates(pkmn: Pokemon) -> list[SetCandidate]:
+    """
+    The sets `pkmn` is sampled from along with their probabilities
 
-def _sample_pokemon(pkmn: Pokemon):
-    set_most_likely_hidden_power(pkmn)
+    1: TeamDatasets is not emptied and `get_all_remaining_sets` returned at least one set
+    Note: TeamDatasets are not weighted by their counts
+    because the counts are not indicative of the actual distribution of sets
+    A quarter of the probability goes to the other sources to get some variety
+    if at least 1 move is known
 
-    # 1: TeamDatasets is not emptied and `get_all_remaining_sets` returned at least one set
-    # Note: TeamDatasets are not sampled according to their counts
-    # because the counts are not indicative of the actual distribution of sets
-    # Skip this step an amount of the time to get some variety
-    # if at least 1 move is known
-    remaining_team_sets = TeamDatasets.get_all_remaining_sets(pkmn)
-    if remaining_team_sets and (not pkmn.moves or random.random() < 0.75):
-        sampled_set = deepcopy(random.choice(remaining_team_sets))
-        populate_pkmn_from_set(pkmn, sampled_set, source="teamdatasets-full")
-        return
+    2: TeamDatasets has at least 1 set in it that hasn't been invalidated,
+    but `get_all_remaining_sets` returned no sets because the accompanying movesets are invalid
+
+    3: SmogonSets, weighted by their counts, with a moveset sampled the same way as in 2
+    """
+    candidates = []
+    full_team_share = 0
+    remaining_team_sets = filter_sets_by_speed(
+        pkmn, TeamDatasets.get_all_remaining_sets(pkmn), lambda s: s.pkmn_set
+    )
+    if remaining_team_sets:
+        full_team_share = 0.75 if pkmn.moves else 1
+        candidates += [
+            SetCandidate(s, "teamdatasets-full", full_team_share / len(remaining_team_sets))
+            for s in remaining_team_sets
+        ]
+    if full_team_share == 1:
+        return candidates
 
-    # 2: TeamDatasets has at least 1 set in it that hasn't been invalidated,
-    # but `get_all_remaining_sets` returned no sets because the accompanying movesets are invalid
     remaining_team_sets = [
         s
         for s in TeamDatasets.get_pkmn_sets_from_pkmn_name(pkmn)
         if s.pkmn_set.set_makes_sense(pkmn) and smogon_set_makes_sense(s)
     ]
+    remaining_team_sets = filter_sets_by_speed(
+        pkmn, remaining_team_sets, lambda s: s.pkmn_set
+    )
     if remaining_team_sets:
-        sampled_set = deepcopy(random.choice(remaining_team_sets).pkmn_set)
-        moves = sample_pokemon_moveset_with_known_pkmn_set(pkmn, sampled_set)
-        sampled_set = PredictedPokemonSet(
-            pkmn_set=sampled_set,
-            pkmn_moveset=PokemonMoveset(moves=moves),
-        )
-        populate_pkmn_from_set(pkmn, sampled_set, source="teamdatasets-partial")
-        return
+        share = (1 - full_team_share) / len(remaining_team_sets)
+        candidates += [
+            SetCandidate(s.pkmn_set, "teamdatasets-partial", share)
+            for s in remaining_team_sets
+        ]
+        return candidates
 
-    # 3: Try to sample from SmogonSets including moves
-    # Sample a SmogonSet and then repeat the same process as in 2 to get a moveset
     remaining_smogon_sets = SmogonSets.get_all_remaining_sets(pkmn)
     remaining_smogon_sets = get_filtered_sets(pkmn, remaining_smogon_sets)
-    if remaining_smogon_sets:
-        sampled_smogon_set = deepcopy(
-            random.choices(
-                remaining_smogon_sets,
-                weights=[s.count for s in remaining_smogon_sets],
-            )[0]
-        )
-        moves = sample_pokemon_moveset_with_known_pkmn_set(pkmn, sampled_smogon_set)
+    total_count = sum(s.count for s in remaining_smogon_sets)
+    if total_count > 0:
+        candidates += [
+            SetCandidate(s, "smogonsets", (1 - full_team_share) * s.count / total_count)
+            for s in remaining_smogon_sets
+        ]
+
+    # a source with no sets gives its share to the others
+    return [
+        c._replace(probability=p)
+        for c, p in zip(candidates, normalize([c.probability for c in candidates]))
+    ]
+
+
+def populate_pkmn_from_candidate(pkmn: Pokemon, candidate: SetCandidate, rng=random):
+    sampled_set = deepcopy(candidate.pkmn_set)
+    if candidate.source != "teamdatasets-full":
+        moves = sample_pokemon_moveset_with_known_pkmn_set(pkmn, sampled_set, rng)
         sampled_set = PredictedPokemonSet(
-            pkmn_set=sampled_smogon_set,
+            pkmn_set=sampled_set,
             pkmn_moveset=PokemonMoveset(moves=moves),
         )
-        populate_pkmn_from_set(pkmn, sampled_set, source="smogonsets")
-        return
+    populate_pkmn_from_set(pkmn, sampled_set, source=candidate.source)
 
-    logger.warning(f"Could not sample {pkmn.name}")
+
+def sample_pokemon(pkmn: Pokemon, rng=random, candidates_cache: dict = None) -> (float, tuple):
+    """
+    Returns the probability of the drawn set(s) and a key of the draw
+    `candidates_cache`: candidates of Pokemon already sampled from the same battle
+    """
+    if not pkmn.mega_name:
+        return _sample_pokemon(pkmn, rng, candidates_cache)
+
+    # the ability of a mega pokemon that has not yet mega-evolved
+    # needs to be sampled from its non-mega version
+    pkmn_without_mega = deepcopy(pkmn)
+    pkmn_without_mega.mega_name = None
+    ability_probability, ability_key = _sample_pokemon(
+        pkmn_without_mega, rng, candidates_cache
+    )
+    pkmn.ability = pkmn_without_mega.ability
+    probability, key = _sample_pokemon(pkmn, rng, candidates_cache)
+    return ability_probability * probability, (ability_key, key)
+
+
+def _sample_pokemon(pkmn: Pokemon, rng=random, candidates_cache: dict = None) -> (float, tuple):
+    set_most_likely_hidden_power(pkmn)
+
+    cache_key = (pkmn.name, pkmn.mega_name)
+    if candidates_cache is not None and cache_key in candidates_cache:
+        candidates = candidates_cache[cache_key]
+    else:
+        candidates = pokemon_set_candidates(pkmn)
+        if candidates_cache is not None:
+            candidates_cache[cache_key] = candidates
+
+    if not candidates:
+        logger.warning(f"Could not sample {pkmn.name}")
+        return 1.0, (pkmn.name, pkmn.mega_name, None)
+
+    index = draw_index([c.probability for c in candidates], rng)
+    populate_pkmn_from_candidate(pkmn, candidates[index], rng)
+    return candidates[index].probability, (pkmn.name, pkmn.mega_name, index)
 
 
 def predict_team_likelihood(revealed_pokemon, all_pkmn_counts):
@@ -379,7 +441,7 @@ def predict_team_likelihood(revealed_pokemon, all_pkmn_counts):
             continue
 
         joint_probs = []
-        for revealed in revealed_set:
+        for revealed in sorted(revealed_set):
             try:
                 co_count = all_pkmn_counts[revealed][TEAMMATES][pkmn]
             except KeyError:
@@ -397,7 +459,9 @@ def predict_team_likelihood(revealed_pokemon, all_pkmn_counts):
     return sorted_likelihoods
 
 
-def sample_standardbattle_pokemon(existing_pokemon: list[Pokemon]) -> Pokemon:
+def sample_standardbattle_pokemon(
+    existing_pokemon: list[Pokemon], rng=random
+) -> Pokemon:
     existing_pokemon_names = {pkmn.name for pkmn in existing_pokemon}
     selected_pkmn_name = ""
     ok = False
@@ -409,17 +473,17 @@ def sample_standardbattle_pokemon(existing_pokemon: list[Pokemon]) -> Pokemon:
         )
         keys = list(sample_weights.keys())[:50]
         values = list(sample_weights.values())[:50]
-        selected_pkmn_name = random.choices(keys, weights=values)[0]
+        selected_pkmn_name = rng.choices(keys, weights=values)[0]
         if selected_pkmn_name in existing_pokemon_names:
             ok = False
 
     pkmn = Pokemon(selected_pkmn_name, 100)
-    sample_pokemon(pkmn)
+    sample_pokemon(pkmn, rng)
     return pkmn
 
 
 # take a Battle and fill in the unrevealed pkmn for the opponent
-def populate_standardbattle_unrevealed_pkmn(battle: Battle):
+def populate_standardbattle_unrevealed_pkmn(battle: Battle, rng=random):
     num_revealed_pkmn = 0
     existing_pkmn = []
     for pkmn in battle.opponent.reserve:
@@ -434,13 +498,13 @@ def populate_standardbattle_unrevealed_pkmn(battle: Battle):
 
     logger.info("Sampling {} unrevealed pokemon".format(6 - num_revealed_pkmn))
     while num_revealed_pkmn < 6:
-        pkmn = sample_standardbattle_pokemon(existing_pkmn)
+        pkmn = sample_standardbattle_pokemon(existing_pkmn, rng)
         existing_pkmn.append(pkmn)
         battle.opponent.reserve.append(pkmn)
         num_revealed_pkmn += 1
 
 
-def sample_mega_evolution(battler: Battler, index: int):
+def sample_mega_evolution(battler: Battler, index: int, rng=random):
     if battler.mega_revealed():
         logger.info("Mega evolution already revealed for {}".format(battler.name))
         return
@@ -448,8 +512,8 @@ def sample_mega_evolution(battler: Battler, index: int):
     if not mega_formes:
         logger.info("No possible mega evolutions for {}".format(battler.name))
         return
-    selected_mega = random.choice(list(mega_formes.keys()))
-    mega_pkmn_name, mega_item = random.choice(mega_formes[selected_mega])
+    selected_mega = rng.choice(list(mega_formes.keys()))
+    mega_pkmn_name, mega_item = rng.choice(mega_formes[selected_mega])
 
     if battler.active.name == selected_mega:
         pkmn = battler.active
@@ -465,21 +529,77 @@ def sample_mega_evolution(battler: Battler, index: int):
     pkmn.mega_name = mega_pkmn_name
 
 
-def prepare_battles(battle: Battle, num_battles: int) -> list[(Battle, float)]:
-    sampled_battles = []
+def prepare_battles(
+    battle: Battle, num_battles: int, rng=random, stratified: bool = False
+) -> list[(Battle, float)]:
+    if stratified and not battle.mega_evolve_possible():
+        return prepare_stratified_battles(battle, num_battles, rng)
+
+    candidates_cache = {}
+    samples = []
     for index in range(num_battles):
         logger.info("Sampling battle {}".format(index))
         battle_copy = deepcopy(battle)
         if battle_copy.mega_evolve_possible():
-            sample_mega_evolution(battle_copy.opponent, index)
+            sample_mega_evolution(battle_copy.opponent, index, rng)
 
-        sample_pokemon(battle_copy.opponent.active)
+        likelihood, key = sample_pokemon(battle_copy.opponent.active, rng, candidates_cache)
+        keys = [key]
         for pkmn in filter(lambda x: x.is_alive(), battle_copy.opponent.reserve):
-            sample_pokemon(pkmn)
+            probability, key = sample_pokemon(pkmn, rng, candidates_cache)
+            likelihood *= probability
+            keys.append(key)
 
         if battle.generation in constants.NO_TEAM_PREVIEW_GENS:
-            populate_standardbattle_unrevealed_pkmn(battle_copy)
+            populate_standardbattle_unrevealed_pkmn(battle_copy, rng)
         battle_copy.opponent.lock_moves()
-        sampled_battles.append((battle_copy, 1 / num_battles))
+        samples.append((battle_copy, likelihood, tuple(keys)))
+
+    return weight_samples(samples)
+
+
+def prepare_stratified_battles(
+    battle: Battle, num_battles: int, rng=random
+) -> list[(Battle, float)]:
+    """Battles for the most probable joint draws of the opponent's sets"""
+    template = deepcopy(battle)
+    opponent_pkmn = alive_opponent_pkmn(template)
+    for pkmn in opponent_pkmn:
+        set_most_likely_hidden_power(pkmn)
+    candidates = [pokemon_set_candidates(pkmn) for pkmn in opponent_pkmn]
+    sampled = [i for i, c in enumerate(candidates) if c]
+
+    draws = top_joint_draws(
+        [[c.probability for c in candidates[i]] for i in sampled], num_battles
+    )
+    has_unrevealed = battle.generation in constants.NO_TEAM_PREVIEW_GENS and (
+        len(opponent_pkmn) < 6
+    )
+    determined = [
+        not has_unrevealed
+        and all(
+            candidates[i][index].source == "teamdatasets-full"
+            for i, index in zip(sampled, draw)
+        )
+        for draw, _ in draws
+    ]
+    counts = allocate_battles(draws, num_battles, determined)
+    logger.info(
+        "Stratified sampling: {} joint draws covering {}%".format(
+            len(draws), round(100 * sum(p for _, p in draws), 2)
+        )
+    )
 
-    return sampled_battles
+    samples = []
+    for (draw, probability), count in zip(draws, counts):
+        for _ in range(count):
+            battle_copy = deepcopy(template)
+            copied_pkmn = alive_opponent_pkmn(battle_copy)
+            for i, index in zip(sampled, draw):
+                populate_pkmn_from_candidate(copied_pkmn[i], candidates[i][index], rng)
+            if has_unrevealed:
+                populate_standardbattle_unrevealed_pkmn(battle_copy, rng)
+            battle_copy.opponent.lock_moves()
+            samples.append((battle_copy, probability, draw))
+
+    return weight_samples(samples)
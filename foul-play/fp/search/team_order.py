@@ -0,0 +1,84 @@
+"""
+Team preview orders from the weight of each of our Pokemon as a lead
+
+The weights are kept across battles by `team_preview_key`: meeting the same team
+again is the same decision
+"""
+import random
+from collections import OrderedDict
+
+import constants
+from fp.battle import Battle
+from fp.search.policy import select_move_from_policy
+
+# Team preview searches kept across battles
+MAX_CACHED_TEAM_PREVIEWS = 1024
+
+
+def team_preview_key(battle: Battle) -> tuple:
+    """(format, our team, the opponent's species): what a team preview decision depends on"""
+    own_team = tuple(
+        sorted(
+            (p.name, p.item, p.ability, tuple(sorted(m.name for m in p.moves)))
+            for p in battle.user.reserve
+        )
+    )
+    opponent_species = tuple(sorted(p.name for p in battle.opponent.reserve))
+    return battle.pokemon_format, own_team, opponent_species
+
+
+class TeamPreviewCache:
+    """The weight of each of our Pokemon as a lead, per `team_preview_key`"""
+
+    def __init__(self, max_size: int = MAX_CACHED_TEAM_PREVIEWS):
+        self.max_size = max_size
+        self._weights = OrderedDict()
+
+    def get(self, key):
+        weights = self._weights.get(key)
+        if weights is not None:
+            self._weights.move_to_end(key)
+        return weights
+
+    def put(self, key, weights):
+        self._weights[key] = weights
+        self._weights.move_to_end(key)
+        if len(self._weights) > self.max_size:
+            self._weights.popitem(last=False)
+
+    def clear(self):
+        self._weights.clear()
+
+
+team_preview_cache = TeamPreviewCache()
+
+
+def lead_weights(final_policy: list, first_pkmn_name: str) -> list:
+    """
+    [(pkmn_name, weight)] from the aggregated policy of a team preview search
+    The search leads with the first Pokemon: any other choice means keeping it in front
+    """
+    weights = {}
+    for move_choice, weight in final_policy:
+        if move_choice.startswith(constants.SWITCH_STRING + " "):
+            pkmn_name = move_choice.split(" ", 1)[1]
+        else:
+            pkmn_name = first_pkmn_name
+        weights[pkmn_name] = weights.get(pkmn_name, 0) + weight
+    return sorted(weights.items(), key=lambda x: x[1], reverse=True)
+
+
+def order_team(pkmn_names: list, weights: list, rng=random) -> list:
+    """
+    `pkmn_names` ordered for team preview: a lead drawn from the best weighted
+    Pokemon followed by the rest of the team by weight
+    """
+    weights = [(name, weight) for name, weight in weights if name in pkmn_names]
+    weight_by_name = dict(weights)
+    lead = select_move_from_policy(weights, rng) if weights else pkmn_names[0]
+    # ties and unsearched Pokemon keep the team's order
+    rest = sorted(
+        (name for name in pkmn_names if name != lead),
+        key=lambda name: -weight_by_name.get(name, 0),
+    )
+    return [lead] + rest
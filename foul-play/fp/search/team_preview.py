@@ -0,0 +1,146 @@
+"""
+Team preview decisions
+
+Both sides pick their lead at the same time at team preview: the engine's team
+preview state searches every pair of leads, ours against each of the opponent's
+revealed Pokemon. The observed battle is sampled once and every determinization is
+searched in one batch, without the per-turn budget controllers or a refinement
+search, and the weight of every switch orders the whole team rather than only
+picking the lead.
+
+The opponent only reveals species at team preview, so meeting the same team again
+is the same decision: the weights are kept per format, our team and the opponent's
+species across battles. Only the lead is drawn again from them
+"""
+import logging
+import random
+import time
+
+import constants
+from config import FoulPlayConfig
+from fp.battle import Battle
+from fp.search.main import (
+    SearchTelemetry,
+    aggregate_mcts_results,
+    combined_digest,
+    new_search_seed,
+    prepare_battle_for_search,
+    sample_and_search_battles,
+    search_time_num_battles,
+)
+from fp.search.team_order import (
+    lead_weights,
+    order_team,
+    team_preview_cache,
+    team_preview_key,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _record_search_plan(search_stats, num_battles, search_time_per_battle, digests):
+    search_stats["fused"] = FoulPlayConfig.fused_search
+    search_stats["parallelism"] = FoulPlayConfig.parallelism
+    search_stats["stratified_sampling"] = FoulPlayConfig.stratified_sampling
+    search_stats["num_battles"] = num_battles
+    search_stats["search_time_per_battle_ms"] = search_time_per_battle
+    search_stats["refinement_ms"] = 0
+    search_stats["sample_digest"] = combined_digest(digests)
+
+
+def search_lead_weights(
+    battle: Battle, rng: random.Random, search_stats: dict
+) -> list:
+    start_time = time.time()
+    telemetry = SearchTelemetry()
+    search_battle = prepare_battle_for_search(battle)
+    telemetry.add_stage("deepcopy", (time.time() - start_time) * 1000)
+
+    num_battles, search_time_per_battle = search_time_num_battles(search_battle)
+    logger.info(
+        "Searching team preview: {} battles at {}ms each".format(
+            num_battles, search_time_per_battle
+        )
+    )
+    mcts_results, digests = sample_and_search_battles(
+        search_battle, num_battles, search_time_per_battle, rng, telemetry=telemetry
+    )
+
+    aggregation_start_time = time.time()
+    final_policy = aggregate_mcts_results(mcts_results)
+    weights = lead_weights(final_policy, search_battle.user.active.name)
+    telemetry.add_stage("aggregation", (time.time() - aggregation_start_time) * 1000)
+
+    _record_search_plan(search_stats, num_battles, search_time_per_battle, digests)
+    search_stats["total_visits"] = sum(r.total_visits for r, _, _ in mcts_results)
+    search_stats["timings_ms"] = {k: round(v, 2) for k, v in telemetry.stages_ms.items()}
+    search_stats["workers"] = telemetry.workers()
+    search_stats["determinization_results"] = telemetry.determinizations
+    return weights
+
+
+def team_choice(team_order: list) -> str:
+    return "team {}".format(",".join(team_order))
+
+
+def find_team_order(battle: Battle, search_stats: dict = None, seed: int = None) -> list:
+    """
+    Our Pokemon's names in the order to send at team preview, lead first
+    `battle` is at team preview: both teams are in reserve
+    `search_stats`: if given, filled with statistics about the search for the decision log
+    """
+    start_time = time.time()
+    if search_stats is None:
+        search_stats = {}
+    if seed is None:
+        seed = new_search_seed()
+    rng = random.Random(seed)
+
+    key = team_preview_key(battle)
+    weights = team_preview_cache.get(key)
+    cached = weights is not None
+    if cached:
+        logger.info("Team preview against {} is cached".format(", ".join(key[2])))
+        # nothing is searched, so there is nothing to replay either
+        _record_search_plan(search_stats, 0, 0, [])
+        search_stats["total_visits"] = 0
+    else:
+        weights = search_lead_weights(battle, rng, search_stats)
+        team_preview_cache.put(key, weights)
+
+    team_order = order_team([p.name for p in battle.user.reserve], weights, rng)
+    search_stats["seed"] = seed
+    search_stats["cached"] = cached
+    search_stats["choice"] = team_choice(team_order)
+    search_stats["final_policy"] = [
+        {"move": "{} {}".format(constants.SWITCH_STRING, name), "weight": round(weight, 4)}
+        for name, weight in weights
+    ]
+    search_stats.setdefault("timings_ms", {})["total"] = round(
+        (time.time() - start_time) * 1000, 2
+    )
+    logger.info("Team order: {}".format(team_order))
+    return team_order
+
+
+def replay_team_preview(battle: Battle, search_stats: dict) -> (str, dict):
+    """
+    `replay_search` for a team preview decision that was searched: the team order is
+    drawn again from the weights of the same sampled battles, without the cache
+    """
+    search_battle = prepare_battle_for_search(battle)
+    rng = random.Random(search_stats["seed"])
+
+    mcts_results, digests = sample_and_search_battles(
+        search_battle,
+        search_stats["num_battles"],
+        search_stats["search_time_per_battle_ms"],
+        rng,
+    )
+    final_policy = aggregate_mcts_results(mcts_results)
+    weights = lead_weights(final_policy, search_battle.user.active.name)
+    team_order = order_team([p.name for p in battle.user.reserve], weights, rng)
+    return team_choice(team_order), {
+        "sample_digest": combined_digest(digests),
+        "final_policy": final_policy,
+    }
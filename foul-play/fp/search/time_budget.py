@@ -0,0 +1,236 @@
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds of the Showdown time bank that are never spent on searching
+TIME_BANK_RESERVE_SECONDS = 20
+
+# Seconds before the timer of the current turn runs out that are never spent on searching
+TURN_TIME_RESERVE_SECONDS = 10
+
+# Never plan to spend more than this fraction of the remaining bank on one decision
+MAX_BANK_FRACTION_PER_TURN = 0.15
+
+# Rough number of turns left per pokemon that is still alive on either side
+TURNS_PER_ALIVE_POKEMON = 2.0
+MIN_ESTIMATED_TURNS_REMAINING = 4
+
+MIN_SEARCH_TIME_MS = 20
+
+# Time spent outside of the MCTS searches (sampling, conversion, process pool startup)
+# before anything has been measured. Replaced by the value measured in the format's first decision
+DEFAULT_OVERHEAD_MS = 250
+OVERHEAD_SMOOTHING = 0.3
+
+# Multipliers applied to the configured search time
+LEAD_CHOICE_MULTIPLIER = 1.5
+OBVIOUS_TURN_MULTIPLIER = 0.5
+REPEATED_DOMINANT_TURN_MULTIPLIER = 0.75
+
+# A policy is "close" when the runner-up has at least this fraction of the best move's weight
+CLOSE_POLICY_RATIO = 0.8
+# A policy is "dominant" when the best move has at least this share of the total weight
+DOMINANT_POLICY_SHARE = 0.9
+# Fraction of determinizations whose best move differs from the consensus
+HIGH_DISAGREEMENT_FRACTION = 0.5
+
+
+class BattleBudgetState:
+    def __init__(self):
+        self.decisions = 0
+        self.last_matchup = None
+        self.last_policy_dominant = False
+
+
+class SearchBudgetManager:
+    """
+    Decides how much wall-clock time a decision may use
+
+    The configured search time is scaled up for critical turns (choosing a lead,
+    close root values, determinizations that disagree) and down for obvious turns.
+    When the Showdown timer is known the per-turn spend is capped so that the
+    remaining time bank lasts for the estimated remaining turns.
+    The overhead of a decision, measured per format, is subtracted from every plan
+    A `frozen` budget keeps the configured search time and never refines, for benchmarks
+    """
+
+    def __init__(self):
+        # by format: the battles of other formats sample and convert differently
+        self.overhead_ms = {}
+        self.battles = {}
+        self.frozen = False
+
+    def _get_state(self, battle):
+        if battle.battle_tag not in self.battles:
+            self.battles[battle.battle_tag] = BattleBudgetState()
+        return self.battles[battle.battle_tag]
+
+    def forget(self, battle_tag):
+        self.battles.pop(battle_tag, None)
+
+    def get_overhead_ms(self, battle):
+        return self.overhead_ms.get(battle.pokemon_format, DEFAULT_OVERHEAD_MS)
+
+    @staticmethod
+    def estimate_turns_remaining(battle):
+        user_alive = sum(
+            1 for p in [battle.user.active] + battle.user.reserve if p.is_alive()
+        )
+        # unrevealed opponent pokemon are not in the reserve so count fainted ones instead
+        opponent_alive = 6 - battle.opponent.num_fainted_pkmn()
+        return max(
+            MIN_ESTIMATED_TURNS_REMAINING,
+            int(TURNS_PER_ALIVE_POKEMON * (user_alive + opponent_alive) / 2),
+        )
+
+    def time_bank_allowance_ms(self, battle):
+        """
+        The most that can be spent on this decision without risking the time bank
+        The total bank is spread over the remaining turns and the time left this turn is a hard ceiling
+        None if the battle is not timed
+        """
+        allowance_ms = None
+        if battle.time_remaining is not None:
+            spendable_ms = max(0, battle.time_remaining - TIME_BANK_RESERVE_SECONDS) * 1000
+            per_turn_ms = spendable_ms / self.estimate_turns_remaining(battle)
+            allowance_ms = min(per_turn_ms, spendable_ms * MAX_BANK_FRACTION_PER_TURN)
+
+        if battle.turn_time_remaining is not None:
+            turn_ms = max(0, battle.turn_time_remaining - TURN_TIME_RESERVE_SECONDS) * 1000
+            allowance_ms = turn_ms if allowance_ms is None else min(allowance_ms, turn_ms)
+        return allowance_ms
+
+    @staticmethod
+    def num_user_options(battle):
+        alive_reserves = sum(1 for p in battle.user.reserve if p.is_alive())
+        if battle.force_switch:
+            return alive_reserves
+
+        usable_moves = sum(1 for m in battle.user.active.moves if not m.disabled)
+        if battle.user.trapped:
+            return usable_moves
+        return usable_moves + alive_reserves
+
+    def criticality_multiplier(self, battle):
+        if battle.team_preview or not battle.turn or battle.turn <= 1:
+            return LEAD_CHOICE_MULTIPLIER
+
+        if self.num_user_options(battle) <= 1:
+            return OBVIOUS_TURN_MULTIPLIER
+
+        state = self._get_state(battle)
+        if state.last_policy_dominant and state.last_matchup == _matchup(battle):
+            return REPEATED_DOMINANT_TURN_MULTIPLIER
+
+        return 1
+
+    def allocate(self, battle, num_battles, search_time_ms, parallelism):
+        """
+        Returns the (num_battles, search_time_ms) that fits this turn's budget
+        `num_battles` and `search_time_ms` are what the search would like to use
+        """
+        if self.frozen:
+            return num_battles, search_time_ms
+
+        rounds = math.ceil(num_battles / parallelism)
+        overhead_ms = self.get_overhead_ms(battle)
+        multiplier = self.criticality_multiplier(battle)
+        budget_ms = rounds * search_time_ms * multiplier + overhead_ms
+
+        allowance_ms = self.time_bank_allowance_ms(battle)
+        if allowance_ms is not None:
+            budget_ms = min(budget_ms, allowance_ms)
+
+        new_search_time_ms = int((budget_ms - overhead_ms) / rounds)
+
+        # Too little time to search every battle: fewer battles deeper is better than many shallow ones
+        if new_search_time_ms < MIN_SEARCH_TIME_MS and rounds > 1:
+            rounds = 1
+            num_battles = min(num_battles, parallelism)
+            new_search_time_ms = int(budget_ms - overhead_ms)
+
+        new_search_time_ms = max(MIN_SEARCH_TIME_MS, new_search_time_ms)
+        if (
+            allowance_ms is not None
+            and rounds * new_search_time_ms + overhead_ms > allowance_ms
+        ):
+            # the bank is nearly empty: one round of whatever is left of it
+            num_battles = min(num_battles, parallelism)
+            new_search_time_ms = max(
+                1, min(new_search_time_ms, int(allowance_ms - overhead_ms))
+            )
+        logger.info(
+            "Search budget: {}ms (multiplier={} overhead={}ms time_remaining={}s turn={}s)".format(
+                round(budget_ms),
+                multiplier,
+                round(overhead_ms),
+                battle.time_remaining,
+                battle.turn_time_remaining,
+            )
+        )
+        return num_battles, new_search_time_ms
+
+    def refinement_time_ms(
+        self, battle, final_policy, disagreement, spent_ms, search_time_ms
+    ):
+        """
+        Extra search time for a second round of searches when the first round was inconclusive
+        `final_policy` is the aggregated policy sorted from best to worst
+        Returns 0 if no refinement should be done
+        """
+        if self.frozen or len(final_policy) < 2:
+            return 0
+
+        best_weight = final_policy[0][1]
+        runner_up_weight = final_policy[1][1]
+        is_close = runner_up_weight >= best_weight * CLOSE_POLICY_RATIO
+        is_high_variance = disagreement >= HIGH_DISAGREEMENT_FRACTION
+        if not (is_close or is_high_variance):
+            return 0
+
+        refinement_ms = search_time_ms
+        allowance_ms = self.time_bank_allowance_ms(battle)
+        if allowance_ms is not None:
+            refinement_ms = min(
+                refinement_ms, allowance_ms - spent_ms - self.get_overhead_ms(battle)
+            )
+
+        if refinement_ms < MIN_SEARCH_TIME_MS:
+            return 0
+
+        logger.info(
+            "Refining search for {}ms (close={} disagreement={})".format(
+                int(refinement_ms), is_close, round(disagreement, 3)
+            )
+        )
+        return int(refinement_ms)
+
+    def record(self, battle, elapsed_ms, searched_ms, final_policy):
+        """
+        Record a finished decision
+        `elapsed_ms` is the wall time of the decision, `searched_ms` the part of it spent in MCTS
+        """
+        overhead_ms = max(0, elapsed_ms - searched_ms)
+        previous_ms = self.overhead_ms.get(battle.pokemon_format)
+        if previous_ms is not None:
+            overhead_ms = (
+                OVERHEAD_SMOOTHING * overhead_ms + (1 - OVERHEAD_SMOOTHING) * previous_ms
+            )
+        self.overhead_ms[battle.pokemon_format] = overhead_ms
+
+        state = self._get_state(battle)
+        state.decisions += 1
+        state.last_matchup = _matchup(battle)
+        total_weight = sum(p[1] for p in final_policy)
+        state.last_policy_dominant = (
+            total_weight > 0 and final_policy[0][1] / total_weight >= DOMINANT_POLICY_SHARE
+        )
+
+
+def _matchup(battle):
+    return battle.user.active.name, battle.opponent.active.name
+
+
+search_budget = SearchBudgetManager()
@@ -0,0 +1,96 @@
+"""
+Transpositions of searched states
+
+The same engine state comes up more than once: two sampled battles that drew the
+same sets in one decision, or a position that did not change between turns after
+a failed move or a switch cycle. States are keyed by the digest of their
+serialized string. Duplicates within one batch are searched once with their sample
+chances summed, and the root statistics of every search are kept so a later batch
+reuses them instead of searching again
+"""
+import logging
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = 4096
+MAX_BYTES = 32 * 1024 * 1024
+
+# Rough memory used by an entry and by each of its root options
+ENTRY_BYTES = 256
+OPTION_BYTES = 160
+
+# The root statistics of a search, shaped like the engine's MctsResult
+RootOption = namedtuple("RootOption", ["move_choice", "total_score", "visits"])
+RootStats = namedtuple("RootStats", ["side_one", "total_visits"])
+
+CachedSearch = namedtuple("CachedSearch", ["root_stats", "search_time_ms", "size"])
+
+
+def root_stats(mcts_result) -> RootStats:
+    return RootStats(
+        side_one=tuple(
+            RootOption(o.move_choice, o.total_score, o.visits) for o in mcts_result.side_one
+        ),
+        total_visits=mcts_result.total_visits,
+    )
+
+
+def merge_duplicate_states(states: list) -> (list, int):
+    """
+    `states`: [(digest, state, chance, index)]
+    Returns the distinct states, each with the summed chance of its duplicates and the
+    index of its first occurrence, along with how many duplicates were merged
+    """
+    merged = OrderedDict()
+    for digest, state, chance, index in states:
+        if digest in merged:
+            merged[digest][2] += chance
+        else:
+            merged[digest] = [digest, state, chance, index]
+    return [tuple(s) for s in merged.values()], len(states) - len(merged)
+
+
+class TranspositionTable:
+    """Root statistics of searched states by digest, least recently used first out"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, digest, search_time_ms: int):
+        """The root statistics of `digest` if it was searched for at least `search_time_ms`"""
+        entry = self._entries.get(digest)
+        if entry is None or entry.search_time_ms < search_time_ms:
+            return None
+        self._entries.move_to_end(digest)
+        return entry.root_stats
+
+    def put(self, digest, mcts_result, search_time_ms: int):
+        stats = root_stats(mcts_result)
+        previous = self._entries.pop(digest, None)
+        if previous is not None:
+            self.size_bytes -= previous.size
+            if previous.search_time_ms > search_time_ms:
+                stats, search_time_ms = previous.root_stats, previous.search_time_ms
+
+        size = ENTRY_BYTES + OPTION_BYTES * len(stats.side_one)
+        self._entries[digest] = CachedSearch(stats, search_time_ms, size)
+        self.size_bytes += size
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= evicted.size
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+
+transposition_table = TranspositionTable()
@@ -0,0 +1,154 @@
+"""
+Speed inference from turn order
+
+When both active Pokemon use moves of the same priority, the one that moved first
+is the faster one (the slower one under trickroom). Dividing our effective speed by
+everything the opponent's speed is known to be multiplied by bounds the opponent's
+speed stat with its held item: `Pokemon.speed_range`. Sets outside of that range
+are dropped before sampling.
+
+Speeds are compared as they were at the start of the turn: the first mover's move
+can change its own speed (Hammer Arm, Spin Out) before the second one moves.
+
+The speed of a set only depends on the species, level, nature, speed EVs and item.
+Speeds are kept in a table per species and level, so checking a set against the
+range is a lookup
+"""
+import logging
+import math
+
+import constants
+from data import pokedex
+from fp.battle import Battle, Pokemon, StatRange
+from fp.helpers import calculate_stats
+
+logger = logging.getLogger(__name__)
+
+# Held items that multiply the speed stat
+ITEM_SPEED_MULTIPLIERS = {
+    "choicescarf": 1.5,
+    "ironball": 0.5,
+    "machobrace": 0.5,
+    "poweranklet": 0.5,
+    "powerband": 0.5,
+    "powerbelt": 0.5,
+    "powerbracer": 0.5,
+    "powerlens": 0.5,
+    "powerweight": 0.5,
+}
+
+# (pkmn_name, level) -> {(nature, speed_ev, item): speed}
+_speed_tables = {}
+
+
+def set_speed(pkmn_name, level, nature, evs, item) -> int:
+    """The speed stat of a set multiplied by its item"""
+    table = _speed_tables.get((pkmn_name, level))
+    if table is None:
+        table = _speed_tables[(pkmn_name, level)] = {}
+
+    key = (nature, evs[5], item)
+    speed = table.get(key)
+    if speed is None:
+        stats = calculate_stats(
+            pokedex[pkmn_name][constants.BASESTATS],
+            level,
+            evs=(0, 0, 0, 0, 0, evs[5]),
+            nature=nature,
+        )
+        speed = table[key] = int(
+            stats[constants.SPEED] * ITEM_SPEED_MULTIPLIERS.get(item, 1)
+        )
+    return speed
+
+
+def speed_range_is_known(pkmn: Pokemon) -> bool:
+    return pkmn.speed_range.min > 0 or pkmn.speed_range.max != float("inf")
+
+
+def set_speed_is_possible(pkmn: Pokemon, pkmn_set) -> bool:
+    """Whether `pkmn` with `pkmn_set` has a speed within its inferred speed range"""
+    if not speed_range_is_known(pkmn):
+        return True
+    speed = set_speed(pkmn.name, pkmn.level, pkmn_set.nature, pkmn_set.evs, pkmn_set.item)
+    return pkmn.speed_range.min <= speed <= pkmn.speed_range.max
+
+
+def filter_sets_by_speed(pkmn: Pokemon, sets: list, pkmn_set=lambda s: s) -> list:
+    """
+    The sets whose speed is within the speed range of `pkmn`
+    All of them if none is: the range came from a speed modifier that was not seen
+    """
+    if not speed_range_is_known(pkmn):
+        return sets
+    possible_sets = [s for s in sets if set_speed_is_possible(pkmn, pkmn_set(s))]
+    if not possible_sets and sets:
+        logger.warning(
+            "No set of {} has a speed within {}: not filtering by speed".format(
+                pkmn.name, pkmn.speed_range
+            )
+        )
+        return sets
+    return possible_sets
+
+
+def record_turn_start_speeds(battle: Battle):
+    """Keeps the speeds of both actives before anything this turn changes them"""
+    if battle.user.active is None or battle.opponent.active is None:
+        battle.turn_start_speeds = None
+        return
+    battle.turn_start_speeds = (
+        battle.turn,
+        battle.user.active.name,
+        battle.opponent.active.name,
+        battle.get_effective_speed(battle.user),
+        battle.get_speed_multiplier(battle.opponent, include_item=False),
+    )
+
+
+def _turn_start_speeds(battle: Battle) -> (int, float):
+    """Our effective speed and the opponent's speed multiplier without its item"""
+    recorded = battle.turn_start_speeds
+    if recorded is not None and recorded[:3] == (
+        battle.turn,
+        battle.user.active.name,
+        battle.opponent.active.name,
+    ):
+        return recorded[3], recorded[4]
+    return (
+        battle.get_effective_speed(battle.user),
+        battle.get_speed_multiplier(battle.opponent, include_item=False),
+    )
+
+
+def update_speed_range(battle: Battle, opponent_moved_first: bool):
+    """Narrows the speed range of the opponent's active after both actives moved"""
+    opponent = battle.opponent.active
+    our_speed, multiplier = _turn_start_speeds(battle)
+    if multiplier <= 0:
+        return
+
+    opponent_is_faster = opponent_moved_first != battle.trick_room
+    speed_range = opponent.speed_range
+    # speed ties go either way: the bounds include our speed
+    if opponent_is_faster:
+        new_range = StatRange(
+            min=max(speed_range.min, math.floor(our_speed / multiplier)),
+            max=speed_range.max,
+        )
+    else:
+        new_range = StatRange(
+            min=speed_range.min,
+            max=min(speed_range.max, math.ceil((our_speed + 1) / multiplier)),
+        )
+
+    if new_range.min > new_range.max:
+        logger.warning(
+            "Turn order contradicts the speed range {} of {}: ignoring it".format(
+                speed_range, opponent.name
+            )
+        )
+        return
+    if new_range != speed_range:
+        logger.info("Speed range of {}: {}".format(opponent.name, new_range))
+        opponent.speed_range = new_range
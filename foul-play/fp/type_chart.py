@@ -0,0 +1,145 @@
+"""
+Type effectiveness tables
+
+A TypeChart precomputes the multiplier of every attacking type against every
+typing: a 19x19x19 array indexed by [attacking][first type][second type], with
+mono-typed Pokemon as (type, "typeless"). The row of multipliers against a typing is
+cached, and a whole team is looked up in one array operation.
+
+Charts are built per generation from the cells that changed between generations,
+so any generation can be used without mutating DAMAGE_MULTIPICATION_ARRAY, which
+`apply_mods` changes for the format being played.
+
+NumPy is optional: without it the tables are nested lists and team queries loop
+"""
+from functools import lru_cache
+
+from config import FoulPlayConfig
+from fp.helpers import DAMAGE_MULTIPICATION_ARRAY, POKEMON_TYPE_INDICES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUM_TYPES = 19
+TYPELESS = POKEMON_TYPE_INDICES["typeless"]
+
+# The cells of the chart that changed between generations: (attacking, defending) -> multiplier
+CURRENT_CHART_CELLS = {
+    ("ice", "fire"): 0.5,
+    ("ghost", "psychic"): 2,
+    ("poison", "bug"): 1,
+    ("bug", "poison"): 0.5,
+    ("ghost", "steel"): 1,
+    ("dark", "steel"): 1,
+}
+GEN_2_TO_5_CHART_CELLS = {
+    ("ghost", "steel"): 0.5,
+    ("dark", "steel"): 0.5,
+}
+GEN_1_CHART_CELLS = {
+    ("ice", "fire"): 1,
+    ("ghost", "psychic"): 0,
+    ("poison", "bug"): 2,
+    ("bug", "poison"): 2,
+}
+
+
+def _typing(defending_types):
+    """(first, second) type indices of a typing, or None if it has more than two types"""
+    if len(defending_types) == 1:
+        return POKEMON_TYPE_INDICES[defending_types[0]], TYPELESS
+    if len(defending_types) == 2:
+        return (
+            POKEMON_TYPE_INDICES[defending_types[0]],
+            POKEMON_TYPE_INDICES[defending_types[1]],
+        )
+    return None
+
+
+class TypeChart:
+    def __init__(self, multipliers):
+        # multipliers[attacking][defending]
+        self.multipliers = [list(row) for row in multipliers]
+        # single lookups index nested lists, which is faster than indexing an array
+        self.cells = [
+            [
+                [
+                    row[first] if first == second else row[first] * row[second]
+                    for second in range(NUM_TYPES)
+                ]
+                for first in range(NUM_TYPES)
+            ]
+            for row in self.multipliers
+        ]
+        self.table = np.array(self.cells) if np is not None else None
+        self._rows = {}
+
+    def _multiplier(self, attacking, defending_types):
+        typing = _typing(defending_types)
+        if typing is None:
+            modifier = 1
+            for pkmn_type in defending_types:
+                modifier *= self.multipliers[attacking][POKEMON_TYPE_INDICES[pkmn_type]]
+            return modifier
+        return self.cells[attacking][typing[0]][typing[1]]
+
+    def effectiveness(self, attacking_type, defending_types):
+        return self._multiplier(POKEMON_TYPE_INDICES[attacking_type], defending_types)
+
+    def row(self, defending_types):
+        """The multipliers of every attacking type against `defending_types`, by type index"""
+        key = tuple(defending_types)
+        row = self._rows.get(key)
+        if row is None:
+            row = [self._multiplier(a, key) for a in range(NUM_TYPES)]
+            if np is not None:
+                row = np.array(row)
+            self._rows[key] = row
+        return row
+
+    def team(self, typings):
+        """The multipliers of every attacking type against every typing of a team: [pokemon][type]"""
+        if np is None:
+            return [self.row(t) for t in typings]
+        indices = [_typing(t) for t in typings]
+        if not indices or any(i is None for i in indices):
+            return np.array([self.row(t) for t in typings]).reshape(-1, NUM_TYPES)
+        first, second = zip(*indices)
+        return self.table[:, list(first), list(second)].T
+
+    def count_team(self, typings, predicate):
+        """How many Pokemon of a team each attacking type hits with a multiplier satisfying `predicate`"""
+        multipliers = self.team(typings)
+        if np is not None:
+            return predicate(multipliers).sum(axis=0).tolist()
+        return [
+            sum(1 for row in multipliers if predicate(row[attacking]))
+            for attacking in range(NUM_TYPES)
+        ]
+
+
+def _chart_cells(generation):
+    cells = dict(CURRENT_CHART_CELLS)
+    gen_number = int(generation[3:]) if generation[3:].isdigit() else None
+    if gen_number is not None and gen_number <= 5:
+        cells.update(GEN_2_TO_5_CHART_CELLS)
+    if gen_number == 1:
+        cells.update(GEN_1_CHART_CELLS)
+    return cells
+
+
+@lru_cache(maxsize=None)
+def type_chart(generation: str = "gen9") -> TypeChart:
+    multipliers = [list(row) for row in DAMAGE_MULTIPICATION_ARRAY]
+    for (attacking, defending), multiplier in _chart_cells(generation).items():
+        multipliers[POKEMON_TYPE_INDICES[attacking]][
+            POKEMON_TYPE_INDICES[defending]
+        ] = multiplier
+    return TypeChart(multipliers)
+
+
+def current_type_chart() -> TypeChart:
+    """The chart of the generation of the format being played"""
+    return type_chart(FoulPlayConfig.pokemon_format[:4] or "gen9")
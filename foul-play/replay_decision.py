@@ -0,0 +1,96 @@
+"""
+Re-run a logged decision from its snapshot
+
+    python replay_decision.py --snapshot logs/decisions/snapshots/<battle_id>/<turn>_<ts>.pickle
+    python replay_decision.py --battle-id battle-gen9ou-123 --turn 7
+
+The sampled battles and the final random draw are reproduced exactly.
+MCTS is time-bounded so visit counts can differ between runs
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from config import FoulPlayConfig, init_logging
+from data.mods.apply_mods import apply_mods
+from fp.decision_logger import get_battle_decisions, is_replayable, load_search_snapshot
+from fp.format_context import load_format_datasets
+from fp.search.main import replay_search
+from fp.search.team_preview import replay_team_preview
+
+logger = logging.getLogger(__name__)
+
+
+def find_snapshot_paths(battle_id, turn):
+    return [
+        d["snapshot"]
+        for d in get_battle_decisions(battle_id)
+        if d.get("turn") == turn and d.get("snapshot")
+    ]
+
+
+def replay_snapshot(snapshot):
+    recorded = snapshot["search"]
+    FoulPlayConfig.pokemon_format = snapshot["pokemon_format"]
+    FoulPlayConfig.parallelism = recorded["parallelism"]
+    FoulPlayConfig.fused_search = recorded["fused"]
+    # older snapshots did not record it
+    FoulPlayConfig.stratified_sampling = recorded.get("stratified_sampling", False)
+    apply_mods(FoulPlayConfig.pokemon_format)
+    load_format_datasets(FoulPlayConfig.pokemon_format)
+
+    if snapshot["battle"].team_preview:
+        choice, replayed = replay_team_preview(snapshot["battle"], recorded)
+    else:
+        choice, replayed = replay_search(snapshot["battle"], recorded)
+    return {
+        "battle_id": snapshot["battle_id"],
+        "turn": snapshot["turn"],
+        "seed": recorded["seed"],
+        "recorded_choice": recorded["choice"],
+        "choice": choice,
+        "final_policy": replayed["final_policy"],
+        "recorded_sample_digest": recorded["sample_digest"],
+        "replayed_sample_digest": replayed["sample_digest"],
+        "samples_match": recorded["sample_digest"] == replayed["sample_digest"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a logged decision")
+    parser.add_argument("--snapshot", default=None, help="Path to a decision snapshot")
+    parser.add_argument("--battle-id", default=None)
+    parser.add_argument("--turn", type=int, default=None)
+    parser.add_argument("--log-level", default="WARNING", help="Python logging level")
+    args = parser.parse_args()
+
+    init_logging(args.log_level, False)
+
+    if args.snapshot is not None:
+        snapshot_paths = [args.snapshot]
+    elif args.battle_id is not None and args.turn is not None:
+        snapshot_paths = find_snapshot_paths(args.battle_id, args.turn)
+    else:
+        parser.error("Either --snapshot or --battle-id and --turn are required")
+
+    if not snapshot_paths:
+        logger.error("No snapshots found for {} turn {}".format(args.battle_id, args.turn))
+        sys.exit(1)
+
+    all_match = True
+    for path in snapshot_paths:
+        snapshot = load_search_snapshot(path)
+        if not is_replayable(snapshot["search"]):
+            logger.warning("{} cannot be replayed from its search, skipping it".format(path))
+            continue
+        result = replay_snapshot(snapshot)
+        all_match = all_match and result["samples_match"]
+        print(json.dumps(result, indent=2))
+
+    sys.exit(0 if all_match else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,14 @@ from copy import deepcopy
 from config import FoulPlayConfig, init_logging, BotModes
 
 from teams import load_team
+from fp.format_context import format_contexts
 from fp.run_battle import pokemon_battle
+from fp.decision_logger import shutdown_decision_log
+from fp.metrics import record_battle, start_metrics_writer
 from fp.websocket_client import PSWebsocketClient
 
 from data import all_move_json
 from data import pokedex
-from data.mods.apply_mods import apply_mods
 
 logger = logging.getLogger(__name__)
 
@@ -42,7 +44,8 @@ def check_dictionaries_are_unmodified(original_pokedex, original_move_json):
 async def run_foul_play():
     FoulPlayConfig.configure()
     init_logging(FoulPlayConfig.log_level, FoulPlayConfig.log_to_file)
-    apply_mods(FoulPlayConfig.pokemon_format)
+    # applies the mods, which every format played shares
+    format_contexts.activate(*FoulPlayConfig.formats[0])
 
     original_pokedex = deepcopy(pokedex)
     original_move_json = deepcopy(all_move_json)
@@ -58,6 +61,8 @@ async def run_foul_play():
     if FoulPlayConfig.avatar is not None:
         await ps_websocket_client.avatar(FoulPlayConfig.avatar)
 
+    metrics_writer = start_metrics_writer()
+
     battles_run = 0
     wins = 0
     losses = 0
@@ -65,6 +70,9 @@ async def run_foul_play():
     team_dict = None
     
     while True:
+        format_contexts.activate(
+            *FoulPlayConfig.formats[battles_run % len(FoulPlayConfig.formats)]
+        )
         if FoulPlayConfig.requires_team():
             team_packed, team_dict, team_file_name = load_team(FoulPlayConfig.team_name)
             await ps_websocket_client.update_team(team_packed)
@@ -96,6 +104,11 @@ async def run_foul_play():
             else:
                 losses += 1
                 logger.info("Lost with team: {}".format(team_file_name))
+            record_battle(
+                FoulPlayConfig.pokemon_format,
+                team_file_name,
+                winner == FoulPlayConfig.username,
+            )
 
             logger.info("W: {}\tL: {}".format(wins, losses))
         except Exception as e:
@@ -109,7 +122,8 @@ async def run_foul_play():
         battles_run += 1
         if battles_run >= FoulPlayConfig.run_count:
             break
-            
+
+    metrics_writer.stop()
     await ps_websocket_client.close()
 
 
@@ -119,3 +133,5 @@ if __name__ == "__main__":
     except Exception:
         logger.error(traceback.format_exc())
         raise
+    finally:
+        shutdown_decision_log()
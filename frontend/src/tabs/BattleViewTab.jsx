@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useMemo } from "react";
+import React, { useState, useEffect, useMemo, useRef } from "react";
 import { Activity, ChevronDown, ChevronRight } from "lucide-react";
 import DecisionDisplay from "./components/DecisionDisplay";
 
@@ -171,6 +171,24 @@ export default function BattleViewTab() {
   const [status, setStatus] = useState({ ready: false, running: false, roomId: "", roomUrl: "" });
   const [battleState, setBattleState] = useState(null);
   const [openViewer, setOpenViewer] = useState(true);
+  const streaming = useRef(false);
+  
+  // The bot pushes its state through the backend; /battle/state is only polled without the stream
+  useEffect(() => {
+    if (typeof EventSource === "undefined") return undefined;
+    const source = new EventSource(`${API_BASE}/events/stream`);
+    source.onopen = () => { streaming.current = true; };
+    source.onerror = () => { streaming.current = false; };
+    source.addEventListener("state", (e) => {
+      try {
+        setBattleState(JSON.parse(e.data));
+      } catch {}
+    });
+    return () => {
+      streaming.current = false;
+      source.close();
+    };
+  }, []);
   
   useEffect(() => {
     let live = true;
@@ -199,6 +217,7 @@ export default function BattleViewTab() {
         }
       } catch {}
       
+      if (streaming.current) return;
       try {
         const state = await apiGet("/battle/state");
         if (live && state) {
@@ -159,9 +159,10 @@ else
     echo "   EPoké Log: Not found"
 fi
 
-if [ -f "$PROJECT_ROOT/logs/decisions/decisions.jsonl" ]; then
-    LINES=$(wc -l < "$PROJECT_ROOT/logs/decisions/decisions.jsonl" 2>/dev/null || echo "0")
-    echo "   Decisions Log: $LINES decisions"
+if [ -f "$PROJECT_ROOT/logs/decisions/records.idx" ]; then
+    # 16 bytes per decision in the decision store's index
+    INDEX_BYTES=$(wc -c < "$PROJECT_ROOT/logs/decisions/records.idx" 2>/dev/null || echo "0")
+    echo "   Decisions Log: $((INDEX_BYTES / 16)) decisions"
 else
     echo "   Decisions Log: Not found"
 fi
@@ -198,7 +199,7 @@ echo "  Backend:   tail -f $PROJECT_ROOT/logs/backend/backend.log"
 echo "  Frontend:  tail -f $PROJECT_ROOT/logs/frontend/frontend.log"
 echo "  Bot:       tail -f $PROJECT_ROOT/logs/bot/bot.log"
 echo "  EPoké:     tail -f $PROJECT_ROOT/logs/epoke/epoke.log"
-echo "  Decisions: tail -f $PROJECT_ROOT/logs/decisions/decisions.jsonl"
+echo "  Decisions: tail -f \$(ls $PROJECT_ROOT/logs/decisions/segments/*.jsonl | tail -1)"
 echo ""
 echo "Test endpoints:"
 echo "  Backend health:  curl http://localhost:8000/health"
@@ -5,7 +5,7 @@ ROOT="$(cd "$SCRIPT_DIR/.." && pwd -P)"
 
 set -e
 
-LOGS_
+LOGS_ROOT="$ROOT/logs"
 echo "🧹 Cleaning up logs directory..."
 
 # Remove unnecessary files
@@ -62,7 +62,13 @@ touch "$LOGS_ROOT/epoke/epoke.log"
 touch "$LOGS_ROOT/epoke/epoke.err.log"
 touch "$LOGS_ROOT/viewer/viewer.log"
 touch "$LOGS_ROOT/viewer/viewer.err.log"
-touch "$LOGS_ROOT/decisions/decisions.jsonl"
+
+# The decision store creates its segments and index on the first decision.
+# A decisions.jsonl left by an older version is imported into it then
+# (DecisionStore.migrate_jsonl) and renamed to decisions.jsonl.migrated
+if [ -f "$LOGS_ROOT/decisions/decisions.jsonl" ]; then
+    echo "  decisions/decisions.jsonl will be imported into the decision store by the bot"
+fi
 
 # Create a README
 cat > "$LOGS_ROOT/README.md" << 'READMEEOF'
@@ -85,8 +91,12 @@ logs/
 ├── viewer/           # PocketMon viewer logs (optional)
 │   ├── viewer.log        # Viewer output
 │   └── viewer.err.log    # Viewer errors
-└── decisions/        # AI decision logs
-    └── decisions.jsonl   # Pattern #3 decision tracking
+└── decisions/        # AI decision store (fp/decision_store.py)
+    ├── segments/         # Decision records, JSON Lines in numbered segments
+    ├── records.idx       # Segment, offset and length of every record, in order
+    ├── battles/          # The same index per battle
+    ├── snapshots/        # Search snapshots for replay_decision.py
+    └── profiles/         # Profiles of slow decisions
 ```
 
 ## Log Files Explained
@@ -107,16 +117,20 @@ logs/
 - `epoke/epoke.err.log` - EPoké service errors
 
 ### Decision Logs
-- `decisions/decisions.jsonl` - AI decisions in JSON Lines format
-  - One JSON object per line
+- `decisions/segments/*.jsonl` - AI decisions in JSON Lines format
+  - One JSON object per line, the newest in the highest numbered segment
   - Tracks MCTS, EPoké, and hybrid decisions
+  - Old segments are removed by compaction
+- `decisions/records.idx` - 16 bytes per decision: where each record is in the segments
+- `decisions/decisions.jsonl` - Only written by older versions. The bot imports it
+  into the segments on first use and renames it to `decisions.jsonl.migrated`
 
 ## Useful Commands
 ```bash
 # Watch logs in real-time
 tail -f logs/backend/backend.log
 tail -f logs/bot/bot.log
-tail -f logs/decisions/decisions.jsonl
+tail -f "$(ls logs/decisions/segments/*.jsonl | tail -1)"
 
 # Search for errors
 grep -i error logs/backend/backend.log
@@ -127,11 +141,14 @@ grep -c "won" logs/bot/bot.log
 grep -c "lost" logs/bot/bot.log
 
 # View latest AI decisions
-tail -20 logs/decisions/decisions.jsonl | jq .
+tail -20 "$(ls logs/decisions/segments/*.jsonl | tail -1)" | jq .
+
+# Count AI decisions
+echo $(( $(wc -c < logs/decisions/records.idx) / 16 ))
 
 # Clear all logs (fresh start)
 find logs/ -name "*.log" -exec truncate -s 0 {} \;
-find logs/ -name "*.jsonl" -exec truncate -s 0 {} \;
+rm -rf logs/decisions/segments logs/decisions/battles logs/decisions/records.idx
 ```
 
 ## Log Rotation
@@ -0,0 +1,292 @@
+"""
+Protocol engine tests, replaying the recorded battles of benchmarks/corpus
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+# the protocol engine reads the set datasets and the corpus is loaded by its benchmark
+battle_modifier = pytest.importorskip("fp.battle_modifier", exc_type=ImportError)
+benchmark_protocol = pytest.importorskip("benchmark_protocol", exc_type=ImportError)
+
+import constants
+from fp.battle import Battle, StatRange
+from fp.battle_modifier import (
+    BATTLE_MODIFIERS,
+    check_speed_from_turn_order,
+    process_battle_updates,
+)
+
+CORPUS = Path(__file__).parent.parent / "foul-play" / "benchmarks" / "corpus"
+
+RANDBATS = "battle-gen9randombattle-2201000001"
+OU = "battle-gen9ou-2201000002"
+OU_LONG = "battle-gen9ou-2201000004"
+
+
+def _recorded(battle_tag):
+    for tag, pokemon_format, frames in benchmark_protocol.load_corpus(CORPUS):
+        if tag == battle_tag:
+            return pokemon_format, frames
+    raise KeyError(battle_tag)
+
+
+def _battle(battle_tag):
+    pokemon_format, frames = _recorded(battle_tag)
+    battle = Battle(battle_tag)
+    battle.pokemon_format = pokemon_format
+    battle.generation = pokemon_format[:4]
+    return battle, frames
+
+
+def _replay(battle_tag, turn=None):
+    """
+    A battle replayed up to the frame that starts `turn`, or to its end,
+    and the frames that were not replayed
+    """
+    battle, frames = _battle(battle_tag)
+    for index, frame in enumerate(frames):
+        process_battle_updates(battle, frame)
+        if turn is not None and battle.turn == turn:
+            return battle, frames[index + 1 :]
+    return battle, []
+
+
+def _requests(frames):
+    return [
+        json.loads(line[len("|request|") :])
+        for frame in frames
+        for line in frame
+        if line.startswith("|request|")
+    ]
+
+
+def _request_frame(request_json):
+    return ["|request|{}".format(json.dumps(request_json))]
+
+
+class TestHandlers:
+    """Test the handlers of BATTLE_MODIFIERS on recorded frames"""
+
+    def test_every_action_has_a_handler(self):
+        for action in ("switch", "move", "-damage", "-boost", "-unboost", "-status", "turn", "inactive"):
+            assert action in BATTLE_MODIFIERS
+
+    def test_switch_moves_the_active_pokemon_to_the_reserve(self):
+        battle, _ = _replay(RANDBATS, turn=3)
+        assert battle.opponent.active.name == "ironvaliant"
+        assert battle.opponent.active.hp == round(battle.opponent.active.max_hp * 81 / 100)
+        kingambit = battle.opponent.find_pokemon_in_reserves("kingambit")
+        assert kingambit.hp == round(kingambit.max_hp * 38 / 100)
+
+    def test_opponent_moves_are_revealed(self):
+        battle, _ = _replay(RANDBATS)
+        moonblast = battle.opponent.active.get_move("moonblast")
+        assert moonblast is not None
+        assert moonblast.current_pp == moonblast.max_pp - 1
+        assert battle.opponent.last_used_move.move == "moonblast"
+        assert battle.opponent.find_pokemon_in_reserves("kingambit").get_move("suckerpunch") is not None
+
+    def test_damage_and_faint(self):
+        battle, _ = _replay(RANDBATS)
+        greattusk = battle.user.find_pokemon_in_reserves("greattusk")
+        assert greattusk.hp == 0
+        assert greattusk.fainted
+        assert battle.user.active.name == "gholdengo"
+        assert battle.user.active.hp == 243
+
+    def test_damage_reveals_its_source(self):
+        battle, _ = _replay(OU)
+        assert battle.user.find_pokemon_in_reserves("garchomp").ability == "roughskin"
+        assert battle.opponent.side_conditions[constants.STEALTH_ROCK] == 1
+        gholdengo = battle.opponent.active
+        assert gholdengo.hp == round(gholdengo.max_hp * 94 / 100)
+
+    def test_boosts_are_capped_and_cleared_on_switch_out(self):
+        battle, _ = _replay(RANDBATS, turn=3)
+        assert battle.user.active.boosts[constants.DEFENSE] == -2
+        assert battle.user.active.boosts[constants.SPECIAL_DEFENSE] == -2
+
+        process_battle_updates(
+            battle,
+            ["|", "|-boost|p2a: Iron Valiant|spa|4", "|-boost|p2a: Iron Valiant|spa|4"],
+        )
+        assert battle.opponent.active.boosts[constants.SPECIAL_ATTACK] == constants.MAX_BOOSTS
+
+        process_battle_updates(battle, ["|", "|switch|p2a: Kingambit|Kingambit, L77, F|38/100"])
+        ironvaliant = battle.opponent.find_pokemon_in_reserves("ironvaliant")
+        assert ironvaliant.boosts[constants.SPECIAL_ATTACK] == 0
+
+    def test_status_and_toxic_damage(self):
+        battle, _ = _replay(RANDBATS, turn=3)
+        process_battle_updates(
+            battle,
+            [
+                "|",
+                "|-status|p2a: Iron Valiant|tox",
+                "|-damage|p2a: Iron Valiant|75/100 tox|[from] psn",
+            ],
+        )
+        assert battle.opponent.active.status == constants.TOXIC
+        assert battle.opponent.side_conditions[constants.TOXIC_COUNT] == 1
+
+        process_battle_updates(battle, ["|", "|-curestatus|p2a: Iron Valiant|tox"])
+        assert battle.opponent.active.status is None
+
+    def test_malformed_lines_are_skipped(self):
+        battle, _ = _replay(RANDBATS, turn=3)
+        process_battle_updates(
+            battle, ["|", "|-boost|p2a: Iron Valiant|spa|lots", "|-damage|p2a: Iron Valiant|50/100"]
+        )
+        assert battle.opponent.active.hp == round(battle.opponent.active.max_hp / 2)
+
+
+class TestSplit:
+    """Test that |split| applies the exact line for our own side only"""
+
+    def test_own_side_gets_the_exact_hp(self):
+        battle, _ = _replay(RANDBATS, turn=2)
+        # "|-damage|p1a: Great Tusk|201/287" and not 71% of 287
+        assert battle.user.active.hp == 201
+        assert battle.user.active.max_hp == 287
+
+    def test_opponent_side_gets_the_public_line(self):
+        battle, _ = _replay(RANDBATS, turn=3)
+        process_battle_updates(
+            battle,
+            [
+                "|",
+                "|split|p2",
+                "|-damage|p2a: Iron Valiant|100/223",
+                "|-damage|p2a: Iron Valiant|40/100",
+            ],
+        )
+        assert battle.opponent.active.hp == round(battle.opponent.active.max_hp * 40 / 100)
+
+
+class TestDecisionPoints:
+    """Test when process_battle_updates asks the bot to choose"""
+
+    @pytest.mark.parametrize("battle_tag", [RANDBATS, OU, OU_LONG])
+    def test_one_decision_per_request(self, battle_tag):
+        battle, frames = _battle(battle_tag)
+        decisions = sum(process_battle_updates(battle, frame) for frame in frames)
+        assert decisions == len(_requests(frames))
+
+    def test_turn_upkeep_and_force_switch(self):
+        battle, frames = _battle(RANDBATS)
+        decisions = []
+        for frame in frames:
+            if process_battle_updates(battle, frame):
+                decisions.append((battle.turn, battle.force_switch))
+        # the force switch after great tusk fainted is asked at |upkeep|
+        assert decisions == [(1, False), (2, False), (3, False), (3, True), (4, False)]
+
+    def test_request_frames_wait_for_the_battle_frame(self):
+        battle, frames = _battle(RANDBATS)
+        # the request is received before the frame that starts turn 1
+        assert not process_battle_updates(battle, frames[0])
+        assert not process_battle_updates(battle, frames[1])
+        assert battle.request_pending
+        assert process_battle_updates(battle, frames[2])
+        assert not battle.request_pending
+
+    def test_request_after_its_decision_point(self):
+        battle, frames = _battle(RANDBATS)
+        process_battle_updates(battle, frames[0])
+        assert not process_battle_updates(battle, frames[2])
+        assert battle.awaiting_request
+        assert process_battle_updates(battle, frames[1])
+        assert not battle.awaiting_request
+
+    def test_team_preview(self):
+        battle, frames = _battle(OU)
+        decided = [process_battle_updates(battle, frame) for frame in frames[:3]]
+        assert decided == [False, False, True]
+        assert battle.team_preview
+        assert [p.name for p in battle.opponent.reserve] == [
+            "greattusk", "gholdengo", "kingambit", "dragonite", "ironvaliant", "toxapex"
+        ]
+
+        process_battle_updates(battle, frames[3])
+        assert process_battle_updates(battle, frames[4])
+        assert not battle.team_preview
+        assert battle.turn == 1
+
+    def test_wait_request(self):
+        battle, frames = _replay(RANDBATS, turn=1)
+        side = _requests(frames)[0][constants.SIDE]
+        process_battle_updates(battle, _request_frame({constants.WAIT: True, constants.SIDE: side, "rqid": 9}))
+        assert battle.wait
+        assert not process_battle_updates(battle, frames[2])
+        assert not battle.request_pending
+        assert battle.turn == 2
+
+    def test_force_switch_needs_battle_progress(self):
+        battle, frames = _replay(RANDBATS, turn=3)
+        force_switch = next(r for r in _requests(frames) if constants.FORCE_SWITCH in r)
+        process_battle_updates(battle, _request_frame(force_switch))
+        assert battle.force_switch
+        # the timer is not progress
+        assert not process_battle_updates(battle, ["|", "|inactive|Time left: 140 sec this turn | 260 sec total"])
+        assert process_battle_updates(battle, ["|", "|-damage|p2a: Iron Valiant|70/100"])
+
+
+class TestTimer:
+    """Test reading the battle timer from |inactive|"""
+
+    def test_time_left_is_read(self):
+        battle, _ = _replay(RANDBATS, turn=2)
+        assert battle.time_remaining == 290
+        assert battle.turn_time_remaining == 150
+        battle, _ = _replay(RANDBATS)
+        assert battle.time_remaining == 270
+
+    def test_other_inactive_messages_and_inactiveoff(self):
+        battle, _ = _replay(RANDBATS, turn=2)
+        process_battle_updates(
+            battle,
+            ["|", "|inactive|Battle timer is ON: inactive players will automatically lose when time's up."],
+        )
+        assert battle.time_remaining == 290
+        process_battle_updates(battle, ["|", "|inactiveoff|Battle timer is now OFF."])
+        assert battle.time_remaining is None
+        assert battle.turn_time_remaining is None
+
+
+class TestSpeedFromTurnOrder:
+    """Test narrowing the opponent's speed range from the order of the moves of a turn"""
+
+    def test_moving_first_with_the_same_priority(self):
+        # turn 3: our garchomp used spikes before dragonite used roost
+        battle, _ = _replay(OU_LONG, turn=3)
+        assert battle.opponent.active.speed_range == StatRange(min=0, max=float("inf"))
+        battle, _ = _replay(OU_LONG, turn=4)
+        assert battle.opponent.active.speed_range == StatRange(
+            min=0, max=battle.user.active.stats[constants.SPEED] + 1
+        )
+
+    def test_priority_moves_are_ignored(self):
+        # turn 1: extremespeed after earthquake says nothing about speed
+        battle, _ = _replay(OU_LONG, turn=2)
+        assert battle.opponent.active.speed_range == StatRange(min=0, max=float("inf"))
+
+    def test_opponent_moving_first(self):
+        battle, _ = _replay(OU_LONG, turn=3)
+        battle.opponent.last_used_move = battle.opponent.last_used_move._replace(
+            pokemon_name="dragonite", move="roost", turn=battle.turn
+        )
+        check_speed_from_turn_order(battle, battle.user, "spikes")
+        assert battle.opponent.active.speed_range == StatRange(
+            min=battle.user.active.stats[constants.SPEED], max=float("inf")
+        )
+
+    def test_only_when_both_moved_this_turn(self):
+        battle, _ = _replay(OU_LONG, turn=3)
+        check_speed_from_turn_order(battle, battle.user, "spikes")
+        assert battle.opponent.active.speed_range == StatRange(min=0, max=float("inf"))
@@ -0,0 +1,85 @@
+"""
+Live battle state parser tests
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.battle_state_parser import BattleStateParser
+
+
+BATTLE_START = [
+    "INFO     Initialized battle-gen9ou-123 against: someone",
+    "DEBUG    Received message from websocket: >battle-gen9ou-123",
+    "|switch|p1a: Pikachu|Pikachu, L50|100/100",
+    "|switch|p2a: Garchomp|Garchomp, L50, M|100/100",
+    "|turn|1",
+]
+
+
+def _append(path, lines):
+    with path.open("a") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+class TestBattleStateParser:
+    """Test incremental parsing of the bot log"""
+
+    def test_parses_appended_lines_only(self, tmp_path):
+        log = tmp_path / "bot.log"
+        _append(log, BATTLE_START)
+        parser = BattleStateParser(log)
+
+        state = parser.parse_latest_battle_state()
+        assert state["battle_id"] == "battle-gen9ou-123"
+        assert state["format"] == "gen9ou"
+        assert state["turn"] == 1
+        assert state["opponent_active"] == "Garchomp"
+
+        _append(log, ["|move|p1a: Pikachu|Thunderbolt|p2a: Garchomp", "|-damage|p2a: Garchomp|40/100", "|turn|2"])
+        offset = parser._offset
+        state = parser.parse_latest_battle_state()
+        assert parser._offset > offset
+        assert state["turn"] == 2
+        assert state["move_history"][-1]["move"] == "Thunderbolt"
+        assert state["opponent_team"][0]["hp"] == 40
+
+    def test_partial_lines_wait_for_newline(self, tmp_path):
+        log = tmp_path / "bot.log"
+        _append(log, BATTLE_START)
+        with log.open("a") as f:
+            f.write("|turn|")
+        parser = BattleStateParser(log)
+        assert parser.parse_latest_battle_state()["turn"] == 1
+        with log.open("a") as f:
+            f.write("7\n")
+        assert parser.parse_latest_battle_state()["turn"] == 7
+
+    def test_survives_rotation_and_truncation(self, tmp_path):
+        log = tmp_path / "bot.log"
+        _append(log, BATTLE_START)
+        parser = BattleStateParser(log)
+        parser.parse_latest_battle_state()
+
+        log.rename(tmp_path / "bot.log.1")
+        _append(log, ["INFO     Initialized battle-gen9randombattle-456 against: other", "|turn|3"])
+        state = parser.parse_latest_battle_state()
+        assert state["battle_id"] == "battle-gen9randombattle-456"
+        assert state["turn"] == 3
+
+        log.write_text("|turn|9\n")
+        assert parser.parse_latest_battle_state()["turn"] == 9
+
+    def test_follows_newest_log_in_directory(self, tmp_path):
+        first = tmp_path / "battle-gen9ou-123_someone.log"
+        _append(first, BATTLE_START)
+        parser = BattleStateParser(tmp_path)
+        assert parser.parse_latest_battle_state()["battle_id"] == "battle-gen9ou-123"
+
+        second = tmp_path / "battle-gen9ou-124_other.log"
+        _append(second, ["INFO     Initialized battle-gen9ou-124 against: other"])
+        os.utime(second, (first.stat().st_mtime + 10, first.stat().st_mtime + 10))
+        assert parser.parse_latest_battle_state()["battle_id"] == "battle-gen9ou-124"
@@ -0,0 +1,85 @@
+"""
+Search benchmark tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+# the benchmark decides with the search: it needs poke-engine and the set datasets
+benchmark_search = pytest.importorskip("benchmark_search", exc_type=ImportError)
+
+from benchmark_protocol import load_corpus
+from benchmark_search import (
+    DEFAULT_CORPUS,
+    find_corpus,
+    percentile,
+    snapshots_from_battle,
+    summarize,
+)
+
+PINNED_FORMATS = ["gen9battlefactory", "gen9ou", "gen9randombattle"]
+
+
+def _snapshots(battle_tag):
+    for tag, pokemon_format, frames in load_corpus(DEFAULT_CORPUS):
+        if tag == battle_tag:
+            return snapshots_from_battle(tag, pokemon_format, frames)
+    raise KeyError(battle_tag)
+
+
+class TestSummaries:
+    """Test the latency percentiles of the report"""
+
+    def test_percentile_interpolates(self):
+        assert percentile([5, 1, 4, 2, 3], 50) == 3
+        assert percentile([1, 2, 3, 4, 5], 25) == 2
+        assert percentile([1, 2], 50) == 1.5
+        assert percentile([1, 2], 100) == 2
+        assert percentile([], 50) is None
+
+    def test_summarize(self):
+        summary = summarize(list(range(1, 101)))
+        assert summary == {"p50": 50.5, "p95": 95.05, "p99": 99.01, "mean": 50.5, "max": 100}
+        assert summarize([]) is None
+
+
+class TestPinnedCorpus:
+    """Test rebuilding the decisions of the pinned battles"""
+
+    def test_every_format_has_enough_decisions(self):
+        formats = find_corpus(DEFAULT_CORPUS)
+        assert sorted(formats) == PINNED_FORMATS
+        for pokemon_format, sources in formats.items():
+            snapshots = [
+                s for tag, frames in sources for s in snapshots_from_battle(tag, pokemon_format, frames)
+            ]
+            assert len(snapshots) >= 20
+
+    def test_decisions_are_rebuilt_as_run_battle_gives_them(self):
+        snapshots = _snapshots("battle-gen9randombattle-2201000001")
+        assert [s["turn"] for s in snapshots] == [1, 2, 3, 3, 4]
+        assert [s["battle"].time_remaining for s in snapshots] == [None, 290, 270, 270, 270]
+
+        force_switch = snapshots[3]["battle"]
+        assert force_switch.force_switch
+        assert force_switch.user.active.name == "greattusk"
+        assert force_switch.user.active.hp == 0
+
+        last = snapshots[4]["battle"]
+        assert last.user.active.name == "gholdengo"
+        assert last.opponent.active.name == "ironvaliant"
+        assert all(s["search"] == {} for s in snapshots)
+
+    def test_team_preview_is_a_decision(self):
+        snapshots = _snapshots("battle-gen9ou-2201000002")
+        assert [s["battle"].team_preview for s in snapshots] == [True, False, False, False]
+
+        team_preview = snapshots[0]["battle"]
+        assert team_preview.user.active.name == team_preview.opponent.active.name
+        assert len(team_preview.user.reserve) == 6
+        assert len(team_preview.opponent.reserve) == 6
+        assert snapshots[-1]["battle"].user.active.name == "corviknight"
@@ -0,0 +1,149 @@
+"""
+Decision snapshot retention tests
+"""
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+import fp.decision_logger as decision_logger
+from fp.decision_logger import DecisionLogWriter, SnapshotRetention, is_replayable
+
+
+class _Store:
+    """Records the batches the writer appends, optionally holding the writer thread in one"""
+
+    def __init__(self, hold=False):
+        self.batches = []
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def append_many(self, records):
+        self.writing.set()
+        self.release.wait(5)
+        self.batches.append([r["turn"] for r in records])
+
+
+def _record(turn):
+    return {"battle_id": "battle-gen9ou-1", "turn": turn}
+
+
+def _snapshot(directory, battle_id, turn):
+    path = directory / battle_id / "{}_0.pickle".format(turn)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"snapshot")
+    os.utime(path, (turn, turn))
+    return path
+
+
+class TestSnapshotRetention:
+    """Test deleting the oldest decision snapshots"""
+
+    def test_oldest_snapshots_are_deleted(self, tmp_path):
+        retention = SnapshotRetention(tmp_path, max_snapshots=3)
+        existing = [_snapshot(tmp_path, "battle-gen9ou-1", t) for t in (1, 2)]
+        existing.append(_snapshot(tmp_path, "battle-gen9ou-2", 3))
+        retention.add(existing[-1])
+        assert all(p.exists() for p in existing)
+
+        retention.add(_snapshot(tmp_path, "battle-gen9ou-2", 4))
+        assert not existing[0].exists()
+        assert existing[1].exists()
+
+        retention.add(_snapshot(tmp_path, "battle-gen9ou-2", 5))
+        assert not (tmp_path / "battle-gen9ou-1").exists()
+        assert len(list(tmp_path.glob("*/*.pickle"))) == 3
+
+    def test_zero_keeps_every_snapshot(self, tmp_path):
+        retention = SnapshotRetention(tmp_path, max_snapshots=0)
+        for turn in range(5):
+            retention.add(_snapshot(tmp_path, "battle-gen9ou-1", turn))
+        assert len(list(tmp_path.glob("*/*.pickle"))) == 5
+
+
+class TestIsReplayable:
+    """Test which decisions have a search to replay"""
+
+    def test_searched_decisions_are_replayable(self):
+        assert is_replayable({"seed": 1, "num_battles": 8})
+        assert is_replayable({"seed": 1, "opening_book": {"answered": False}})
+        assert is_replayable({"seed": 1, "cached": False})
+        assert is_replayable({"seed": 1, "opening_book": {"answered": False, "policy_from_book": False}})
+
+    def test_answered_decisions_are_not_replayable(self):
+        assert not is_replayable({})
+        assert not is_replayable({"seed": 1, "cached": True})
+        assert not is_replayable({"seed": 1, "opening_book": {"answered": True}})
+
+    def test_moves_chosen_from_the_book_are_not_replayable(self):
+        # refine mode searched the position, then drew the move from the book's policy
+        assert not is_replayable({"seed": 1, "opening_book": {"answered": False, "policy_from_book": True}})
+
+
+class TestDecisionLogWriter:
+    """Test writing decisions from the background thread"""
+
+    def test_full_queue_drops_and_counts(self, monkeypatch):
+        store = _Store(hold=True)
+        monkeypatch.setattr(decision_logger, "_get_store", lambda: store)
+        writer = DecisionLogWriter(max_queue_size=1, flush_interval_ms=0)
+
+        assert writer.submit("record", _record(1))
+        # the thread is writing the first record: the second waits in the queue
+        assert store.writing.wait(5)
+        assert writer.submit("record", _record(2))
+        assert not writer.submit("record", _record(3))
+        assert not writer.submit("record", _record(4))
+        assert writer.dropped == 2
+
+        store.release.set()
+        writer.close()
+        assert store.batches == [[1], [2]]
+
+    def test_records_are_batched_until_the_flush_interval(self, monkeypatch):
+        store = _Store()
+        monkeypatch.setattr(decision_logger, "_get_store", lambda: store)
+        writer = DecisionLogWriter(max_queue_size=10, flush_interval_ms=50)
+
+        start_time = time.monotonic()
+        for turn in range(3):
+            writer.submit("record", _record(turn))
+        writer.flush()
+        assert time.monotonic() - start_time >= 0.05
+        assert store.batches == [[0, 1, 2]]
+        writer.close()
+
+    def test_batches_are_bounded(self, monkeypatch):
+        store = _Store()
+        monkeypatch.setattr(decision_logger, "_get_store", lambda: store)
+        monkeypatch.setattr(decision_logger, "_MAX_BATCH_SIZE", 2)
+        writer = DecisionLogWriter(max_queue_size=10, flush_interval_ms=60000)
+
+        for turn in range(5):
+            writer.submit("record", _record(turn))
+        writer.close()
+        assert store.batches == [[0, 1], [2, 3], [4]]
+
+    def test_shutdown_drains_the_queue(self, monkeypatch, tmp_path):
+        store = _Store()
+        monkeypatch.setattr(decision_logger, "_get_store", lambda: store)
+        writer = DecisionLogWriter(max_queue_size=10, flush_interval_ms=60000)
+        monkeypatch.setattr(decision_logger, "_WRITER", writer)
+
+        writer.submit("record", _record(1))
+        writer.submit("snapshot", (tmp_path / "battle-gen9ou-1" / "1_0.pickle", b"snapshot"))
+        # what the interpreter runs at exit
+        decision_logger.shutdown_decision_log()
+        assert store.batches == [[1]]
+        assert (tmp_path / "battle-gen9ou-1" / "1_0.pickle").read_bytes() == b"snapshot"
+        assert not writer._thread.is_alive()
+
+        # once closed, items are written by the caller
+        assert writer.submit("record", _record(2))
+        assert store.batches == [[1], [2]]
@@ -0,0 +1,66 @@
+"""
+Decision store tests
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from fp.decision_store import DecisionStore
+
+
+def _decision(i, battle_id="battle-gen9ou-1"):
+    return {"battle_id": battle_id, "turn": i, "selected_move": "move{}".format(i)}
+
+
+class TestDecisionStore:
+    """Test the indexed decision store"""
+
+    def test_recent_and_latest(self, tmp_path):
+        store = DecisionStore(tmp_path)
+        store.append_many([_decision(i) for i in range(10)])
+        assert len(store) == 10
+        assert [d["turn"] for d in store.recent(3)] == [7, 8, 9]
+        assert store.latest()["turn"] == 9
+        assert len(store.recent(50)) == 10
+
+    def test_battle_lookup(self, tmp_path):
+        store = DecisionStore(tmp_path)
+        for i in range(6):
+            store.append(_decision(i, "battle-a" if i % 2 else "battle-b"))
+        assert [d["turn"] for d in store.battle("battle-a")] == [1, 3, 5]
+        assert store.battle("battle-c") == []
+
+    def test_rotation_and_compaction(self, tmp_path):
+        store = DecisionStore(tmp_path, segment_max_bytes=200, max_segments=2)
+        for i in range(30):
+            store.append(_decision(i))
+        assert len(store.segment_ids()) == 2
+        assert store.latest()["turn"] == 29
+        turns = [d["turn"] for d in store.battle("battle-gen9ou-1")]
+        assert turns == list(range(30 - len(store), 30))
+
+    def test_reopen_recovers_unindexed_records(self, tmp_path):
+        store = DecisionStore(tmp_path)
+        store.append(_decision(0))
+        store.close()
+
+        segment = store._segment_path(store.segment_ids()[-1])
+        with segment.open("a") as f:
+            f.write(json.dumps(_decision(1)) + "\n")
+            f.write('{"battle_id": "torn')
+
+        reopened = DecisionStore(tmp_path)
+        reopened.append(_decision(2))
+        assert [d["turn"] for d in reopened.recent(10)] == [0, 1, 2]
+
+    def test_migrate_legacy_log(self, tmp_path):
+        legacy = tmp_path / "decisions.jsonl"
+        legacy.write_text("".join(json.dumps(_decision(i)) + "\n" for i in range(5)))
+
+        store = DecisionStore(tmp_path)
+        assert store.migrate_jsonl(legacy) == 5
+        assert not legacy.exists()
+        assert [d["turn"] for d in store.battle("battle-gen9ou-1")] == list(range(5))
@@ -0,0 +1,77 @@
+"""
+Determinization controller tests
+"""
+
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from fp.battle import Battle
+from fp.search.determinizations import (
+    DeterminizationController,
+    MAX_SAMPLE_FACTOR,
+    MIN_SAMPLE_FACTOR,
+    determinization_stats,
+)
+
+Option = namedtuple("Option", ["move_choice", "visits"])
+Result = namedtuple("Result", ["side_one"])
+
+AGREE = {"disagreement": 0.0}
+DISAGREE = {"disagreement": 0.5}
+UNDECIDED = {"disagreement": 0.25}
+
+
+def _result(best):
+    return Result([Option(best, 10), Option("other", 1)]), 1, 0
+
+
+class TestDeterminizationController:
+    """Test how the number of sampled battles follows their agreement"""
+
+    def test_stats(self):
+        stats = determinization_stats(
+            [_result("earthquake"), _result("earthquake"), _result("protect"), _result("earthquake")]
+        )
+        assert stats["num_determinizations"] == 4
+        assert stats["best_move_counts"] == {"earthquake": 3, "protect": 1}
+        assert stats["disagreement"] == 0.25
+
+    def test_disagreement_samples_more_shallower_battles(self):
+        controller = DeterminizationController()
+        battle = Battle("battle-gen9ou-1")
+        assert controller.apply(battle, 8, 100, 4) == (8, 100)
+
+        assert controller.update(battle.battle_tag, DISAGREE) == 2
+        assert controller.apply(battle, 8, 100, 4) == (16, 50)
+        for _ in range(5):
+            controller.update(battle.battle_tag, DISAGREE)
+        assert controller.get_sample_factor(battle.battle_tag) == MAX_SAMPLE_FACTOR
+        assert controller.apply(battle, 4, 100, 4) == (16, 25)
+        # the factor scales the planned rounds no further than MAX_ROUNDS
+        assert controller.apply(battle, 8, 100, 4) == (16, 50)
+        assert controller.apply(battle, 16, 50, 4) == (16, 50)
+
+    def test_agreement_samples_fewer_deeper_battles(self):
+        controller = DeterminizationController()
+        battle = Battle("battle-gen9ou-1")
+        for _ in range(3):
+            controller.update(battle.battle_tag, AGREE)
+        assert controller.get_sample_factor(battle.battle_tag) == MIN_SAMPLE_FACTOR
+        assert controller.apply(battle, 8, 100, 4) == (4, 200)
+        # at least one round is searched
+        assert controller.apply(battle, 4, 100, 4) == (4, 100)
+
+        assert controller.update(battle.battle_tag, UNDECIDED) == MIN_SAMPLE_FACTOR
+        assert controller.update(battle.battle_tag, DISAGREE) == 1
+
+    def test_forget(self):
+        controller = DeterminizationController()
+        controller.update("battle-gen9ou-1", DISAGREE)
+        controller.update("battle-gen9ou-2", AGREE)
+        controller.forget("battle-gen9ou-1")
+        controller.forget("battle-gen9ou-3")
+        assert controller.get_sample_factor("battle-gen9ou-1") == 1
+        assert controller.get_sample_factor("battle-gen9ou-2") == MIN_SAMPLE_FACTOR
@@ -0,0 +1,84 @@
+"""
+Live battle event hub tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("fastapi")
+
+from backend.event_hub import CLIENT_QUEUE_SIZE, RECENT_EVENTS, STATE_TTL_SECONDS, EventHub
+
+NOW = 1700000000
+
+
+def _state(battle_id, ts_seconds):
+    return {"type": "state", "battle_id": battle_id, "ts": ts_seconds * 1000}
+
+
+def _drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+class TestEventHub:
+    """Test fanning events out to dashboard clients"""
+
+    def test_every_client_gets_every_event(self):
+        hub = EventHub()
+        first, second = hub.subscribe(), hub.subscribe()
+        hub.publish({"type": "decision", "turn": 1})
+        hub.publish({"type": "decision", "turn": 2})
+        assert [e["turn"] for e in _drain(first)] == [1, 2]
+        assert [e["turn"] for e in _drain(second)] == [1, 2]
+
+        hub.unsubscribe(first)
+        hub.publish({"type": "decision", "turn": 3})
+        assert _drain(first) == []
+        assert [e["turn"] for e in _drain(second)] == [3]
+        assert hub.received == 3
+
+    def test_slow_client_loses_its_oldest_events(self):
+        hub = EventHub()
+        slow, fast = hub.subscribe(), hub.subscribe()
+        for turn in range(CLIENT_QUEUE_SIZE + 2):
+            hub.publish({"type": "decision", "turn": turn})
+            _drain(fast)
+
+        turns = [e["turn"] for e in _drain(slow)]
+        assert turns == list(range(2, CLIENT_QUEUE_SIZE + 2))
+        assert hub.dropped == 2
+
+    def test_new_clients_get_the_recent_events(self):
+        hub = EventHub()
+        for turn in range(RECENT_EVENTS + 5):
+            hub.publish({"type": "decision", "turn": turn})
+        turns = [e["turn"] for e in _drain(hub.subscribe())]
+        assert turns == list(range(5, RECENT_EVENTS + 5))
+
+
+class TestLatestStates:
+    """Test the battle state served by /battle/state"""
+
+    def test_latest_state_is_the_most_recent_battle(self):
+        hub = EventHub()
+        hub.publish(_state("battle-gen9ou-1", NOW - 10))
+        hub.publish(_state("battle-gen9ou-2", NOW - 5))
+        hub.publish(_state("battle-gen9ou-1", NOW - 20))
+        assert hub.latest_state(NOW)["battle_id"] == "battle-gen9ou-2"
+
+        hub.publish({"type": "battle_end", "battle_id": "battle-gen9ou-2"})
+        assert hub.latest_state(NOW)["battle_id"] == "battle-gen9ou-1"
+
+    def test_states_of_stopped_bots_expire(self):
+        hub = EventHub()
+        hub.publish(_state("battle-gen9ou-1", NOW))
+        assert hub.latest_state(NOW + STATE_TTL_SECONDS) is not None
+        assert hub.latest_state(NOW + STATE_TTL_SECONDS + 1) is None
+        assert hub.latest_states == {}
@@ -0,0 +1,37 @@
+"""
+Battle event publisher tests
+"""
+
+import json
+import socket
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from config import FoulPlayConfig
+from fp.event_publisher import EventPublisher
+
+
+class TestEventPublisher:
+    """Test publishing battle events over localhost UDP"""
+
+    def test_publishes_json_datagram(self, monkeypatch):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(2)
+        monkeypatch.setattr(FoulPlayConfig, "event_port", receiver.getsockname()[1])
+
+        EventPublisher().publish("turn", "battle-gen9ou-1", turn=3)
+        event = json.loads(receiver.recv(65536))
+        receiver.close()
+
+        assert event["type"] == "turn"
+        assert event["battle_id"] == "battle-gen9ou-1"
+        assert event["turn"] == 3
+
+    def test_disabled_without_port(self, monkeypatch):
+        monkeypatch.setattr(FoulPlayConfig, "event_port", 0)
+        publisher = EventPublisher()
+        publisher.publish("turn", "battle-gen9ou-1", turn=3)
+        assert publisher._socket is None
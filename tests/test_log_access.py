@@ -0,0 +1,77 @@
+"""
+Log access tests
+"""
+
+import gzip
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.log_access import LogAccess, read_since, tail_lines
+
+
+def _write(path, lines, mode="w"):
+    with path.open(mode) as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+class TestLogAccess:
+    """Test tails and cursor reads"""
+
+    def test_tail_lines(self, tmp_path):
+        log = tmp_path / "bot.log"
+        _write(log, ["line {}".format(i) for i in range(1000)])
+        assert tail_lines(log, 3) == ["line 997", "line 998", "line 999"]
+        assert len(tail_lines(log, 5000)) == 1000
+        assert tail_lines(tmp_path / "missing.log", 10) == []
+
+    def test_tail_is_bounded_by_bytes(self, tmp_path):
+        log = tmp_path / "bot.log"
+        _write(log, ["line {}".format(i) for i in range(1000)])
+        lines = tail_lines(log, 1000, max_bytes=100)
+        assert 0 < len(lines) < 20
+        assert lines[-1] == "line 999"
+        assert all(line.startswith("line ") for line in lines)
+
+    def test_tail_continues_into_rotated_segments(self, tmp_path):
+        log = tmp_path / "bot.log"
+        with gzip.open(tmp_path / "bot.log.2.gz", "wt") as f:
+            f.write("a\nb\n")
+        _write(tmp_path / "bot.log.1", ["c", "d"])
+        _write(log, ["e"])
+        assert tail_lines(log, 4) == ["b", "c", "d", "e"]
+
+    def test_cursor_follows_appends_and_rotation(self, tmp_path):
+        log = tmp_path / "bot.log"
+        _write(log, ["old"])
+        result = read_since(log, None)
+        assert result["lines"] == []
+
+        _write(log, ["new 1", "partial"], mode="a")
+        with log.open("a") as f:
+            f.write("no newline yet")
+        result = read_since(log, result["cursor"])
+        assert result["lines"] == ["new 1", "partial"]
+
+        log.rename(tmp_path / "bot.log.1")
+        _write(tmp_path / "bot.log.1", [""], mode="a")
+        _write(log, ["after rotation"])
+        result = read_since(log, result["cursor"])
+        assert result["rotated"]
+        assert result["lines"] == ["no newline yet", "after rotation"]
+
+        log.write_text("truncated\n")
+        assert read_since(log, "{}:{}".format(log.stat().st_ino, 10**6))["lines"] == ["truncated"]
+
+    def test_resolves_battle_logs(self, tmp_path):
+        _write(tmp_path / "battle-gen9ou-123_someone.log", ["x"])
+        access = LogAccess(tmp_path)
+        assert access.resolve("battle-gen9ou-123").name == "battle-gen9ou-123_someone.log"
+        assert access.resolve("../etc/passwd") is None
+        assert access.tail("battle-gen9ou-123", 10)["lines"] == ["x"]
+
+        (tmp_path / "instances" / "a").mkdir(parents=True)
+        _write(tmp_path / "instances" / "a" / "battle-gen9ou-456_other.log", ["y"])
+        assert access.battle_logs() == ["battle-gen9ou-123_someone", "battle-gen9ou-456_other"]
+        assert access.tail("battle-gen9ou-456", 10)["lines"] == ["y"]
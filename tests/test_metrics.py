@@ -0,0 +1,50 @@
+"""
+Bot metrics tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from fp.metrics import GameHistory, MetricsRegistry
+
+
+class TestMetricsRegistry:
+    """Test the metrics registry and its Prometheus text rendering"""
+
+    def test_render_counters_gauges_and_histograms(self, tmp_path):
+        registry = MetricsRegistry()
+        battles = registry.counter("battles_total", "Battles", ["result"])
+        active = registry.gauge("active", "Active battles")
+        latency = registry.histogram("latency_seconds", "Latency", buckets=[1, 5])
+
+        battles.inc(result="win")
+        battles.inc(result="win")
+        active.set(3)
+        latency.observe(0.5)
+        latency.observe(2)
+        latency.observe(10)
+
+        path = tmp_path / "bot.prom"
+        registry.write_textfile(path, {"instance": "a"})
+        lines = path.read_text().splitlines()
+
+        assert "# TYPE battles_total counter" in lines
+        assert 'battles_total{result="win",instance="a"} 2' in lines
+        assert 'active{instance="a"} 3' in lines
+        assert 'latency_seconds_bucket{instance="a",le="1"} 1' in lines
+        assert 'latency_seconds_bucket{instance="a",le="5"} 2' in lines
+        assert 'latency_seconds_bucket{instance="a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_count{instance="a"} 3' in lines
+        assert 'latency_seconds_sum{instance="a"} 12.5' in lines
+
+    def test_game_history_is_rolling(self):
+        history = GameHistory(window_seconds=3600)
+        history.record("gen9ou", "team1", True, now=1000)
+        history.record("gen9ou", "team1", False, now=5000)
+        history.record("gen9ou", "team1", True, now=5100)
+
+        games_per_hour, win_rates = history.summary(now=5200)
+        assert games_per_hour == 2
+        assert win_rates[("gen9ou", "team1")] == 0.5
@@ -0,0 +1,98 @@
+"""
+Opening book tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+import constants
+from fp.battle import Battle, Pokemon
+from fp.opening_book import OpeningBook, position_key
+
+
+def _battle(battle_tag, opponent_lead="greattusk"):
+    battle = Battle(battle_tag)
+    battle.pokemon_format = "gen9ou"
+    battle.turn = 1
+    battle.user.active = Pokemon("kingambit", 100)
+    battle.user.reserve = [Pokemon("dragonite", 100), Pokemon("gholdengo", 100)]
+    battle.opponent.active = Pokemon(opponent_lead, 100)
+    return battle
+
+
+class TestOpeningBook:
+    """Test keying opening positions and merging their policies across battles"""
+
+    def test_same_position_in_different_battles_has_the_same_key(self):
+        first = _battle("battle-gen9ou-1")
+        second = _battle("battle-gen9ou-2")
+        second.user.reserve.reverse()
+        assert position_key(first) == position_key(second)
+
+        assert position_key(first) != position_key(_battle("battle-gen9ou-3", "garchomp"))
+        second.opponent.active.boosts[constants.ATTACK] = 1
+        assert position_key(first) != position_key(second)
+
+    def test_policies_are_merged_by_visits(self, tmp_path):
+        book = OpeningBook(tmp_path / "book.json", min_games=2)
+        battle = _battle("battle-gen9ou-1")
+        key = book.key(battle)
+
+        book.record(key, [("kowtowcleave", 1.0)], total_visits=100)
+        assert not book.is_trusted(key)
+        book.record(key, [("kowtowcleave", 0.5), ("suckerpunch", 0.5)], total_visits=300)
+        assert book.is_trusted(key)
+        assert book.policy(key) == [("kowtowcleave", 0.625), ("suckerpunch", 0.375)]
+
+        book.save()
+        reloaded = OpeningBook(tmp_path / "book.json", min_games=2)
+        assert reloaded.policy(key) == book.policy(key)
+        assert reloaded.games(key) == 2
+
+    def test_only_opening_turns_are_kept(self):
+        book = OpeningBook(max_turn=3)
+        battle = _battle("battle-gen9ou-1")
+        battle.turn = 4
+        assert book.key(battle) is None
+        battle.turn = 3
+        assert book.key(battle) is not None
+        battle.team_preview = True
+        assert book.key(battle) is None
+
+    def test_searches_are_saved_in_batches(self, tmp_path):
+        book = OpeningBook(tmp_path / "book.json", save_every=2)
+        book.record("a", [("kowtowcleave", 1.0)], total_visits=100)
+        assert not (tmp_path / "book.json").exists()
+        book.record("b", [("suckerpunch", 1.0)], total_visits=100)
+        assert OpeningBook(tmp_path / "book.json").games("b") == 1
+
+    def test_books_sharing_a_file_merge_their_searches(self, tmp_path):
+        first = OpeningBook(tmp_path / "book.json")
+        second = OpeningBook(tmp_path / "book.json")
+        first.record("a", [("kowtowcleave", 1.0)], total_visits=100)
+        second.record("a", [("suckerpunch", 1.0)], total_visits=100)
+        second.record("b", [("suckerpunch", 1.0)], total_visits=100)
+        first.save()
+        second.save()
+        first.save()
+
+        reloaded = OpeningBook(tmp_path / "book.json")
+        assert reloaded.games("a") == 2
+        assert reloaded.policy("a") == [("kowtowcleave", 0.5), ("suckerpunch", 0.5)]
+        assert reloaded.games("b") == 1
+
+    def test_least_recently_searched_untrusted_positions_are_dropped(self, tmp_path):
+        book = OpeningBook(tmp_path / "book.json", min_games=2, max_entries=3)
+        for key in ("trusted", "trusted", "old", "older"):
+            book.record(key, [("kowtowcleave", 1.0)], total_visits=100)
+        book.record("old", [("kowtowcleave", 1.0)], total_visits=100)
+        book.save()
+
+        book.record("new", [("kowtowcleave", 1.0)], total_visits=100)
+        book.save()
+        assert sorted(book.entries) == ["new", "old", "trusted"]
+
+        book.record("newer", [("kowtowcleave", 1.0)], total_visits=100)
+        assert sorted(book.entries) == ["newer", "old", "trusted"]
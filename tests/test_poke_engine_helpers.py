@@ -0,0 +1,157 @@
+"""
+Engine Pokemon conversion tests, with the engine's Pokemon and Move stubbed out
+"""
+
+import sys
+from copy import deepcopy
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+poke_engine_helpers = pytest.importorskip("fp.search.poke_engine_helpers", exc_type=ImportError)
+
+import constants
+from fp.battle import Pokemon
+from fp.search.poke_engine_helpers import (
+    PokemonConverter,
+    pokemon_fingerprint,
+    pokemon_to_poke_engine_kwargs,
+)
+
+
+class _EngineObject:
+    """Stands in for poke_engine.Pokemon and poke_engine.Move: keeps its arguments"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def __eq__(self, other):
+        return isinstance(other, _EngineObject) and self.kwargs == other.kwargs
+
+
+@pytest.fixture(autouse=True)
+def engine(monkeypatch):
+    monkeypatch.setattr(poke_engine_helpers, "PokeEnginePokemon", _EngineObject)
+    monkeypatch.setattr(poke_engine_helpers, "PokeEngineMove", _EngineObject)
+
+
+def _set_stat(stat, value):
+    return lambda p: p.stats.__setitem__(stat, value)
+
+
+def _pokemon():
+    pkmn = Pokemon("greattusk", 100, nature="jolly", evs=(0, 252, 0, 0, 4, 252))
+    pkmn.ability = "protosynthesis"
+    pkmn.original_ability = "protosynthesis"
+    pkmn.item = "boosterenergy"
+    pkmn.tera_type = "ground"
+    for move_name in ("headlongrush", "icespinner", "rapidspin", "knockoff"):
+        pkmn.add_move(move_name)
+    return pkmn
+
+
+# A change to the Pokemon for every argument of its engine Pokemon
+KWARG_CHANGES = {
+    "id": lambda p: setattr(p, "name", "garchomp"),
+    "level": lambda p: setattr(p, "level", 80),
+    "types": lambda p: setattr(p, "types", ["ground"]),
+    "base_types": lambda p: setattr(p, "name", "garchomp"),
+    "hp": lambda p: setattr(p, "hp", p.hp - 1),
+    "maxhp": lambda p: setattr(p, "max_hp", p.max_hp + 1),
+    "ability": lambda p: setattr(p, "ability", "intimidate"),
+    "base_ability": lambda p: setattr(p, "original_ability", "intimidate"),
+    "item": lambda p: setattr(p, "knocked_off", True),
+    "nature": lambda p: setattr(p, "nature", "adamant"),
+    "evs": lambda p: setattr(p, "evs", (252, 252, 0, 0, 4, 0)),
+    "attack": _set_stat(constants.ATTACK, 1),
+    "defense": _set_stat(constants.DEFENSE, 1),
+    "special_attack": _set_stat(constants.SPECIAL_ATTACK, 1),
+    "special_defense": _set_stat(constants.SPECIAL_DEFENSE, 1),
+    "speed": _set_stat(constants.SPEED, 1),
+    "status": lambda p: setattr(p, "status", constants.BURN),
+    "rest_turns": lambda p: setattr(p, "rest_turns", 2),
+    "sleep_turns": lambda p: setattr(p, "sleep_turns", 1),
+    "weight_kg": lambda p: setattr(p, "name", "garchomp"),
+    "moves": lambda p: setattr(p.moves[0], "current_pp", p.moves[0].current_pp - 1),
+    "tera_type": lambda p: setattr(p, "tera_type", "fire"),
+    "terastallized": lambda p: setattr(p, "terastallized", True),
+}
+
+
+class TestPokemonFingerprint:
+    """Test that the fingerprint changes whenever the engine Pokemon would"""
+
+    def test_every_engine_argument_is_covered(self):
+        assert set(KWARG_CHANGES) == set(pokemon_to_poke_engine_kwargs(_pokemon()))
+
+    @pytest.mark.parametrize("kwarg", sorted(KWARG_CHANGES))
+    def test_changing_an_engine_argument_changes_the_fingerprint(self, kwarg):
+        pkmn = _pokemon()
+        changed = _pokemon()
+        KWARG_CHANGES[kwarg](changed)
+
+        assert pokemon_to_poke_engine_kwargs(changed)[kwarg] != pokemon_to_poke_engine_kwargs(pkmn)[kwarg]
+        assert pokemon_fingerprint(changed) != pokemon_fingerprint(pkmn)
+
+    def test_move_changes(self):
+        pkmn = _pokemon()
+        disabled = _pokemon()
+        disabled.moves[1].disabled = True
+        replaced = _pokemon()
+        replaced.remove_move("knockoff")
+        replaced.add_move("earthquake")
+
+        fingerprints = {pokemon_fingerprint(p) for p in (pkmn, disabled, replaced)}
+        assert len(fingerprints) == 3
+
+    def test_equal_pokemon_have_equal_fingerprints(self):
+        assert pokemon_fingerprint(_pokemon()) == pokemon_fingerprint(_pokemon())
+
+
+class TestPokemonConverter:
+    """Test the cache of engine Pokemon"""
+
+    def test_the_pokemon_is_not_modified(self):
+        pkmn = _pokemon()
+        pkmn.knocked_off = True
+        pkmn.types = ["ground"]
+        pkmn.add_move("earthquake")
+        before = deepcopy(pkmn)
+
+        engine_pkmn = PokemonConverter().convert(pkmn)
+        assert engine_pkmn.kwargs["item"] == "None"
+        assert engine_pkmn.kwargs["types"] == ("ground", "typeless")
+        assert len(engine_pkmn.kwargs["moves"]) == 4
+
+        assert pokemon_fingerprint(pkmn) == pokemon_fingerprint(before)
+        assert pkmn.item == "boosterenergy"
+        assert pkmn.types == ["ground"]
+        assert [m.name for m in pkmn.moves] == [m.name for m in before.moves]
+
+    def test_equal_pokemon_share_one_conversion(self):
+        converter = PokemonConverter()
+        pkmn = _pokemon()
+        engine_pkmn = converter.convert(pkmn)
+        assert converter.convert(deepcopy(pkmn)) is engine_pkmn
+
+        pkmn.hp -= 10
+        assert converter.convert(pkmn) is not engine_pkmn
+        assert (converter.hits, converter.misses) == (1, 2)
+
+    def test_the_cache_starts_over_at_max_size(self):
+        converter = PokemonConverter(max_size=2)
+        pokemon = [_pokemon() for _ in range(3)]
+        for level, pkmn in zip((80, 90, 100), pokemon):
+            pkmn.level = level
+
+        first = converter.convert(pokemon[0])
+        converter.convert(pokemon[1])
+        assert converter.convert(pokemon[0]) is first
+        assert len(converter._cache) == 2
+
+        converter.convert(pokemon[2])
+        assert len(converter._cache) == 1
+        assert converter.convert(pokemon[0]) is not first
+        assert (converter.hits, converter.misses) == (1, 4)
@@ -0,0 +1,41 @@
+"""
+Decision profiler tests
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from config import FoulPlayConfig
+from fp.profiling import SamplingProfiler, should_save_profile
+
+
+def _busy_loop(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class TestSamplingProfiler:
+    """Test sampling the stacks of a decision"""
+
+    def test_samples_collapsed_stacks_of_the_profiled_thread(self):
+        profiler = SamplingProfiler(interval_ms=1).start()
+        _busy_loop(0.1)
+        stacks = profiler.stop()
+
+        assert sum(stacks.values()) > 0
+        busy = [s for s in stacks if "_busy_loop (test_profiling.py" in s]
+        assert busy
+        # outermost frame first
+        assert busy[0].index("test_samples_collapsed_stacks") < busy[0].index("_busy_loop")
+
+    def test_selected_turns(self, monkeypatch):
+        monkeypatch.setattr(FoulPlayConfig, "profile_every_n_turns", 5)
+        monkeypatch.setattr(FoulPlayConfig, "profile_slow_turn_ms", 2000)
+
+        assert should_save_profile(10, 100)
+        assert not should_save_profile(11, 100)
+        assert should_save_profile(11, 2500)
@@ -0,0 +1,68 @@
+"""
+Sampled battle weighting tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from fp.battle import Battle, Pokemon
+from fp.search.sampling import allocate_battles, top_joint_draws, weight_samples
+
+
+def _battle(item):
+    battle = Battle("battle-gen9ou-1")
+    battle.opponent.active = Pokemon("greattusk", 100)
+    battle.opponent.active.item = item
+    return battle
+
+
+class TestSampling:
+    """Test likelihood weights, merging equal samples and stratified draws"""
+
+    def test_distinct_draws_are_weighted_by_likelihood(self):
+        samples = [
+            (_battle("boosterenergy"), 0.6, ("boosterenergy",)),
+            (_battle("choicescarf"), 0.3, ("choicescarf",)),
+            (_battle("boosterenergy"), 0.6, ("boosterenergy",)),
+            (_battle("leftovers"), 0.1, ("leftovers",)),
+        ]
+        weighted = weight_samples(samples)
+        assert [(b.opponent.active.item, round(w, 6)) for b, w in weighted] == [
+            ("boosterenergy", 0.6),
+            ("choicescarf", 0.3),
+            ("leftovers", 0.1),
+        ]
+
+    def test_battles_of_one_draw_share_its_weight(self):
+        # the same drawn set with a different sampled unrevealed Pokemon
+        first, second, third = _battle("leftovers"), _battle("leftovers"), _battle("leftovers")
+        first.opponent.reserve = [Pokemon("gholdengo", 100)]
+        second.opponent.reserve = [Pokemon("kingambit", 100)]
+        third.opponent.reserve = [Pokemon("gholdengo", 100)]
+        weighted = weight_samples(
+            [(first, 0.5, "draw"), (second, 0.5, "draw"), (third, 0.5, "draw")]
+        )
+        assert [round(w, 6) for _, w in weighted] == [round(2 / 3, 6), round(1 / 3, 6)]
+
+    def test_top_joint_draws(self):
+        distributions = [[0.2, 0.8], [0.5, 0.3, 0.2]]
+        draws = top_joint_draws(distributions, max_draws=10, coverage=1.0)
+        assert len(draws) == 6
+        assert draws[0] == ((1, 0), 0.4)
+        assert [round(p, 6) for _, p in draws] == [0.4, 0.24, 0.16, 0.1, 0.06, 0.04]
+
+        assert [d for d, _ in top_joint_draws(distributions, max_draws=10, coverage=0.75)] == [
+            (1, 0),
+            (1, 1),
+            (1, 2),
+        ]
+        assert len(top_joint_draws(distributions, max_draws=2, coverage=1.0)) == 2
+
+    def test_remaining_battles_go_to_draws_that_still_sample(self):
+        draws = [((0,), 0.5), ((1,), 0.3), ((2,), 0.2)]
+        assert allocate_battles(draws, 3, [False, False, False]) == [1, 1, 1]
+        assert allocate_battles(draws, 8, [False, False, False]) == [4, 2, 2]
+        assert allocate_battles(draws, 8, [True, False, False]) == [1, 4, 3]
+        assert allocate_battles(draws, 8, [True, True, True]) == [1, 1, 1]
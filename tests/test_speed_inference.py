@@ -0,0 +1,91 @@
+"""
+Speed inference tests
+"""
+
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+import constants
+from fp.battle import Battle, Pokemon, StatRange
+from fp.speed_inference import (
+    filter_sets_by_speed,
+    record_turn_start_speeds,
+    set_speed,
+    update_speed_range,
+)
+
+Set = namedtuple("Set", ["item", "nature", "evs"])
+
+
+def _battle(user_speed):
+    battle = Battle("battle-gen9ou-1")
+    battle.user.active = Pokemon("kingambit", 100)
+    battle.user.active.stats[constants.SPEED] = user_speed
+    battle.opponent.active = Pokemon("greattusk", 100)
+    return battle
+
+
+class TestSpeedInference:
+    """Test narrowing speed ranges from turn order and filtering sets with them"""
+
+    def test_set_speed_includes_nature_evs_and_item(self):
+        assert set_speed("greattusk", 100, "jolly", (0, 252, 0, 0, 4, 252), "None") == 300
+        assert set_speed("greattusk", 100, "jolly", (0, 252, 0, 0, 4, 252), "choicescarf") == 450
+        assert set_speed("greattusk", 100, "adamant", (252, 252, 0, 0, 4, 0), "leftovers") == 210
+
+    def test_turn_order_narrows_the_range(self):
+        battle = _battle(user_speed=250)
+        update_speed_range(battle, opponent_moved_first=True)
+        assert battle.opponent.active.speed_range == StatRange(min=250, max=float("inf"))
+
+        # +1 speed: the range is of the unboosted stat
+        battle.opponent.active.boosts[constants.SPEED] = 1
+        battle.user.active.stats[constants.SPEED] = 420
+        update_speed_range(battle, opponent_moved_first=False)
+        assert battle.opponent.active.speed_range == StatRange(min=250, max=281)
+
+        # a contradicting order is ignored: under trickroom moving second is being faster
+        battle.trick_room = True
+        battle.user.active.stats[constants.SPEED] = 500
+        update_speed_range(battle, opponent_moved_first=False)
+        assert battle.opponent.active.speed_range == StatRange(min=250, max=281)
+
+    def test_speeds_are_compared_as_they_were_at_turn_start(self):
+        battle = _battle(user_speed=250)
+        battle.turn = 3
+        record_turn_start_speeds(battle)
+        # we moved first with hammerarm, then the opponent moved
+        battle.user.active.boosts[constants.SPEED] = -1
+        update_speed_range(battle, opponent_moved_first=False)
+        assert battle.opponent.active.speed_range == StatRange(min=0, max=251)
+
+        # spinout: the opponent moved first and slowed itself down
+        battle = _battle(user_speed=250)
+        battle.turn = 3
+        record_turn_start_speeds(battle)
+        battle.opponent.active.boosts[constants.SPEED] = -2
+        update_speed_range(battle, opponent_moved_first=True)
+        assert battle.opponent.active.speed_range == StatRange(min=250, max=float("inf"))
+
+        # recorded on another turn: the current speeds are used
+        battle.turn = 4
+        battle.opponent.active.speed_range = StatRange(min=0, max=float("inf"))
+        update_speed_range(battle, opponent_moved_first=True)
+        assert battle.opponent.active.speed_range == StatRange(min=500, max=float("inf"))
+
+    def test_sets_outside_the_range_are_filtered(self):
+        pkmn = Pokemon("greattusk", 100)
+        jolly = Set("boosterenergy", "jolly", (0, 252, 0, 0, 4, 252))
+        scarf = Set("choicescarf", "jolly", (0, 252, 0, 0, 4, 252))
+        bulky = Set("leftovers", "impish", (252, 0, 252, 0, 4, 0))
+        sets = [jolly, scarf, bulky]
+
+        assert filter_sets_by_speed(pkmn, sets) == sets
+        pkmn.speed_range = StatRange(min=290, max=400)
+        assert filter_sets_by_speed(pkmn, sets) == [jolly]
+        # no set fits: the range is not trusted
+        pkmn.speed_range = StatRange(min=1000, max=1200)
+        assert filter_sets_by_speed(pkmn, sets) == sets
@@ -0,0 +1,116 @@
+"""
+Bot supervisor tests
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend import supervisor as supervisor_module
+from backend.supervisor import BotSpec, BotSupervisor, SupervisorError
+
+
+def _spec(parallelism=1):
+    return BotSpec(ps_username="bot", ps_password="pw", search_parallelism=parallelism)
+
+
+@pytest.fixture
+def crashing_bot(monkeypatch):
+    monkeypatch.setattr(
+        supervisor_module,
+        "bot_command",
+        lambda spec, port: [sys.executable, "-c", "import sys; sys.exit(1)"],
+    )
+    # the tests call check() themselves
+    monkeypatch.setattr(BotSupervisor, "_ensure_monitor", lambda self: None)
+
+
+class TestBotSupervisor:
+    """Test running and restarting supervised bots"""
+
+    def test_core_budget_is_enforced(self, tmp_path, crashing_bot):
+        supervisor = BotSupervisor(0, cpu_budget=3, logs_dir=tmp_path)
+        supervisor.start("a", _spec(2))
+        with pytest.raises(SupervisorError):
+            supervisor.start("b", _spec(2))
+        with pytest.raises(SupervisorError):
+            supervisor.start("a", _spec(1))
+        supervisor.start("c", _spec(1))
+        assert supervisor.cores_in_use() == 3
+        supervisor.stop_all()
+
+    def test_extra_args_cannot_bypass_the_budget(self, tmp_path, crashing_bot):
+        supervisor = BotSupervisor(0, cpu_budget=2, logs_dir=tmp_path)
+        for extra_args in (
+            ["--search-parallelism", "16"],
+            ["--search-parallelism=16"],
+            ["--search-par", "16"],
+            ["--max-concurrent-battles", "4"],
+            ["--event-port", "1"],
+        ):
+            spec = _spec()
+            spec.extra_args = extra_args
+            with pytest.raises(SupervisorError):
+                supervisor.start("a", spec)
+        assert supervisor.instances == {}
+
+        spec = _spec()
+        spec.extra_args = ["--save-replay", "always"]
+        supervisor.start("a", spec)
+        assert supervisor.cores_in_use() == 1
+        supervisor.stop_all()
+
+    def test_crashed_bot_restarts_with_backoff(self, tmp_path, crashing_bot):
+        supervisor = BotSupervisor(0, cpu_budget=1, logs_dir=tmp_path)
+        instance = supervisor.start("a", _spec())
+        instance.process.wait()
+
+        supervisor.check()
+        assert instance.state == "backoff"
+        assert instance.last_exit_code == 1
+        first_backoff = instance.next_restart_at - time.time()
+
+        instance.next_restart_at = time.time()
+        supervisor.check()
+        assert instance.state == "running"
+        assert instance.restarts == 1
+
+        instance.process.wait()
+        supervisor.check()
+        assert instance.next_restart_at - time.time() > first_backoff
+        supervisor.stop("a")
+        assert instance.state == "stopped"
+
+    def test_every_bot_logs_to_its_own_directory(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            supervisor_module,
+            "bot_command",
+            lambda spec, port: [sys.executable, "-c", "import os; print(os.environ['FP_LOG_DIR'])"],
+        )
+        monkeypatch.setattr(BotSupervisor, "_ensure_monitor", lambda self: None)
+        supervisor = BotSupervisor(0, cpu_budget=2, logs_dir=tmp_path)
+        log_dirs = {}
+        for instance_id in ["default", "a"]:
+            instance = supervisor.start(instance_id, _spec())
+            instance.process.wait()
+            log_dirs[instance_id] = instance.log_path.read_text().strip()
+        assert log_dirs == {"default": str(tmp_path), "a": str(tmp_path / "instances" / "a")}
+
+        with pytest.raises(SupervisorError):
+            supervisor.start("..", _spec())
+        supervisor.stop_all()
+
+    def test_events_update_throughput(self, tmp_path, crashing_bot):
+        supervisor = BotSupervisor(0, cpu_budget=1, logs_dir=tmp_path)
+        supervisor.start("a", _spec())
+        supervisor.record_event({"type": "decision", "instance": "a", "timings_ms": {"total": 300}})
+        supervisor.record_event({"type": "battle_end", "instance": "a", "winner": "bot"})
+        health = supervisor.health()[0]
+        assert health["battles_finished"] == 1
+        assert health["wins"] == 1
+        assert health["avg_decision_ms"] == 300
+        supervisor.stop_all()
@@ -0,0 +1,90 @@
+"""
+Team preview order tests
+"""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from fp.search.team_order import TeamPreviewCache, lead_weights, order_team
+
+TEAM = ["garchomp", "rotomwash", "ferrothorn", "clefable", "heatran", "weavile"]
+
+
+class TestLeadWeights:
+    """Test the weight of each Pokemon as a lead"""
+
+    def test_switches_weigh_their_pokemon(self):
+        policy = [("switch rotomwash", 0.5), ("switch clefable", 0.25)]
+        assert lead_weights(policy, "garchomp") == [("rotomwash", 0.5), ("clefable", 0.25)]
+
+    def test_other_choices_keep_the_first_pokemon_in_front(self):
+        policy = [
+            ("earthquake", 0.25),
+            ("switch rotomwash", 0.375),
+            ("stealthrock", 0.25),
+            ("switch clefable", 0.125),
+        ]
+        assert lead_weights(policy, "garchomp") == [
+            ("garchomp", 0.5),
+            ("rotomwash", 0.375),
+            ("clefable", 0.125),
+        ]
+
+
+class TestOrderTeam:
+    """Test ordering the team from the lead weights"""
+
+    def test_lead_then_rest_by_weight(self):
+        weights = [("heatran", 0.6), ("clefable", 0.3), ("garchomp", 0.1)]
+        assert order_team(TEAM, weights, random.Random(0)) == [
+            "heatran",
+            "clefable",
+            "garchomp",
+            "rotomwash",
+            "ferrothorn",
+            "weavile",
+        ]
+
+    def test_ties_and_unsearched_keep_team_order(self):
+        weights = [("weavile", 0.8), ("ferrothorn", 0.1), ("rotomwash", 0.1)]
+        assert order_team(TEAM, weights, random.Random(0)) == [
+            "weavile",
+            "rotomwash",
+            "ferrothorn",
+            "garchomp",
+            "clefable",
+            "heatran",
+        ]
+
+    def test_lead_is_drawn_from_close_weights(self):
+        weights = [("clefable", 0.5), ("heatran", 0.45), ("garchomp", 0.05)]
+        leads = {order_team(TEAM, weights, random.Random(seed))[0] for seed in range(50)}
+        assert leads == {"clefable", "heatran"}
+
+    def test_without_weights_keeps_team_order(self):
+        assert order_team(TEAM, [], random.Random(0)) == TEAM
+        assert order_team(TEAM, [("dragapult", 1.0)], random.Random(0)) == TEAM
+
+
+class TestTeamPreviewCache:
+    """Test the LRU cache of team preview searches"""
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TeamPreviewCache(max_size=2)
+        cache.put("a", [("garchomp", 1.0)])
+        cache.put("b", [("heatran", 1.0)])
+        assert cache.get("a") == [("garchomp", 1.0)]
+
+        cache.put("c", [("weavile", 1.0)])
+        assert cache.get("b") is None
+        assert cache.get("a") == [("garchomp", 1.0)]
+        assert cache.get("c") == [("weavile", 1.0)]
+
+    def test_clear(self):
+        cache = TeamPreviewCache()
+        cache.put("a", [("garchomp", 1.0)])
+        cache.clear()
+        assert cache.get("a") is None
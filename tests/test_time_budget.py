@@ -0,0 +1,104 @@
+"""
+Search time budget tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from fp.battle import Battle, Pokemon
+from fp.search.time_budget import (
+    SearchBudgetManager,
+    DEFAULT_OVERHEAD_MS,
+    MIN_SEARCH_TIME_MS,
+    MAX_BANK_FRACTION_PER_TURN,
+    TIME_BANK_RESERVE_SECONDS,
+    TURN_TIME_RESERVE_SECONDS,
+)
+
+FORMAT = "gen9randombattle"
+
+
+def _battle(turn=5, time_remaining=None):
+    battle = Battle("battle-gen9randombattle-1")
+    battle.pokemon_format = FORMAT
+    battle.turn = turn
+    battle.time_remaining = time_remaining
+    battle.user.active = Pokemon("pikachu", 100)
+    battle.user.active.add_move("thunderbolt")
+    battle.user.active.add_move("voltswitch")
+    battle.user.reserve = [Pokemon("charizard", 100)]
+    battle.opponent.active = Pokemon("garchomp", 100)
+    return battle
+
+
+class TestSearchBudget:
+    """Test search budget allocation"""
+
+    def test_untimed_battle_keeps_configured_time(self):
+        manager = SearchBudgetManager()
+        manager.overhead_ms[FORMAT] = 0
+        assert manager.allocate(_battle(), 4, 100, 2) == (4, 100)
+
+    def test_lead_choice_gets_more_time(self):
+        manager = SearchBudgetManager()
+        manager.overhead_ms[FORMAT] = 0
+        _, search_time = manager.allocate(_battle(turn=1), 4, 100, 2)
+        assert search_time > 100
+
+    def test_timed_battle_never_exceeds_time_bank(self):
+        manager = SearchBudgetManager()
+        manager.overhead_ms[FORMAT] = 100
+        battle = _battle(time_remaining=TIME_BANK_RESERVE_SECONDS + 1)
+        num_battles, search_time = manager.allocate(battle, 8, 1000, 2)
+        assert num_battles == 2
+        assert MIN_SEARCH_TIME_MS <= search_time < 1000 * MAX_BANK_FRACTION_PER_TURN
+
+    def test_nearly_empty_bank_is_never_exceeded(self):
+        manager = SearchBudgetManager()
+        manager.overhead_ms[FORMAT] = 40
+        battle = _battle()
+        battle.turn_time_remaining = TURN_TIME_RESERVE_SECONDS + 0.05
+        # the minimum search time would not fit: one round of the 10ms left
+        assert manager.allocate(battle, 8, 1000, 2) == (2, 10)
+
+    def test_time_left_this_turn_is_a_ceiling(self):
+        manager = SearchBudgetManager()
+        battle = _battle(time_remaining=300)
+        bank_allowance_ms = manager.time_bank_allowance_ms(battle)
+        # a large bank is spread over the turns left, not spent on one turn
+        assert bank_allowance_ms < 300 * 1000 * MAX_BANK_FRACTION_PER_TURN + 1
+
+        battle.turn_time_remaining = 150
+        assert manager.time_bank_allowance_ms(battle) == bank_allowance_ms
+        battle.turn_time_remaining = TURN_TIME_RESERVE_SECONDS + 2
+        assert manager.time_bank_allowance_ms(battle) == 2000
+        battle.time_remaining = None
+        assert manager.time_bank_allowance_ms(battle) == 2000
+
+    def test_overhead_is_measured(self):
+        manager = SearchBudgetManager()
+        battle = _battle()
+        manager.record(battle, 500, 200, [("thunderbolt", 1.0)])
+        assert manager.get_overhead_ms(battle) == 300
+
+        other_format = _battle()
+        other_format.pokemon_format = "gen9ou"
+        assert manager.get_overhead_ms(other_format) == DEFAULT_OVERHEAD_MS
+
+    def test_close_policy_is_refined(self):
+        manager = SearchBudgetManager()
+        close_policy = [("thunderbolt", 0.5), ("voltswitch", 0.45)]
+        clear_policy = [("thunderbolt", 0.9), ("voltswitch", 0.1)]
+        assert manager.refinement_time_ms(_battle(), close_policy, 0, 0, 100) == 100
+        assert manager.refinement_time_ms(_battle(), clear_policy, 0, 0, 100) == 0
+
+    def test_frozen_budget_ignores_timer_and_overhead(self):
+        manager = SearchBudgetManager()
+        manager.frozen = True
+        manager.overhead_ms[FORMAT] = 100
+        battle = _battle(turn=1, time_remaining=TIME_BANK_RESERVE_SECONDS + 1)
+        assert manager.allocate(battle, 8, 1000, 2) == (8, 1000)
+        close_policy = [("thunderbolt", 0.5), ("voltswitch", 0.45)]
+        assert manager.refinement_time_ms(battle, close_policy, 1, 0, 100) == 0
@@ -0,0 +1,59 @@
+"""
+Transposition table tests
+"""
+
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from fp.search.transpositions import (
+    ENTRY_BYTES,
+    OPTION_BYTES,
+    TranspositionTable,
+    merge_duplicate_states,
+)
+
+Option = namedtuple("Option", ["move_choice", "total_score", "visits"])
+Result = namedtuple("Result", ["side_one", "total_visits"])
+
+RESULT = Result([Option("earthquake", 40.0, 60), Option("switch gholdengo", 20.0, 40)], 100)
+
+
+class TestTranspositions:
+    """Test merging duplicate determinizations and reusing searched states"""
+
+    def test_duplicates_are_merged_with_summed_chances(self):
+        states = [("a", "state a", 0.25, 0), ("b", "state b", 0.25, 1), ("a", "state a", 0.5, 2)]
+        merged, duplicates = merge_duplicate_states(states)
+        assert merged == [("a", "state a", 0.75, 0), ("b", "state b", 0.25, 1)]
+        assert duplicates == 1
+
+    def test_results_are_reused_when_searched_long_enough(self):
+        table = TranspositionTable()
+        table.put("a", RESULT, search_time_ms=100)
+
+        cached = table.get("a", search_time_ms=100)
+        assert cached.total_visits == 100
+        assert [(o.move_choice, o.visits) for o in cached.side_one] == [
+            ("earthquake", 60),
+            ("switch gholdengo", 40),
+        ]
+        assert table.get("a", search_time_ms=200) is None
+        assert table.get("b", search_time_ms=100) is None
+
+    def test_least_recently_used_are_evicted(self):
+        table = TranspositionTable(max_entries=2)
+        table.put("a", RESULT, 100)
+        table.put("b", RESULT, 100)
+        table.get("a", 100)
+        table.put("c", RESULT, 100)
+        assert table.get("b", 100) is None
+        assert table.get("a", 100) is not None
+
+        table = TranspositionTable(max_bytes=2 * (ENTRY_BYTES + 2 * OPTION_BYTES))
+        for digest in "abc":
+            table.put(digest, RESULT, 100)
+        assert len(table) == 2
+        assert table.size_bytes == 2 * (ENTRY_BYTES + 2 * OPTION_BYTES)
@@ -0,0 +1,60 @@
+"""
+Type chart tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "foul-play"))
+
+from fp.helpers import (
+    DAMAGE_MULTIPICATION_ARRAY,
+    POKEMON_TYPE_INDICES,
+    type_effectiveness_modifier,
+)
+from fp.type_chart import NUM_TYPES, type_chart
+
+TYPINGS = [
+    ["fire"],
+    ["water", "ground"],
+    ["grass", "steel"],
+    ["ghost", "dark"],
+    ["bug", "flying"],
+    ["dragon", "fairy"],
+]
+
+
+class TestTypeChart:
+    """Test the precomputed type chart against the type effectiveness helper"""
+
+    def test_matches_helper(self):
+        chart = type_chart("gen9")
+        for typing in TYPINGS:
+            row = chart.row(typing)
+            for attacking_type, index in POKEMON_TYPE_INDICES.items():
+                expected = type_effectiveness_modifier(attacking_type, typing)
+                assert chart.effectiveness(attacking_type, typing) == expected
+                assert row[index] == expected
+
+    def test_team_counts(self):
+        chart = type_chart("gen9")
+        weak = chart.count_team(TYPINGS, lambda m: m > 1)
+        quadruple = chart.count_team(TYPINGS, lambda m: m == 4)
+        assert len(weak) == NUM_TYPES
+        # water/ground and grass/steel are 4x weak to grass and fire
+        assert quadruple[POKEMON_TYPE_INDICES["grass"]] == 1
+        assert quadruple[POKEMON_TYPE_INDICES["fire"]] == 1
+        for attacking_type, index in POKEMON_TYPE_INDICES.items():
+            assert weak[index] == sum(
+                type_effectiveness_modifier(attacking_type, t) > 1 for t in TYPINGS
+            )
+
+    def test_generations_do_not_mutate_the_global_chart(self):
+        before = [list(row) for row in DAMAGE_MULTIPICATION_ARRAY]
+
+        assert type_chart("gen1").effectiveness("ghost", ["psychic"]) == 0
+        assert type_chart("gen1").effectiveness("ice", ["fire"]) == 1
+        assert type_chart("gen4").effectiveness("dark", ["steel"]) == 0.5
+        assert type_chart("gen4").effectiveness("ghost", ["psychic"]) == 2
+        assert type_chart("gen9").effectiveness("dark", ["steel"]) == 1
+        assert DAMAGE_MULTIPICATION_ARRAY == before
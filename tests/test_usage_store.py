@@ -0,0 +1,77 @@
+"""
+Smogon usage store tests
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.usage_store import UsageRefresher, UsageStore, expected_month
+
+
+def _write_chaos(path, moves, item="Leftovers"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    stats = {
+        "info": {"metagame": "gen9ou", "cutoff": 1695, "number of battles": 10},
+        "data": {
+            "Great Tusk": {
+                "usage": 0.3,
+                "Abilities": {"protosynthesis": 100.0},
+                "Moves": moves,
+                "Items": {item: 60.0, "boosterenergy": 40.0},
+                "Spreads": {"Jolly:0/252/0/0/4/252": 70.0},
+                "Tera Types": {"steel": 50.0},
+                "Teammates": {"Kingambit": 30.0},
+            }
+        },
+    }
+    path.write_text(json.dumps(stats))
+    return path
+
+
+class TestUsageStore:
+    """Test importing chaos stats files and looking them up"""
+
+    def test_import_and_lookup(self, tmp_path):
+        store = UsageStore(tmp_path / "usage.sqlite3")
+        chaos = _write_chaos(
+            tmp_path / "2024-05" / "chaos" / "gen9ou-1695.json",
+            {"Headlong Rush": 90.0, "Rapid Spin": 80.0, "Ice Spinner": 50.0},
+        )
+        assert store.import_chaos(chaos) == 1
+
+        usage = store.lookup("Great-Tusk", "gen9ou")
+        assert usage["month"] == "2024-05"
+        assert [m for m, _ in usage["moves"]] == ["headlongrush", "rapidspin", "icespinner"]
+        assert usage["moves"][0][1] == 0.9
+        assert usage["spreads"][0][0] == "Jolly:0/252/0/0/4/252"
+        assert store.lookup("greattusk", "gen9uu") is None
+
+    def test_newest_month_wins_and_lru_is_bounded(self, tmp_path):
+        store = UsageStore(tmp_path / "usage.sqlite3", lru_size=1)
+        store.import_chaos(
+            _write_chaos(tmp_path / "2024-04" / "chaos" / "gen9ou-1695.json", {"Earthquake": 90.0})
+        )
+        assert store.lookup("greattusk", "gen9ou")["moves"][0][0] == "earthquake"
+
+        store.import_chaos(
+            _write_chaos(tmp_path / "2024-05" / "chaos" / "gen9ou-1695.json", {"Rapid Spin": 90.0})
+        )
+        assert store.lookup("greattusk", "gen9ou")["moves"][0][0] == "rapidspin"
+        store.lookup("kingambit", "gen9ou")
+        assert len(store._lru) == 1
+        assert [d["month"] for d in store.datasets()] == ["2024-04", "2024-05"]
+
+    def test_refresh_from_local_mirror(self, tmp_path):
+        mirror = tmp_path / "mirror"
+        _write_chaos(
+            mirror / expected_month() / "chaos" / "gen9ou-1695.json", {"Knock Off": 50.0}
+        )
+        store = UsageStore(tmp_path / "usage.sqlite3")
+        UsageRefresher(store, ["gen9ou", "gen9uu"], str(mirror)).refresh()
+
+        assert store.latest_month("gen9ou") == expected_month()
+        assert store.latest_month("gen9uu") is None
+        assert store.lookup("greattusk", "gen9ou")["items"][0] == ["leftovers", 0.6]